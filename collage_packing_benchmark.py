@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Collage Packing Benchmark
+Sabit grid (GRID_COLS x GRID_ROWS, BATCH_SIZE crop) ile adaptive yerleşimi (CollagePacker) aynı
+camera-saat crop'ları üzerinde karşılaştırır: camera-saat başına LLM çağrısı, token (görsel + istek)
+ve modelin gördüğü crop çözünürlüğü (karo kenarı, modelin kendi küçültmesi dahil). LLM çağrısı yapılmaz;
+crop'lar analiz akışındaki sırayla (snapshot adı) gelir ve collage'lar akış hattındaki kuralla kesilir.
+Sınıflandırma doğruluğu ölçülmez: COLLAGE_MODE=adaptive açılmadan önce etiketli saatlerde çürük
+kararları grid ile ayrıca karşılaştırılmalıdır.
+
+Girdi: analiz çıktısındaki crop klasörleri (crops/<kamera>/<tarih>/<saat>/<sınıf>/*.jpg), her biri bir camera-saat.
+
+Kullanım:
+    python collage_packing_benchmark.py --crops /tmp/crops_xxx/crops/camera_001/2026-10-18/09
+    python collage_packing_benchmark.py --crops-root /tmp/crops_xxx/crops --budgets 765 1105 1445 \\
+        --render bench_collages --output packing_report.json
+"""
+
+import json
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ptz_yolo_llm_analysis import (BATCH_SIZE, COLLAGE_IMAGE_TOKENS, MIN_CONF_ROTTEN, TILE_SIZE,
+                                   CollageLayout, CollagePacker, Rec, estimate_request_tokens,
+                                   llm_image_scale, llm_image_tokens, make_collage, prompt_rotten_only)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def load_hour(crops_dir: Path) -> List[Rec]:
+    """Bir camera-saat klasöründeki crop'lar (sadece başlık okunur), snapshot adı sırasıyla"""
+    recs = []
+    for class_dir in sorted(d for d in crops_dir.iterdir() if d.is_dir() and d.name != "collages"):
+        for p in class_dir.glob("*"):
+            if p.suffix.lower() not in IMAGE_EXTS:
+                continue
+            with Image.open(p) as im:
+                size = im.size
+            recs.append(Rec(path=p, id=p.stem, urun=class_dir.name, tarih="", saat="", magaza="", size=size))
+    return sorted(recs, key=lambda r: r.path.name)
+
+
+def find_hours(root: Path) -> List[Path]:
+    """crops/<kamera>/<tarih>/<saat> klasörleri"""
+    return sorted(p for p in root.glob("*/*/*") if p.is_dir())
+
+
+def simulate(packer: CollagePacker, recs: List[Rec]) -> List[Tuple[List[Rec], CollageLayout]]:
+    """AnalysisPipeline ile aynı kesme kuralı: collage dolunca gönder, saat sonunda kalanları boşalt"""
+    batches, pending = [], []
+
+    def _take():
+        nonlocal pending
+        batch, layout = packer.take(pending)
+        pending = pending[len(batch):]
+        batches.append((batch, layout))
+
+    for rec in recs:
+        pending.append(rec)
+        if packer.is_full(pending):
+            _take()
+    while pending:
+        _take()
+    return batches
+
+
+def _seen_side(rec: Rec, slot: Tuple[int, int, int, int], layout: CollageLayout) -> float:
+    """Crop'un modelin gördüğü kenarı (geometrik ortalama, px)"""
+    w, h = rec.size
+    r = min(slot[2] / float(w), slot[3] / float(h))
+    if not layout.upscale:
+        r = min(1.0, r)  # grid: thumbnail büyütmez
+    return float(np.sqrt(w * h)) * r * llm_image_scale(layout.size)
+
+
+def measure(batches: List[Tuple[List[Rec], CollageLayout]]) -> Dict:
+    image_tokens = request_tokens = 0
+    sides = []
+    for batch, layout in batches:
+        num_to_class = {i + 1: rec.urun for i, rec in enumerate(batch)}
+        image_tokens += llm_image_tokens(layout.size)
+        request_tokens += estimate_request_tokens(
+            layout.size, prompt_rotten_only(len(batch), MIN_CONF_ROTTEN, num_to_class))
+        sides.extend(_seen_side(rec, slot, layout) for rec, slot in zip(batch, layout.slots))
+    return {
+        "calls": len(batches),
+        "image_tokens": image_tokens,
+        "request_tokens": request_tokens,
+        "crops_per_call": round(sum(len(b) for b, _ in batches) / float(len(batches)), 1) if batches else 0.0,
+        "seen_side_p50": round(float(np.percentile(sides, 50)), 1) if sides else None,
+        "seen_side_p10": round(float(np.percentile(sides, 10)), 1) if sides else None,
+    }
+
+
+def run_benchmark(hour_dirs: List[Path], budgets: List[int], render_dir: Path = None) -> Dict:
+    variants = {"grid": CollagePacker("grid")}
+    for budget in budgets:
+        variants[f"adaptive@{budget}"] = CollagePacker("adaptive", budget)
+
+    report = {"hours": [], "totals": {}, "batch_size": BATCH_SIZE, "tile_size": list(TILE_SIZE)}
+    for hour_dir in hour_dirs:
+        recs = load_hour(hour_dir)
+        if not recs:
+            continue
+        entry = {"path": str(hour_dir), "crops": len(recs), "variants": {}}
+        for name, packer in variants.items():
+            batches = simulate(packer, recs)
+            entry["variants"][name] = measure(batches)
+            if render_dir is not None and not report["hours"]:
+                batch, layout = batches[0]
+                make_collage(batch, render_dir / name.replace("@", "_"), 1, upload_to_s3=False, layout=layout)
+        report["hours"].append(entry)
+
+    hours = len(report["hours"])
+    for name in variants:
+        rows = [h["variants"][name] for h in report["hours"]]
+        report["totals"][name] = {
+            "calls_per_hour": round(sum(r["calls"] for r in rows) / float(hours), 2) if hours else 0.0,
+            "image_tokens": sum(r["image_tokens"] for r in rows),
+            "request_tokens": sum(r["request_tokens"] for r in rows),
+            "seen_side_p50": round(float(np.median([r["seen_side_p50"] for r in rows])), 1) if hours else None,
+        }
+    return report
+
+
+def _print_report(report: Dict) -> None:
+    totals = report["totals"]
+    print(f"[BENCH] {len(report['hours'])} camera-saat | "
+          f"{sum(h['crops'] for h in report['hours'])} crop | grid BATCH_SIZE={report['batch_size']}")
+    print(f"    {'yerleşim':16s} {'çağrı/saat':>10s} {'fark':>7s} {'görsel tok':>11s} {'istek tok':>10s} {'kenar p50':>9s}")
+    base = totals.get("grid", {}).get("calls_per_hour") or 0.0
+    for name, t in totals.items():
+        diff = f"{(t['calls_per_hour'] - base) / base * 100:+6.1f}%" if base else "     -"
+        print(f"    {name:16s} {t['calls_per_hour']:10.2f} {diff:>7s} {t['image_tokens']:11d} "
+              f"{t['request_tokens']:10d} {(t['seen_side_p50'] or 0):9.1f}")
+    for h in report["hours"]:
+        calls = " ".join(f"{n}={v['calls']}" for n, v in h["variants"].items())
+        print(f"    {h['path']}: {h['crops']} crop | {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sabit grid ve adaptive collage yerleşiminin LLM çağrı sayısı karşılaştırması")
+    parser.add_argument("--crops", nargs="*", default=[], help="camera-saat crop klasör(ler)i")
+    parser.add_argument("--crops-root", default=None, help="crops/ kökü: altındaki tüm <kamera>/<tarih>/<saat> klasörleri")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[COLLAGE_IMAGE_TOKENS],
+                        help="Adaptive collage görsel token bütçeleri")
+    parser.add_argument("--render", default=None, help="İlk camera-saatin ilk collage'larını bu klasöre çiz")
+    parser.add_argument("--output", default=None, help="Raporu JSON olarak kaydet")
+    args = parser.parse_args()
+
+    hour_dirs = [Path(p) for p in args.crops]
+    if args.crops_root:
+        hour_dirs.extend(find_hours(Path(args.crops_root)))
+    if not hour_dirs:
+        print("[HATA] --crops veya --crops-root verilmeli")
+        return
+
+    report = run_benchmark(hour_dirs, args.budgets, Path(args.render) if args.render else None)
+    if not report["hours"]:
+        print("[HATA] Crop bulunamadı")
+        return
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] Rapor kaydedildi: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,32 @@ Redis/Celery bağımlılığı olmadan çalışır
 """
 
 import os
+import io
+import copy
 import time
+import threading
+import xml.etree.ElementTree as ET
 import requests
 from requests.auth import HTTPDigestAuth
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 import yaml
 from PIL import Image
 import numpy as np
-from ultralytics import YOLO
 from dotenv import load_dotenv
 from botocore.config import Config
 
+from ptz_travel_model import get_travel_model
+from ptz_route_planner import plan_route, ptz_distance, route_length
+from change_prefilter import MODES as CHANGE_PREFILTER_MODES, get_change_prefilter
+from jpeg_decode import decode_reduced
+from inference_backend import BackendSettings, load_detector
+from inference_sidecar import get_sidecar_client
+from roi import RegionOfInterest, detect_in_roi, target_rois
+
 # .env dosyasını yükle
 load_dotenv()
 
@@ -58,6 +71,8 @@ S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "Grocery")
 
 _s3_client = None
+# Kameralar paralel işlendiğinde client'ın tek bir kez oluşturulması için
+_s3_client_lock = threading.Lock()
 
 def _ensure_s3_client():
     """S3 client'ı başlat"""
@@ -72,23 +87,24 @@ def _ensure_s3_client():
         print("[DEBUG] .env dosyasında S3_ACCESS_KEY_ID ve S3_SECRET_ACCESS_KEY değerlerini kontrol edin.")
         return None
 
-    if _s3_client is None:
-        try:
-            _s3_client = boto3.client(
-                "s3",
-                endpoint_url=S3_ENDPOINT_URL,
-                aws_access_key_id=S3_ACCESS_KEY_ID,
-                aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-                verify=False,  # self-signed için
-                config=Config(
-                    signature_version="s3v4",
-                    s3={"addressing_style": "path"},  # ÖNEMLİ: path style
-                ),
-            )
-            print(f"[DEBUG] S3 client oluşturuldu: endpoint={S3_ENDPOINT_URL}, bucket={S3_BUCKET_NAME}")
-        except Exception as e:
-            print(f"[HATA] S3 client oluşturulamadı: {e}")
-            return None
+    with _s3_client_lock:
+        if _s3_client is None:
+            try:
+                _s3_client = boto3.client(
+                    "s3",
+                    endpoint_url=S3_ENDPOINT_URL,
+                    aws_access_key_id=S3_ACCESS_KEY_ID,
+                    aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+                    verify=False,  # self-signed için
+                    config=Config(
+                        signature_version="s3v4",
+                        s3={"addressing_style": "path"},  # ÖNEMLİ: path style
+                    ),
+                )
+                print(f"[DEBUG] S3 client oluşturuldu: endpoint={S3_ENDPOINT_URL}, bucket={S3_BUCKET_NAME}")
+            except Exception as e:
+                print(f"[HATA] S3 client oluşturulamadı: {e}")
+                return None
     return _s3_client
 
 def _upload_file_to_s3(local_path: Path, s3_key: str, content_type: str = "image/jpeg") -> Optional[str]:
@@ -106,11 +122,26 @@ def _upload_file_to_s3(local_path: Path, s3_key: str, content_type: str = "image
         # Dosyayı okuyup bytes olarak al
         with open(local_path, "rb") as f:
             data = f.read()
-        
+    except Exception as e:
+        print(f"[HATA] Lokal dosya okunamadı ({local_path}): {e}")
+        return None
+
+    return _upload_bytes_to_s3(data, s3_key, content_type, name=local_path.name)
+
+
+def _upload_bytes_to_s3(data: bytes, s3_key: str, content_type: str = "image/jpeg",
+                        name: Optional[str] = None) -> Optional[str]:
+    """Bellekteki veriyi S3'e yükle (varsa üzerine yazar)."""
+    s3 = _ensure_s3_client()
+    if not s3:
+        print(f"[HATA] S3 client mevcut değil, yükleme yapılamıyor: {s3_key}")
+        return None
+
+    try:
         file_size = len(data)
         print(
             f"[DEBUG] S3'e yükleniyor: bucket={S3_BUCKET_NAME}, key={s3_key}, "
-            f"file={local_path.name} ({file_size} bytes)"
+            f"file={name or s3_key.rsplit('/', 1)[-1]} ({file_size} bytes)"
         )
 
         # ContentLength'i integer olarak gönder
@@ -189,6 +220,47 @@ class CameraConfig:
         self.zoom_scale = config.get('zoom_scale', 10)
         raw_targets = config.get('ptz_targets')
         self.ptz_targets = raw_targets if isinstance(raw_targets, dict) else {}
+        # Hedef başına ROI poligonları (ptz_targets.<konum>.roi): insan algılama sadece bu bölgelerde yapılır
+        self.roi_min_overlap = float(config.get('roi_min_overlap', 0.5))
+        self.target_rois = target_rois(self.ptz_targets, self.roi_min_overlap)
+        # Konum geri bildirimli bekleme (move_settle_seconds üst sınır olarak kalır)
+        self.settle_detection = bool(config.get('settle_detection', False))
+        self.settle_poll_interval = float(config.get('settle_poll_interval', 0.3))
+        self.settle_angle_tolerance = float(config.get('settle_angle_tolerance', 0.5))  # derece
+        self.settle_zoom_tolerance = float(config.get('settle_zoom_tolerance', 0.2))
+        self.settle_frame_diff_threshold = float(config.get('settle_frame_diff_threshold', 4.0))  # 0-255 ortalama fark
+        # Öğrenilmiş hareket süresi modeli: tahminin travel_model_probe oranı kadar beklenir, sonra oturma
+        # sorgulanıp ölçüm kaydedilir (erken kontrol, hızlanan hareketlerin modele yansımasını sağlar)
+        self.travel_model = bool(config.get('travel_model', False))
+        self.travel_model_probe = min(1.0, max(0.0, float(config.get('travel_model_probe', 0.6))))
+        # Hedefleri YAML sırası yerine en kısa PTZ rotasıyla gez
+        self.route_optimization = bool(config.get('route_optimization', False))
+        self.route_zoom_weight = float(config.get('route_zoom_weight', 1.0))
+        # Bellek içi çekim: kare diske yazılmaz, aynı buffer/dizi algılama ve yüklemede kullanılır
+        self.in_memory_capture = bool(config.get('in_memory_capture', False))
+        # Değişiklik ön filtresi: kare son kabul edilen kareyle aynıysa YOLO atlanır (off | diff | ssim)
+        prefilter_mode = config.get('change_prefilter', 'off')
+        if isinstance(prefilter_mode, bool):  # YAML'da off/on boolean olarak okunur
+            prefilter_mode = 'diff' if prefilter_mode else 'off'
+        self.change_prefilter = str(prefilter_mode).lower()
+        if self.change_prefilter not in CHANGE_PREFILTER_MODES:
+            print(f"[UYARI] {camera_id} - Geçersiz change_prefilter: {prefilter_mode}, kapatıldı")
+            self.change_prefilter = 'off'
+        self.change_area_threshold = float(config.get('change_area_threshold', 0.02))  # değişen alan oranı (diff)
+        self.change_pixel_threshold = float(config.get('change_pixel_threshold', 25.0))  # 0-255 piksel farkı (diff)
+        self.change_ssim_threshold = float(config.get('change_ssim_threshold', 0.97))  # ortalama SSIM (ssim)
+        self.change_reference_max_age_hours = float(config.get('change_reference_max_age_hours', 6.0))
+        # İnsan algılama: single (yolov8s) | cascade (önce yolov8n küçük girişle, eşik yakınında yolov8s)
+        self.person_cascade = None
+        if str(config.get('person_detector', 'single')).lower() == 'cascade':
+            self.person_cascade = PersonCascadeSettings(
+                fast_weights=config.get('cascade_fast_weights', 'yolov8n.pt'),
+                fast_imgsz=int(config.get('cascade_fast_imgsz', 320)),
+                margin=float(config.get('cascade_margin', 0.5)),
+            )
+        # Burst çekim: aynı konumda N kare al, insanları maskeleyip piksel bazlı medyanla birleştir (1 = kapalı)
+        self.burst_frames = int(config.get('burst_frames', 1))
+        self.burst_interval = float(config.get('burst_interval', 1.0))  # kareler arası saniye
         
         # Base URL
         self.base_url = f"http://{self.host}/ISAPI"
@@ -199,6 +271,46 @@ class CameraConfig:
         self.session.auth = self.auth
 
 
+class InMemorySnapshot:
+    """
+    Diske yazılmamış snapshot: JPEG bytes + bir kez decode edilen RGB dizi.
+
+    path, disk modunda dosyanın yazılacağı yoldur; S3 key'i bu yoldan türetilir ve
+    yalnızca S3 yüklemesi başarısız olursa dosya bu yola yazılır (yedek spool).
+    """
+
+    def __init__(self, path: Path, data: bytes, array: Optional[np.ndarray] = None):
+        self.path = path
+        self.data = data
+        self._array = array
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def has_array(self) -> bool:
+        """Tam çözünürlüklü dizi zaten bellekte mi (ör. burst birleşimi)"""
+        return self._array is not None
+
+    @property
+    def array(self) -> np.ndarray:
+        """RGB uint8 dizi (ilk erişimde bir kez decode edilir)"""
+        if self._array is None:
+            self._array = np.asarray(Image.open(io.BytesIO(self.data)).convert('RGB'))
+        return self._array
+
+    def spool_to_disk(self) -> Path:
+        """Veriyi lokal dosyaya yaz (S3 yüklemesi başarısız olduğunda)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        return self.path
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+
 class CameraController:
     """Kamera kontrol sınıfı - PTZ ve snapshot işlemleri"""
     
@@ -206,6 +318,9 @@ class CameraController:
         self.config = config
         self.session = config.session
         self.base_url = config.base_url
+        # Son gönderilen PTZ konumu ve ondan önceki konum (hareket süresi modeli için)
+        self.position: Optional[Tuple[float, float, float]] = None
+        self.move_origin: Optional[Tuple[float, float, float]] = None
         
     def _is_ok(self, resp: requests.Response) -> bool:
         """HTTP response başarılı mı kontrol et"""
@@ -232,6 +347,8 @@ class CameraController:
             )
             if not self._is_ok(resp):
                 raise RuntimeError(f"PTZ Absolute hata: {resp.status_code} - {resp.text[:200]}")
+            self.move_origin = self.position
+            self.position = (float(azimuth), float(elevation), float(zoom))
             return True
         except requests.RequestException as e:
             raise RuntimeError(f"PTZ isteği başarısız: {e}") from e
@@ -240,6 +357,62 @@ class CameraController:
         """PTZ hareket fonksiyonu - ptz_move_absolute için alias"""
         return self.ptz_move_absolute(azimuth, elevation, zoom)
     
+    def get_ptz_status(self, timeout_s: float = 3.0) -> Optional[Tuple[float, float, float]]:
+        """
+        PTZ'nin anlık konumunu oku (ISAPI PTZCtrl status)
+        
+        Returns:
+            (azimuth, elevation, zoom) - cameras.yaml ölçeğinde, okunamazsa None
+        """
+        url = f"{self.base_url}/PTZCtrl/channels/{self.config.ptz_channel}/status"
+        try:
+            resp = self.session.get(url, auth=self.config.auth, timeout=timeout_s)
+        except requests.RequestException as e:
+            raise RuntimeError(f"PTZ status isteği başarısız: {e}") from e
+        if not self._is_ok(resp):
+            raise RuntimeError(f"PTZ status hata: {resp.status_code} - {resp.text[:200]}")
+
+        values = {}
+        for elem in ET.fromstring(resp.content).iter():
+            tag = elem.tag.split('}')[-1]  # XML namespace'i at
+            if tag in ('azimuth', 'elevation', 'absoluteZoom') and elem.text:
+                values[tag] = float(elem.text)
+        if len(values) < 3:
+            return None
+        return (
+            values['azimuth'] / self.config.azimuth_scale,
+            values['elevation'] / self.config.elevation_scale,
+            values['absoluteZoom'] / self.config.zoom_scale,
+        )
+    
+    def fetch_frame_bytes(self, timeout_s: float = 10.0) -> bytes:
+        """Anlık JPEG karesini diske yazmadan bytes olarak al"""
+        url = f"{self.base_url}/Streaming/channels/{self.config.stream_channel}/picture"
+        try:
+            resp = self.session.get(url, auth=self.config.auth, timeout=timeout_s)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Snapshot isteği başarısız: {e}") from e
+        if not self._is_ok(resp):
+            raise RuntimeError(f"Snapshot hata: {resp.status_code} - {resp.text[:200]}")
+        return resp.content
+    
+    def _snapshot_path(self, target_name: str, save_dir: Path, create_dirs: bool = True) -> Path:
+        """Snapshot dosya yolu: save_dir/YYYY-MM-DD/HH/<target_name>_HHMMSS.jpg"""
+        # Türkiye saati (UTC+3) kullan
+        # Sistem saati yanlış olsa bile doğru saati kullanır
+        now = get_turkey_time()
+        
+        ts_date = now.strftime("%Y-%m-%d")
+        ts_hour = now.strftime("%H")
+        ts_time = now.strftime("%H%M%S")
+
+        # Kamera ID'si ile klasör yapısı: snapshots/camera_001/2025-10-19/21/
+        hour_dir = save_dir / ts_date / ts_hour
+        if create_dirs:
+            hour_dir.mkdir(parents=True, exist_ok=True)
+
+        return hour_dir / f"{target_name}_{ts_time}.jpg"
+    
     def take_snapshot(self, target_name: str, save_dir: Path, snapshots_root: Optional[Path] = None) -> Optional[Path]:
         """
         Snapshot al, kaydet ve S3'e yükle
@@ -256,22 +429,7 @@ class CameraController:
             if not self._is_ok(resp):
                 raise RuntimeError(f"Snapshot hata: {resp.status_code} - {resp.text[:200]}")
 
-            # Türkiye saati (UTC+3) kullan
-            # Sistem saati yanlış olsa bile doğru saati kullanır
-            now = get_turkey_time()
-            
-            ts_date = now.strftime("%Y-%m-%d")
-            ts_hour = now.strftime("%H")
-            ts_time = now.strftime("%H%M%S")
-
-            # Kamera ID'si ile klasör yapısı: snapshots/camera_001/2025-10-19/21/
-            camera_dir = save_dir
-            day_dir = camera_dir / ts_date
-            hour_dir = day_dir / ts_hour
-            hour_dir.mkdir(parents=True, exist_ok=True)
-
-            fname = f"{target_name}_{ts_time}.jpg"
-            fpath = hour_dir / fname
+            fpath = self._snapshot_path(target_name, save_dir)
 
             with open(fpath, "wb") as f:
                 for chunk in resp.iter_content(8192):
@@ -290,11 +448,167 @@ class CameraController:
         except requests.RequestException as e:
             raise RuntimeError(f"Snapshot isteği başarısız: {e}") from e
     
+    def take_snapshot_in_memory(self, target_name: str, save_dir: Path) -> Optional[InMemorySnapshot]:
+        """Snapshot'ı diske yazmadan al (tek HTTP isteği, tek buffer)"""
+        data = self.fetch_frame_bytes()
+        fpath = self._snapshot_path(target_name, save_dir, create_dirs=False)
+        if len(data) < 5_000:  # 5 KB altı boş/bozuk olabilir
+            print(f"[UYARI] {self.config.camera_id} - Snapshot çok küçük: {fpath.name} ({len(data)} bytes)")
+            return None
+        print(f"[✓] {self.config.camera_id} - Alındı (bellek): {fpath.name}")
+        return InMemorySnapshot(fpath, data)
+    
+    def take_burst_snapshot(self, target_name: str, save_dir: Path, snapshots_root: Optional[Path] = None,
+                            frames: int = 5, interval: float = 1.0, in_memory: bool = False):
+        """
+        Aynı PTZ konumunda kısa bir burst çek ve insansız birleşik kare kaydet
+        
+        Her karede YOLO ile insan kutuları bulunur; kutular maskelenir ve her piksel için
+        maskelenmemiş karelerin medyanı alınır. Tüm karelerde kapalı kalan pikseller için
+        tüm karelerin medyanı kullanılır; kalan insanlar normal insan kontrolünde yakalanır.
+        """
+        burst = []
+        for k in range(max(1, frames)):
+            if k > 0:
+                time.sleep(interval)
+            jpeg = self.fetch_frame_bytes()
+            if len(jpeg) < 5_000:  # 5 KB altı boş/bozuk olabilir
+                print(f"[UYARI] {self.config.camera_id} - Burst karesi çok küçük, atlandı ({len(jpeg)} bytes)")
+                continue
+            burst.append(np.asarray(Image.open(io.BytesIO(jpeg)).convert('RGB')))
+        if not burst:
+            return None
+        if any(frame.shape != burst[0].shape for frame in burst):
+            print(f"[UYARI] {self.config.camera_id} - Burst kare boyutları farklı, ilk kare kullanılıyor")
+            burst = burst[:1]
+
+        boxes_per_frame = [detect_person_boxes(frame) for frame in burst]
+        composite, hole_ratio = compose_person_free_frame(burst, boxes_per_frame)
+        person_frames = sum(1 for boxes in boxes_per_frame if boxes)
+        print(f"[BURST] {self.config.camera_id} - {target_name}: {len(burst)} kare, "
+              f"{person_frames} karede insan, kapanamayan alan %{hole_ratio * 100:.1f}")
+
+        if in_memory:
+            buf = io.BytesIO()
+            Image.fromarray(composite).save(buf, format='JPEG', quality=95)
+            fpath = self._snapshot_path(target_name, save_dir, create_dirs=False)
+            print(f"[✓] {self.config.camera_id} - Alındı (burst, bellek): {fpath.name}")
+            return InMemorySnapshot(fpath, buf.getvalue(), composite)
+
+        fpath = self._snapshot_path(target_name, save_dir)
+        Image.fromarray(composite).save(fpath, format='JPEG', quality=95)
+        print(f"[✓] {self.config.camera_id} - Kaydedildi (burst): {fpath}")
+        return fpath
+    
     def capture_snapshot(self, save_dir: Path, filename_prefix: str, snapshots_root: Optional[Path] = None) -> Optional[Path]:
         """Snapshot yakalama fonksiyonu - take_snapshot için alias"""
         return self.take_snapshot(filename_prefix, save_dir, snapshots_root)
 
 
+# ============================================================================
+# PTZ BEKLEME (KONUM GERİ BİLDİRİMİ + GÖRÜNTÜ KARARLILIĞI)
+# ============================================================================
+
+def _angle_diff(a: float, b: float) -> float:
+    """İki açı arasındaki en kısa fark (360° sarmalı)"""
+    d = abs(a - b) % 360.0
+    return min(d, 360.0 - d)
+
+
+def _frame_thumbnail(jpeg_bytes: bytes, size: Tuple[int, int] = (64, 48)) -> np.ndarray:
+    """JPEG'i küçük gri tonlamalı diziye çevir (kararlılık karşılaştırması için)"""
+    img = Image.open(io.BytesIO(jpeg_bytes))
+    img.draft('L', (size[0] * 4, size[1] * 4))  # DCT seviyesinde küçült, tam decode yok
+    return np.asarray(img.convert('L').resize(size), dtype=np.float32)
+
+
+def _poll_ptz_settle(controller: CameraController, azimuth: float, elevation: float, zoom: float,
+                     start: float, deadline: float) -> Optional[float]:
+    """
+    Konum hedefe tolerans içinde ulaşıp ardışık iki karenin farkı eşik altına inene kadar
+    (odak/pozlama oturması) PTZ status endpoint'ini ve kareleri sorgula.
+
+    Returns:
+        Oturma anında start'tan geçen süre; üst sınır dolarsa veya status/kare okunamazsa
+        deadline'a kadar uyunur ve None döner
+    """
+    cfg = controller.config
+    position_ok = False
+    prev_frame = None
+
+    while time.monotonic() < deadline:
+        try:
+            if not position_ok:
+                status = controller.get_ptz_status()
+                if status is None:
+                    raise RuntimeError("PTZ status yanıtında konum bilgisi yok")
+                cur_az, cur_el, cur_zoom = status
+                position_ok = (
+                    _angle_diff(cur_az, azimuth) <= cfg.settle_angle_tolerance
+                    and abs(cur_el - elevation) <= cfg.settle_angle_tolerance
+                    and abs(cur_zoom - zoom) <= cfg.settle_zoom_tolerance
+                )
+            if position_ok:
+                frame = _frame_thumbnail(controller.fetch_frame_bytes())
+                if prev_frame is not None:
+                    diff = float(np.mean(np.abs(frame - prev_frame)))
+                    if diff <= cfg.settle_frame_diff_threshold:
+                        return time.monotonic() - start
+                prev_frame = frame
+        except Exception as e:
+            print(f"[UYARI] {cfg.camera_id} - Konum geri bildirimi alınamadı, sabit bekleme kullanılıyor: {e}")
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            return None
+        time.sleep(min(cfg.settle_poll_interval, max(0.0, deadline - time.monotonic())))
+
+    print(f"[UYARI] {cfg.camera_id} - Oturma algılanamadı, üst sınır doldu ({deadline - start:.0f} sn)")
+    return None
+
+
+def wait_for_ptz_settle(controller: CameraController, azimuth: float, elevation: float, zoom: float) -> float:
+    """
+    PTZ hareketinden sonra kameranın oturmasını bekle.
+
+    settle_detection ve travel_model kapalıysa move_settle_seconds kadar uyur. settle_detection
+    açıksa hareketin hemen ardından konum + kare kararlılığı sorgulanır. travel_model açıksa
+    öğrenilmiş hareket süresi tahmininin travel_model_probe oranı (varsayılan %60) kadar uyunur,
+    sorgu oradan başlar; kamera tahminden hızlıysa bu erken kontrolde oturmuş bulunur ve model
+    kısa süreye doğru iner. Modelin henüz tahmini yoksa sorgu hareketin hemen ardından başlar.
+    Ölçülen oturma süresi her durumda modele kaydedilir. move_settle_seconds her durumda üst
+    sınırdır; status okunamazsa kalan süre uyunur.
+
+    Returns:
+        Beklenen süre (saniye)
+    """
+    cfg = controller.config
+    timeout = float(cfg.move_settle_seconds)
+    if not cfg.settle_detection and not cfg.travel_model:
+        time.sleep(timeout)
+        return timeout
+
+    target = (float(azimuth), float(elevation), float(zoom))
+    start = time.monotonic()
+    deadline = start + timeout
+    predicted = None
+    if cfg.travel_model:
+        predicted = get_travel_model().predict(cfg.camera_id, controller.move_origin, target)
+    if predicted is not None:
+        probe = min(timeout, predicted) * cfg.travel_model_probe
+        print(f"[SETTLE] {cfg.camera_id} - Model tahmini {predicted:.1f} sn, kontrol {probe:.1f} sn'de başlıyor "
+              f"(üst sınır {timeout:.0f} sn)")
+        time.sleep(probe)
+
+    settled = _poll_ptz_settle(controller, azimuth, elevation, zoom, start, deadline)
+    elapsed = time.monotonic() - start
+    if settled is None:
+        return elapsed
+
+    print(f"[SETTLE] {cfg.camera_id} - {settled:.1f} sn'de oturdu (üst sınır {timeout:.0f} sn)")
+    if controller.move_origin is not None:
+        get_travel_model().record(cfg.camera_id, controller.move_origin, target, settled)
+    return elapsed
+
+
 # ============================================================================
 # KONFIGÜRASYON YÜKLEME FONKSİYONLARI
 # ============================================================================
@@ -335,71 +649,253 @@ def get_global_settings(config_path: str) -> Dict:
     return data.get('global_settings', {})
 
 
+def get_setting(global_settings: Dict, key: str, default=None):
+    """
+    Tek bir ayarı oku: önce environment variable (KEY büyük harf), sonra global_settings.
+    """
+    raw = os.getenv(key.upper())
+    if raw is not None:
+        return raw
+    return global_settings.get(key, default)
+
+
+def _as_bool(value) -> bool:
+    """YAML/env değerini bool'a çevir ("true", "1", "yes", "evet" -> True)"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on", "evet")
+
+
 # ============================================================================
 # İNSAN ALGILAMA (YOLOv8)
 # ============================================================================
 
-# Global YOLOv8 model (bir kez yüklenir)
-_yolo_model = None
+# Global YOLOv8 modelleri (ağırlık dosyası başına bir kez yüklenir)
+DEFAULT_YOLO_WEIGHTS = 'yolov8s.pt'
+# İnsan kontrolü için JPEG bu uzun kenara kadar DCT seviyesinde küçültülerek decode edilir
+# (YOLO zaten 640'a indiriyor; kaplama oranı ölçekten bağımsız)
+PERSON_DETECT_MAX_SIDE = int(os.getenv("PERSON_DETECT_MAX_SIDE", "640"))
+_yolo_models: Dict[Tuple[str, int], object] = {}
+# Ultralytics predictor thread-safe değil; paralel kamera worker'ları modeli sırayla kullanır
+_yolo_lock = threading.Lock()
+# Inference backend (torch | onnx | openvino, opsiyonel INT8) - configure_inference_backend ile ayarlanır
+_inference_settings = BackendSettings()
+# Açıksa tespitler önce sıcak inference sidecar'ına gönderilir, erişilemezse in-process yapılır
+_use_inference_sidecar = False
+
+
+def configure_inference_backend(global_settings: Dict) -> None:
+    """global_settings'ten inference backend'ini ayarla; değiştiyse yüklü modeller bırakılır"""
+    global _inference_settings, _use_inference_sidecar
+    _use_inference_sidecar = _as_bool(get_setting(global_settings, 'inference_sidecar', False))
+    settings = BackendSettings(
+        backend=str(get_setting(global_settings, 'inference_backend', 'torch')),
+        int8=_as_bool(get_setting(global_settings, 'inference_int8', False)),
+        calibration_dir=get_setting(global_settings, 'int8_calibration_dir') or None,
+    ).normalized()
+    with _yolo_lock:
+        if settings != _inference_settings:
+            print(f"[YOLO] Inference backend: {settings.backend}{' (INT8)' if settings.int8 else ''}")
+            _inference_settings = settings
+            _yolo_models.clear()
+
+
+def get_yolo_model(weights: str = DEFAULT_YOLO_WEIGHTS, imgsz: int = 640):
+    """YOLOv8 model'ini lazy load et (ONNX/OpenVINO modelleri sabit imgsz ile dışa aktarılır)"""
+    key = (weights, imgsz)
+    with _yolo_lock:
+        if key not in _yolo_models:
+            print(f"[YOLO] Model yükleniyor ({weights})...")
+            # Varsayılan: YOLOv8s model (small versiyonu - daha hızlı)
+            settings = BackendSettings(
+                backend=_inference_settings.backend,
+                int8=_inference_settings.int8,
+                imgsz=imgsz,
+                calibration_dir=_inference_settings.calibration_dir,
+            )
+            _yolo_models[key] = load_detector(weights, settings)
+            print("[YOLO] Model yüklendi")
+    return _yolo_models[key]
 
-def get_yolo_model():
-    """YOLOv8 model'ini lazy load et"""
-    global _yolo_model
-    if _yolo_model is None:
-        print("[YOLO] Model yükleniyor...")
-        # YOLOv8s model (small versiyonu - daha hızlı)
-        _yolo_model = YOLO('yolov8s.pt')
-        print("[YOLO] Model yüklendi")
-    return _yolo_model
 
+def detect_person_boxes(image, weights: str = DEFAULT_YOLO_WEIGHTS, imgsz: int = 640,
+                        conf: Optional[float] = None) -> List[Tuple[float, float, float, float, float]]:
+    """
+    Görüntüdeki insan kutularını döndür: [(x1, y1, x2, y2, confidence), ...]
+    
+    Args:
+        image: Dosya yolu veya RGB numpy dizisi
+        weights: Model ağırlık dosyası (varsayılan yolov8s.pt)
+        imgsz: Model giriş boyutu (Ultralytics varsayılanı 640)
+        conf: Minimum güven eşiği (None = Ultralytics varsayılanı, 0.25)
+    """
+    if _use_inference_sidecar:
+        rgb = image if isinstance(image, np.ndarray) else np.asarray(Image.open(image).convert('RGB'))
+        remote = get_sidecar_client().detect([rgb], weights, imgsz=imgsz, conf=conf, classes=[0])
+        if remote is not None:
+            detections, _ = remote
+            return [(x1, y1, x2, y2, c) for x1, y1, x2, y2, c, cls in detections[0] if cls == 0]
+
+    if isinstance(image, np.ndarray):
+        image = np.ascontiguousarray(image[..., ::-1])  # Ultralytics numpy girdisini BGR bekler
+    else:
+        image = str(image)
+    predict_kwargs = {'imgsz': imgsz}
+    if conf is not None:
+        predict_kwargs['conf'] = conf
+    model = get_yolo_model(weights, imgsz)
+    with _yolo_lock:
+        results = model(image, **predict_kwargs)
+    
+    boxes = []
+    for result in results:
+        for box in result.boxes:
+            # Person class ID = 0 (COCO dataset'inde)
+            if int(box.cls) == 0:
+                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                boxes.append((float(x1), float(y1), float(x2), float(y2), float(box.conf)))
+    return boxes
+
+
+def compose_person_free_frame(frames: List[np.ndarray], boxes_per_frame: List[List[Tuple]],
+                              pad_ratio: float = 0.05) -> Tuple[np.ndarray, float]:
+    """
+    İnsan kutuları maskelenmiş karelerden piksel bazlı medyan ile insansız kare oluştur
+    
+    Returns:
+        (birleşik RGB uint8 kare, tüm karelerde maskeli kalan piksel oranı)
+    """
+    stack = np.stack(frames)  # (N, H, W, 3)
+    n, h, w = stack.shape[:3]
+    mask = np.zeros((n, h, w), dtype=bool)
+    for k, boxes in enumerate(boxes_per_frame):
+        for x1, y1, x2, y2, *_ in boxes:
+            px, py = (x2 - x1) * pad_ratio, (y2 - y1) * pad_ratio
+            mask[k, max(0, int(y1 - py)):min(h, int(y2 + py) + 1), max(0, int(x1 - px)):min(w, int(x2 + px) + 1)] = True
+
+    # Maskesiz pikseller için düz medyan (geçici hareketleri de temizler)
+    composite = np.median(stack, axis=0)
+    partial = mask.any(axis=0) & ~mask.all(axis=0)
+    if partial.any():
+        # Sadece kısmen maskeli pikseller için maskesiz karelerin medyanı
+        values = stack[:, partial].astype(np.float32)
+        values[mask[:, partial]] = np.nan
+        composite[partial] = np.nanmedian(values, axis=0)
+    hole_ratio = float(mask.all(axis=0).mean())
+    return np.clip(composite, 0, 255).astype(np.uint8), hole_ratio
+
+
+@dataclass
+class PersonCascadeSettings:
+    """İki aşamalı insan algılama: hızlı küçük model, sadece eşik yakınında yolov8s"""
+    fast_weights: str = 'yolov8n.pt'
+    fast_imgsz: int = 320
+    fast_conf: float = 0.1        # 1. aşama düşük eşikle çalışır; 0.25 altı kutular "belirsiz" sayılır
+    confident_conf: float = 0.25  # yolov8s'in varsayılan eşiği; bunun üstü kesin kutu
+    margin: float = 0.5           # min_coverage_ratio * (1 ± margin) bandı belirsiz kabul edilir
+
+
+def _coverage(boxes: List[Tuple], image_area: float) -> float:
+    """Kutuların toplam alanının görüntü alanına oranı"""
+    return sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2, *_ in boxes) / image_area
+
+
+def run_person_cascade(image: np.ndarray, min_coverage_ratio: float,
+                       settings: PersonCascadeSettings) -> Tuple[List[Tuple], Dict]:
+    """
+    İki aşamalı insan algılama.
+
+    1. aşama (yolov8n, küçük giriş) kesin kutuların kaplaması bandın dışındaysa ve belirsiz
+    kutular kararı değiştiremiyorsa karar verir. Aksi halde 2. aşama (yolov8s, tam çözünürlük)
+    çalışır ve kutuları onunkiler olur.
 
-def detect_humans_in_image(image_path: Path, min_coverage_ratio: float = 0.15) -> Tuple[bool, float, int]:
+    Returns:
+        (kutular, {'stage': 1|2, 'stage1_seconds', 'stage2_seconds'})
+    """
+    image_area = float(image.shape[0] * image.shape[1])
+    low = min_coverage_ratio * (1.0 - settings.margin)
+    high = min_coverage_ratio * (1.0 + settings.margin)
+
+    t0 = time.perf_counter()
+    fast_boxes = detect_person_boxes(image, settings.fast_weights, imgsz=settings.fast_imgsz, conf=settings.fast_conf)
+    timings = {'stage': 1, 'stage1_seconds': time.perf_counter() - t0, 'stage2_seconds': 0.0}
+
+    confident = [b for b in fast_boxes if b[4] >= settings.confident_conf]
+    confident_cov = _coverage(confident, image_area)
+    possible_cov = _coverage(fast_boxes, image_area)
+    if confident_cov >= high or possible_cov < low:
+        return confident, timings
+
+    t1 = time.perf_counter()
+    boxes = detect_person_boxes(image)
+    timings['stage'] = 2
+    timings['stage2_seconds'] = time.perf_counter() - t1
+    return boxes, timings
+
+
+def _load_detection_image(image_path) -> np.ndarray:
+    """
+    İnsan kontrolü için RGB dizi: burst birleşimi gibi zaten bellekte decode edilmiş dizi varsa
+    o kullanılır, yoksa JPEG küçültülerek decode edilir.
+    """
+    if isinstance(image_path, InMemorySnapshot):
+        if image_path.has_array:
+            return image_path.array
+        return decode_reduced(image_path.data, PERSON_DETECT_MAX_SIDE).array
+    return decode_reduced(image_path, PERSON_DETECT_MAX_SIDE).array
+
+
+def detect_humans_in_image(image_path, min_coverage_ratio: float = 0.15,
+                           cascade: Optional[PersonCascadeSettings] = None,
+                           roi: Optional[RegionOfInterest] = None) -> Tuple[bool, float, int]:
     """
     Görüntüde insan (tüm vücut) algıla - YOLOv8 kullanarak
     
     Args:
-        image_path: Görüntü dosya yolu
+        image_path: Görüntü dosya yolu veya InMemorySnapshot (bellekteki dizi tekrar decode edilmez)
         min_coverage_ratio: İnsanın görüntüyü kaplaması gereken minimum oran (varsayılan %15)
+        cascade: Verilirse iki aşamalı algılama (run_person_cascade) kullanılır
+        roi: Verilirse algılama sadece ROI karolarında yapılır, ROI dışındaki kişiler sayılmaz
+            (kaplama oranı yine tüm kare alanına göre hesaplanır)
     
     Returns:
         (has_human, coverage_ratio, person_count): İnsan var mı, kaplama oranı, insan sayısı
     """
     try:
-        # YOLOv8 model'ini al
-        model = get_yolo_model()
-        
-        # Görüntüyü analiz et
-        results = model(str(image_path))
-        
-        # Person class ID = 0 (COCO dataset'inde)
-        person_class_id = 0
-        
-        # Görüntü boyutlarını al
-        img = Image.open(image_path)
-        img_width, img_height = img.size
+        # Görüntüyü küçültülmüş olarak bir kez decode et (kademeli modda iki aşama da aynı diziyi kullanır)
+        image = _load_detection_image(image_path)
+        img_height, img_width = image.shape[:2]
         total_image_area = img_width * img_height
+        if cascade is not None:
+            timings = {'stage': 1, 'stage1_seconds': 0.0, 'stage2_seconds': 0.0}
+
+            def _cascade(tile: np.ndarray) -> List[Tuple]:
+                # Eşik karonun alanına göre ölçeklenir: karar tüm karedeki kaplamayla aynı kalır
+                tile_ratio = min_coverage_ratio * total_image_area / float(tile.shape[0] * tile.shape[1])
+                tile_boxes, t = run_person_cascade(tile, tile_ratio, cascade)
+                timings['stage'] = max(timings['stage'], t['stage'])
+                timings['stage1_seconds'] += t['stage1_seconds']
+                timings['stage2_seconds'] += t['stage2_seconds']
+                return tile_boxes
+
+            boxes = detect_in_roi(image, roi, _cascade)
+            print(f"[YOLO] Kademeli algılama: aşama {timings['stage']} "
+                  f"(1: {timings['stage1_seconds'] * 1000:.0f} ms, 2: {timings['stage2_seconds'] * 1000:.0f} ms)")
+        else:
+            boxes = detect_in_roi(image, roi, detect_person_boxes)
         
         # Person detection'ları bul
         person_detections = []
         total_person_area = 0
         
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Class ID kontrolü (0 = person)
-                if int(box.cls) == person_class_id:
-                    # Bounding box koordinatları [x1, y1, x2, y2]
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    person_width = x2 - x1
-                    person_height = y2 - y1
-                    person_area = person_width * person_height
-                    
-                    person_detections.append({
-                        'box': [x1, y1, x2, y2],
-                        'confidence': float(box.conf),
-                        'area': person_area
-                    })
-                    total_person_area += person_area
+        for x1, y1, x2, y2, conf in boxes:
+            person_area = (x2 - x1) * (y2 - y1)
+            person_detections.append({
+                'box': [x1, y1, x2, y2],
+                'confidence': conf,
+                'area': person_area
+            })
+            total_person_area += person_area
         
         if not person_detections:
             return False, 0.0, 0
@@ -418,6 +914,175 @@ def detect_humans_in_image(image_path: Path, min_coverage_ratio: float = 0.15) -
         return False, 0.0, 0
 
 
+def _prefilter_thumbnail(snapshot_path) -> np.ndarray:
+    """Ön filtre için 128x96 gri tonlamalı küçük kare (JPEG DCT seviyesinde küçültülür)"""
+    if isinstance(snapshot_path, InMemorySnapshot):
+        data = snapshot_path.data
+    else:
+        with open(snapshot_path, "rb") as f:
+            data = f.read()
+    return _frame_thumbnail(data, size=(128, 96))
+
+
+def check_humans_with_prefilter(
+    camera_config: CameraConfig,
+    target_name: str,
+    snapshot_path,
+    save_dir: Path,
+    min_coverage_ratio: float = 0.15
+) -> Tuple[bool, float, int]:
+    """
+    detect_humans_in_image'dan önce değişiklik ön filtresini uygula.
+
+    Kare, aynı kamera + hedefin son kabul edilen karesinden farksızsa YOLO çalıştırılmaz ve
+    insan yok kabul edilir. YOLO'dan geçip kabul edilen kare yeni referans olur.
+    Referans anahtarı save_dir.name (konfigürasyondaki kamera ID'si) + hedef adıdır.
+    """
+    mode = camera_config.change_prefilter
+    cascade = camera_config.person_cascade
+    roi = camera_config.target_rois.get(target_name)
+    if mode == 'off':
+        return detect_humans_in_image(snapshot_path, min_coverage_ratio, cascade, roi)
+
+    prefilter = get_change_prefilter()
+    camera_id = save_dir.name
+    try:
+        thumbnail = _prefilter_thumbnail(snapshot_path)
+    except Exception as e:
+        print(f"[UYARI] {target_name} - Ön filtre karesi hazırlanamadı: {e}")
+        return detect_humans_in_image(snapshot_path, min_coverage_ratio, cascade, roi)
+
+    unchanged, score = prefilter.is_unchanged(
+        camera_id, target_name, thumbnail, mode,
+        area_threshold=camera_config.change_area_threshold,
+        pixel_threshold=camera_config.change_pixel_threshold,
+        ssim_threshold=camera_config.change_ssim_threshold,
+        max_age_hours=camera_config.change_reference_max_age_hours,
+    )
+    if unchanged:
+        print(f"[DEĞİŞİKLİK YOK] {target_name} - {mode}={score:.3f}, insan algılama atlandı")
+        return False, 0.0, 0
+
+    has_human, coverage_ratio, person_count = detect_humans_in_image(snapshot_path, min_coverage_ratio, cascade, roi)
+    if not has_human:
+        prefilter.update_reference(camera_id, target_name, thumbnail)
+    return has_human, coverage_ratio, person_count
+
+
+def take_target_snapshot(
+    controller: CameraController,
+    target_name: str,
+    save_dir: Path,
+    snapshots_root: Optional[Path] = None,
+    skip_human_detection: bool = False,
+    camera_config: Optional[CameraConfig] = None
+) -> Optional[Path]:
+    """
+    Hedef için kare al: burst_frames > 1 ise insanları çıkarılmış birleşik kare, değilse tek kare.
+    Genel görünümde insan algılama yapılmadığı için burst de kullanılmaz.
+    in_memory_capture açıksa dosya yerine InMemorySnapshot döner. Burst / bellek içi çekim
+    ayarları camera_config'ten (hedefin konfigürasyonu), yoksa controller'ınkinden okunur.
+    """
+    cfg = camera_config or controller.config
+    if cfg.burst_frames > 1 and not skip_human_detection:
+        return controller.take_burst_snapshot(
+            target_name, save_dir, snapshots_root, frames=cfg.burst_frames, interval=cfg.burst_interval,
+            in_memory=cfg.in_memory_capture
+        )
+    if cfg.in_memory_capture:
+        return controller.take_snapshot_in_memory(target_name, save_dir)
+    return controller.take_snapshot(
+        target_name=target_name,
+        save_dir=save_dir,
+        snapshots_root=snapshots_root
+    )
+
+
+def _discard_snapshot(snapshot_path: Path) -> None:
+    """İnsan algılanan görüntüyü sil"""
+    if isinstance(snapshot_path, InMemorySnapshot):
+        print(f"[SİLİNDİ] İnsan algılanan görüntü atıldı (bellek): {snapshot_path.name}")
+        return
+    try:
+        snapshot_path.unlink()
+        print(f"[SİLİNDİ] İnsan algılanan görüntü silindi: {snapshot_path.name}")
+    except Exception as e:
+        print(f"[UYARI] Görüntü silinemedi: {e}")
+
+
+def _upload_accepted_snapshot(
+    camera_config: CameraConfig,
+    snapshot_path: Path,
+    save_dir: Path,
+    snapshots_root: Optional[Path] = None
+) -> Path:
+    """Kabul edilen snapshot'ı S3'e yükle, başarılıysa lokal dosyayı sil"""
+    if snapshots_root is None:
+        # save_dir = snapshots_root / camera_id olduğu için parent'ı al
+        snapshots_root = save_dir.parent
+
+    if isinstance(snapshot_path, InMemorySnapshot):
+        # Bellekteki buffer doğrudan yüklenir; disk yalnızca yükleme başarısızsa kullanılır
+        s3_key = _to_snapshot_s3_key(snapshot_path.path, snapshots_root)
+        if _upload_bytes_to_s3(snapshot_path.data, s3_key, content_type="image/jpeg", name=snapshot_path.name):
+            print(f"[✓] {camera_config.camera_id} - S3'e yüklendi: {s3_key}")
+        else:
+            try:
+                spooled = snapshot_path.spool_to_disk()
+                print(f"[UYARI] {camera_config.camera_id} - S3'e yüklenemedi, lokal dosyaya yazıldı: {spooled}")
+            except Exception as e:
+                print(f"[HATA] {camera_config.camera_id} - S3'e yüklenemedi ve lokal dosyaya yazılamadı: {e}")
+        return snapshot_path.path
+
+    s3_key = _to_snapshot_s3_key(snapshot_path, snapshots_root)
+    s3_result = _upload_file_to_s3(snapshot_path, s3_key, content_type="image/jpeg")
+
+    if s3_result:
+        print(f"[✓] {camera_config.camera_id} - S3'e yüklendi: {s3_key}")
+        # S3'e başarıyla yüklendikten sonra lokal dosyayı sil
+        try:
+            snapshot_path.unlink()
+            print(f"[✓] {camera_config.camera_id} - Lokal dosya silindi: {snapshot_path.name}")
+        except Exception as e:
+            print(f"[UYARI] Lokal dosya silinemedi: {e}")
+    else:
+        print(f"[UYARI] {camera_config.camera_id} - S3'e yüklenemedi, lokal dosya korunuyor: {snapshot_path.name}")
+
+    return snapshot_path
+
+
+def check_and_upload_snapshot(
+    camera_config: CameraConfig,
+    target_name: str,
+    snapshot_path: Path,
+    save_dir: Path,
+    snapshots_root: Optional[Path] = None,
+    min_coverage_ratio: float = 0.15,
+    skip_human_detection: bool = False
+) -> Optional[Path]:
+    """
+    Alınmış bir snapshot için insan kontrolü + S3 yükleme (tek deneme, PTZ hareketi yok).
+
+    Pipeline modunda arka plan worker'larında çalışır. İnsan algılanırsa görüntü silinir
+    ve None döner; hedefin tekrar çekilmesi çağırana kalır.
+    """
+    if skip_human_detection:
+        has_human, coverage_ratio, person_count = False, 0.0, 0
+    else:
+        has_human, coverage_ratio, person_count = check_humans_with_prefilter(
+            camera_config, target_name, snapshot_path, save_dir, min_coverage_ratio
+        )
+
+    if has_human:
+        print(f"[İNSAN ALGILANDI] {target_name} - Kaplama: {coverage_ratio:.1%}, İnsan sayısı: {person_count}")
+        _discard_snapshot(snapshot_path)
+        return None
+
+    if person_count > 0:
+        print(f"[OK] {target_name} - İnsan var ama kaplama yeterli değil ({coverage_ratio:.1%} < {min_coverage_ratio:.1%})")
+    return _upload_accepted_snapshot(camera_config, snapshot_path, save_dir, snapshots_root)
+
+
 def capture_snapshot_with_retry(
     controller: CameraController,
     camera_config: CameraConfig,
@@ -428,7 +1093,8 @@ def capture_snapshot_with_retry(
     max_retries: int = 5,
     min_coverage_ratio: float = 0.15,
     retry_delay: float = 3.0,
-    skip_human_detection: bool = False  # Genel görünüm için insan algılama yapılmaz
+    skip_human_detection: bool = False,  # Genel görünüm için insan algılama yapılmaz
+    file_prefix: Optional[str] = None
 ) -> Optional[Path]:
     """
     Snapshot al ve insan algılanırsa tekrar çek
@@ -436,13 +1102,14 @@ def capture_snapshot_with_retry(
     Args:
         controller: Kamera kontrolcüsü
         camera_config: Kamera konfigürasyonu
-        target_name: Hedef adı
+        target_name: Hedef adı (ROI ve ön filtre referansı bu adla bulunur)
         ptz_coords: PTZ koordinatları (azimuth, elevation, zoom)
         save_dir: Kayıt dizini
         snapshots_root: Snapshots kök dizini (S3 key oluşturmak için, opsiyonel)
         max_retries: Maksimum tekrar deneme sayısı
         min_coverage_ratio: İnsanın görüntüyü kaplaması gereken minimum oran
         retry_delay: Tekrar deneme arası bekleme süresi (saniye)
+        file_prefix: Dosya adı öneki (varsayılan target_name; tur sonu tekrarında <hedef>_retry)
     
     Returns:
         Snapshot dosya yolu veya None
@@ -457,18 +1124,16 @@ def capture_snapshot_with_retry(
             if attempt > 0:
                 print(f"[RETRY {attempt}] PTZ pozisyonuna gidiliyor...")
                 controller.move_ptz(az, el, zz)
-                time.sleep(camera_config.move_settle_seconds)
+                wait_for_ptz_settle(controller, az, el, zz)
             
             # Snapshot al
             if attempt == 0:
-                filename_prefix = target_name
+                filename_prefix = file_prefix or target_name
             else:
-                filename_prefix = f"{target_name}_retry{attempt+1}"
+                filename_prefix = f"{file_prefix or target_name}_retry{attempt+1}"
             
-            snapshot_path = controller.take_snapshot(
-                target_name=filename_prefix,
-                save_dir=save_dir,
-                snapshots_root=snapshots_root
+            snapshot_path = take_target_snapshot(
+                controller, filename_prefix, save_dir, snapshots_root, skip_human_detection, camera_config
             )
             
             if not snapshot_path:
@@ -486,21 +1151,18 @@ def capture_snapshot_with_retry(
                 person_count = 0
                 print(f"[GENEL GÖRÜNÜM] {target_name} - İnsan algılama atlandı (batch için)")
             else:
-                has_human, coverage_ratio, person_count = detect_humans_in_image(
-                    snapshot_path, 
+                has_human, coverage_ratio, person_count = check_humans_with_prefilter(
+                    camera_config,
+                    target_name,
+                    snapshot_path,
+                    save_dir,
                     min_coverage_ratio
                 )
             
             if has_human:
                 print(f"[İNSAN ALGILANDI] {target_name} - Kaplama: {coverage_ratio:.1%}, İnsan sayısı: {person_count}")
-                
-                # İnsan algılanan görüntüyü sil
-                try:
-                    snapshot_path.unlink()
-                    print(f"[SİLİNDİ] İnsan algılanan görüntü silindi: {snapshot_path.name}")
-                except Exception as e:
-                    print(f"[UYARI] Görüntü silinemedi: {e}")
-                
+                _discard_snapshot(snapshot_path)
+
                 if attempt < max_retries - 1:
                     print(f"[RETRY {attempt+1}/{max_retries}] İnsan algılandı, tekrar çekiliyor...")
                     time.sleep(retry_delay)
@@ -514,27 +1176,8 @@ def capture_snapshot_with_retry(
                 # İnsan yok, görüntü kabul edilebilir
                 if person_count > 0:
                     print(f"[OK] {target_name} - İnsan var ama kaplama yeterli değil ({coverage_ratio:.1%} < {min_coverage_ratio:.1%})")
-                
-                # S3'e yükle (insan kontrolünden sonra)
-                if snapshots_root is None:
-                    # save_dir = snapshots_root / camera_id olduğu için parent'ı al
-                    snapshots_root = save_dir.parent
-                
-                s3_key = _to_snapshot_s3_key(snapshot_path, snapshots_root)
-                s3_result = _upload_file_to_s3(snapshot_path, s3_key, content_type="image/jpeg")
-                
-                if s3_result:
-                    print(f"[✓] {camera_config.camera_id} - S3'e yüklendi: {s3_key}")
-                    # S3'e başarıyla yüklendikten sonra lokal dosyayı sil
-                    try:
-                        snapshot_path.unlink()
-                        print(f"[✓] {camera_config.camera_id} - Lokal dosya silindi: {snapshot_path.name}")
-                    except Exception as e:
-                        print(f"[UYARI] Lokal dosya silinemedi: {e}")
-                else:
-                    print(f"[UYARI] {camera_config.camera_id} - S3'e yüklenemedi, lokal dosya korunuyor: {snapshot_path.name}")
-                
-                return snapshot_path
+
+                return _upload_accepted_snapshot(camera_config, snapshot_path, save_dir, snapshots_root)
                 
         except Exception as e:
             print(f"[HATA] Snapshot alma hatası (deneme {attempt+1}/{max_retries}): {e}")
@@ -546,10 +1189,392 @@ def capture_snapshot_with_retry(
     return None
 
 
+# ============================================================================
+# TUR HEDEFLERİ
+# ============================================================================
+
+@dataclass
+class TourTarget:
+    """Bir PTZ turundaki tek hedef ve snapshot'ının kaydedileceği yer"""
+    target_name: str
+    coords: Dict
+    camera_id: str            # Klasör / S3 yolu için konfigürasyondaki kamera ID'si
+    snapshots_root: Path      # Konfigürasyonun snapshots_root'u (S3 prefix'i buradan türetilir)
+    skip_human_detection: bool = False  # Genel görünüm için insan algılama yapılmaz
+    # Hedefin kendi konfigürasyonu: birleşik turda (merge_tours_by_host) ROI, ön filtre, cascade,
+    # burst ve bellek içi çekim hedefin geldiği dosyadaki kameraya göre uygulanır
+    camera_config: Optional[CameraConfig] = None
+
+    def config_or(self, tour_config: CameraConfig) -> CameraConfig:
+        """Hedef bazlı ayarlar için konfigürasyon (yoksa turun konfigürasyonu)"""
+        return self.camera_config or tour_config
+
+    @property
+    def save_dir(self) -> Path:
+        return self.snapshots_root / self.camera_id
+
+    @property
+    def ptz_coords(self) -> Dict:
+        return {
+            'azimuth': self.coords['azimuth'],
+            'elevation': self.coords['elevation'],
+            'zoom': self.coords['zoom'],
+        }
+
+
+def _resolve_snapshots_root(global_settings: Dict) -> Path:
+    """global_settings.snapshots_root'u script dizinine göre mutlak yola çevir"""
+    snapshots_root = Path(global_settings.get('snapshots_root', 'snapshots'))
+    if not snapshots_root.is_absolute():
+        snapshots_root = Path(__file__).parent / snapshots_root
+    return snapshots_root
+
+
+def build_tour_targets(camera_config: CameraConfig, snapshots_root: Path) -> List[TourTarget]:
+    """Kameranın ptz_targets'ını (YAML sırasıyla) tur hedeflerine çevir"""
+    # Genel görünüm için insan algılama yapılmaz (reyon_genel klasörü kontrolü)
+    is_genel_gorunum = 'reyon_genel' in str(snapshots_root)
+    return [
+        TourTarget(target_name, coords, camera_config.camera_id, snapshots_root, is_genel_gorunum, camera_config)
+        for target_name, coords in camera_config.ptz_targets.items()
+    ]
+
+
+def _result_entry(target: TourTarget, snapshot_path, timestamp: str) -> Dict:
+    return {
+        'target_name': target.target_name,
+        'snapshot_path': str(snapshot_path),
+        'ptz_coords': target.ptz_coords,
+        'timestamp': timestamp
+    }
+
+
+# ============================================================================
+# PIPELINE MODU (HAREKET/BEKLEME SIRASINDA ARKA PLAN KONTROL + YÜKLEME)
+# ============================================================================
+
+def capture_targets_pipelined(
+    controller: CameraController,
+    camera_config: CameraConfig,
+    targets: List[TourTarget],
+    workers: int = 2,
+    max_retries: int = 5,
+    min_coverage_ratio: float = 0.15,
+    retry_delay: float = 3.0,
+    revisit: Optional['RevisitSettings'] = None
+) -> List[Tuple[TourTarget, Dict]]:
+    """
+    Hedefleri pipeline halinde gez.
+
+    Kare byte'ları alındıktan hemen sonra bir sonraki hedefe PTZ hareketi gönderilir;
+    insan algılama ve S3 yükleme arka plan worker'larında bekleme süresi içinde yapılır.
+    İnsan algılanan veya alınamayan hedefler tur sonunda klasik
+    capture_snapshot_with_retry akışıyla (kalan deneme hakkıyla) tekrar çekilir;
+    revisit verilmişse bunun yerine ertelenmiş tekrar çekim turlarıyla gezilir.
+
+    Returns:
+        Tur sırasına göre (hedef, sonuç) listesi
+    """
+    camera_id = camera_config.camera_id
+    total_targets = len(targets)
+    accepted: Dict[int, Dict] = {}
+    retry_indices: List[int] = []
+    pending = []
+
+    def _move(i: int) -> bool:
+        target = targets[i]
+        az, el, zz = target.coords["azimuth"], target.coords["elevation"], target.coords["zoom"]
+        print(f"[{camera_id}] {target.target_name} → PTZ hareket: az={az}, el={el}, zoom={zz} ({i+1}/{total_targets})")
+        try:
+            controller.move_ptz(az, el, zz)
+            return True
+        except Exception as e:
+            print(f"[HATA] {camera_id} - {target.target_name} PTZ hareket hatası: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{camera_id}-post") as executor:
+        moved = _move(0) if targets else False
+        if moved:
+            first = targets[0].coords
+            wait_for_ptz_settle(controller, first["azimuth"], first["elevation"], first["zoom"])
+
+        for i, target in enumerate(targets):
+            snapshot_path = None
+            if moved:
+                try:
+                    snapshot_path = take_target_snapshot(
+                        controller, target.target_name, target.save_dir, target.snapshots_root,
+                        target.skip_human_detection, target.config_or(camera_config)
+                    )
+                except Exception as e:
+                    print(f"[HATA] {camera_id} - {target.target_name} snapshot hatası: {e}")
+            captured_at = get_turkey_time().isoformat()
+
+            # Kare alındı: kontrol/yükleme beklenmeden sonraki hedefe hareket başlar
+            has_next = i + 1 < total_targets
+            if has_next:
+                moved = _move(i + 1)
+
+            if snapshot_path:
+                future = executor.submit(
+                    check_and_upload_snapshot,
+                    target.config_or(camera_config), target.target_name, snapshot_path, target.save_dir, target.snapshots_root,
+                    min_coverage_ratio, target.skip_human_detection
+                )
+                pending.append((i, captured_at, future))
+            else:
+                retry_indices.append(i)
+
+            if has_next and moved:
+                # İnsan algılama ve S3 yükleme bu bekleme süresi içinde arka planda çalışır
+                nxt = targets[i + 1].coords
+                wait_for_ptz_settle(controller, nxt["azimuth"], nxt["elevation"], nxt["zoom"])
+
+        for i, captured_at, future in pending:
+            try:
+                snapshot_path = future.result()
+            except Exception as e:
+                print(f"[HATA] {camera_id} - {targets[i].target_name} arka plan işlemi hatası: {e}")
+                snapshot_path = None
+            if snapshot_path:
+                accepted[i] = _result_entry(targets[i], snapshot_path, captured_at)
+            else:
+                retry_indices.append(i)
+
+    # İnsan algılanan / alınamayan hedefleri tur sonunda tekrar çek
+    if max_retries <= 1:
+        retry_indices = []
+    if revisit is not None:
+        queue = [DeferredTarget(i, targets[i]) for i in sorted(retry_indices)]
+        _drain_deferred_targets(controller, camera_config, queue, accepted, revisit, min_coverage_ratio)
+        retry_indices = []
+    if retry_indices:
+        print(f"[{camera_id}] {len(retry_indices)} hedef tekrar çekilecek...")
+    for i in sorted(retry_indices):
+        target = targets[i]
+        try:
+            ptz_coords = target.ptz_coords
+            print(f"[RETRY] {camera_id} - {target.target_name} PTZ pozisyonuna gidiliyor...")
+            controller.move_ptz(ptz_coords['azimuth'], ptz_coords['elevation'], ptz_coords['zoom'])
+            wait_for_ptz_settle(controller, ptz_coords['azimuth'], ptz_coords['elevation'], ptz_coords['zoom'])
+            snapshot_path = capture_snapshot_with_retry(
+                controller=controller,
+                camera_config=target.config_or(camera_config),
+                target_name=target.target_name,
+                ptz_coords=ptz_coords,
+                save_dir=target.save_dir,
+                snapshots_root=target.snapshots_root,
+                max_retries=max_retries - 1,
+                min_coverage_ratio=min_coverage_ratio,
+                retry_delay=retry_delay,
+                skip_human_detection=target.skip_human_detection,
+                file_prefix=f"{target.target_name}_retry"
+            )
+            if snapshot_path:
+                accepted[i] = _result_entry(target, snapshot_path, get_turkey_time().isoformat())
+        except Exception as e:
+            print(f"[HATA] {camera_id} - {target.target_name} tekrar çekilirken hata: {e}")
+
+    results = []
+    for i, target in enumerate(targets):
+        if i not in accepted:
+            print(f"[UYARI] {camera_id} - {target.target_name} snapshot alınamadı")
+            continue
+        results.append((target, accepted[i]))
+    return results
+
+
+# ============================================================================
+# ERTELENMİŞ TEKRAR ÇEKİM (İNSAN ALGILANAN HEDEFLER)
+# ============================================================================
+
+@dataclass
+class RevisitSettings:
+    """Ertelenmiş tekrar çekim ayarları"""
+    max_attempts: int = 5         # Hedef başına toplam deneme (ilk çekim dahil)
+    nearby_radius: float = 15.0   # Bu PTZ mesafesinde geçilirken tekrar denenir (derece + zoom)
+    min_delay: float = 20.0       # Tekrar denemeden önce geçmesi gereken süre (sn)
+
+
+@dataclass
+class DeferredTarget:
+    """İnsan algılandığı için sonraya bırakılan hedef"""
+    index: int                    # Tur içindeki sırası
+    target: TourTarget
+    attempts: int = 1
+    deferred_at: float = field(default_factory=time.monotonic)
+
+
+def _get_revisit_settings(global_settings: Dict) -> Optional[RevisitSettings]:
+    """deferred_retry açıksa ayarları döndür, kapalıysa None"""
+    if not _as_bool(get_setting(global_settings, 'deferred_retry', False)):
+        return None
+    try:
+        return RevisitSettings(
+            max_attempts=int(get_setting(global_settings, 'deferred_max_attempts', 5)),
+            nearby_radius=float(get_setting(global_settings, 'revisit_radius', 15.0)),
+            min_delay=float(get_setting(global_settings, 'revisit_min_delay', 20.0)),
+        )
+    except (TypeError, ValueError) as e:
+        print(f"[UYARI] Geçersiz ertelenmiş tekrar çekim ayarı, varsayılanlar kullanılıyor: {e}")
+        return RevisitSettings()
+
+
+def _capture_once(controller: CameraController, camera_config: CameraConfig, target: TourTarget,
+                  attempt: int = 0, min_coverage_ratio: float = 0.15) -> Optional[Path]:
+    """Mevcut konumda tek çekim + insan kontrolü + S3 yükleme (bekleme/tekrar yok)"""
+    prefix = target.target_name if attempt == 0 else f"{target.target_name}_retry{attempt+1}"
+    target_config = target.config_or(camera_config)
+    snapshot_path = take_target_snapshot(
+        controller, prefix, target.save_dir, target.snapshots_root, target.skip_human_detection, target_config
+    )
+    if not snapshot_path:
+        return None
+    return check_and_upload_snapshot(
+        target_config, target.target_name, snapshot_path, target.save_dir, target.snapshots_root,
+        min_coverage_ratio, target.skip_human_detection
+    )
+
+
+def _visit_deferred_target(controller: CameraController, camera_config: CameraConfig, item: DeferredTarget,
+                           queue: List[DeferredTarget], accepted: Dict[int, Dict],
+                           revisit: RevisitSettings, min_coverage_ratio: float) -> None:
+    """Ertelenmiş hedefe git ve bir kez dene; yine insan varsa deneme hakkı kaldıysa kuyruğa geri koy"""
+    target = item.target
+    coords = target.ptz_coords
+    print(f"[REVISIT {item.attempts+1}/{revisit.max_attempts}] {camera_config.camera_id} - {target.target_name}")
+    snapshot_path = None
+    try:
+        controller.move_ptz(coords['azimuth'], coords['elevation'], coords['zoom'])
+        wait_for_ptz_settle(controller, coords['azimuth'], coords['elevation'], coords['zoom'])
+        snapshot_path = _capture_once(controller, camera_config, target, item.attempts, min_coverage_ratio)
+    except Exception as e:
+        print(f"[HATA] {camera_config.camera_id} - {target.target_name} tekrar çekilirken hata: {e}")
+
+    if snapshot_path:
+        accepted[item.index] = _result_entry(target, snapshot_path, get_turkey_time().isoformat())
+        return
+    item.attempts += 1
+    item.deferred_at = time.monotonic()
+    if item.attempts < revisit.max_attempts:
+        queue.append(item)
+    else:
+        print(f"[ATLANDI] {target.target_name} - {revisit.max_attempts} denemede insansız görüntü alınamadı")
+
+
+def _revisit_nearby_targets(controller: CameraController, camera_config: CameraConfig,
+                            queue: List[DeferredTarget], accepted: Dict[int, Dict],
+                            revisit: RevisitSettings, min_coverage_ratio: float,
+                            next_coords: Optional[Dict] = None) -> None:
+    """
+    Kamera ertelenmiş bir hedefin yakınından geçiyorsa (ve yeterli süre geçtiyse) o hedefi şimdi dene.
+
+    Yakınlık, mevcut konumdan hedefe gidip sonraki hedefe devam etmenin ek maliyetiyle ölçülür;
+    böylece tur boyunca zaten geçilen bölgedeki hedefler boşta bekleme olmadan toplanır.
+    """
+    for item in list(queue):
+        if controller.position is None:
+            return
+        if time.monotonic() - item.deferred_at < revisit.min_delay:
+            continue
+        here = dict(zip(('azimuth', 'elevation', 'zoom'), controller.position))
+        detour = ptz_distance(here, item.target.coords)
+        if next_coords is not None:
+            detour += ptz_distance(item.target.coords, next_coords) - ptz_distance(here, next_coords)
+        if detour > revisit.nearby_radius:
+            continue
+        queue.remove(item)
+        _visit_deferred_target(controller, camera_config, item, queue, accepted, revisit, min_coverage_ratio)
+
+
+def _drain_deferred_targets(controller: CameraController, camera_config: CameraConfig,
+                            queue: List[DeferredTarget], accepted: Dict[int, Dict],
+                            revisit: RevisitSettings, min_coverage_ratio: float = 0.15) -> None:
+    """Tur sonunda kuyrukta kalan hedefleri, deneme hakları bitene kadar turlar halinde gez"""
+    if queue:
+        print(f"[{camera_config.camera_id}] {len(queue)} ertelenmiş hedef tekrar çekilecek...")
+    while queue:
+        round_items = list(queue)
+        queue.clear()
+        if camera_config.route_optimization and len(round_items) > 1:
+            start = dict(zip(('azimuth', 'elevation', 'zoom'), controller.position)) if controller.position else None
+            planned = plan_route([(item, item.target.coords) for item in round_items],
+                                 camera_config.route_zoom_weight, start=start)
+            round_items = [item for item, _ in planned]
+        for item in round_items:
+            _visit_deferred_target(controller, camera_config, item, queue, accepted, revisit, min_coverage_ratio)
+
+
 # ============================================================================
 # SNAPSHOT ALMA FONKSİYONLARI
 # ============================================================================
 
+def run_camera_tour(
+    controller: CameraController,
+    camera_config: CameraConfig,
+    targets: List[TourTarget],
+    global_settings: Dict
+) -> Tuple[List[Tuple[TourTarget, Dict]], Dict]:
+    """
+    Bir fiziksel kameranın turunu gez (rota optimizasyonu + sıralı/pipeline yakalama)
+
+    Returns:
+        ((hedef, sonuç) listesi, tur raporu: varsa 'route' ve 'prefilter' anahtarları)
+    """
+    camera_id = camera_config.camera_id
+    tour_report = {}
+    route_report = None
+    if camera_config.route_optimization and len(targets) > 2:
+        items = [(t, t.coords) for t in targets]
+        yaml_travel = route_length(items, camera_config.route_zoom_weight)
+        targets = [t for t, _ in plan_route(items, camera_config.route_zoom_weight)]
+        planned_travel = route_length([(t, t.coords) for t in targets], camera_config.route_zoom_weight)
+        route_report = {
+            'order': [t.target_name for t in targets],
+            'yaml_order_travel': round(yaml_travel, 1),
+            'planned_travel': round(planned_travel, 1),
+            'saved_travel': round(yaml_travel - planned_travel, 1),
+        }
+        print(f"[{camera_id}] Rota optimize edildi: {yaml_travel:.0f} → {planned_travel:.0f} "
+              f"(kazanç {yaml_travel - planned_travel:.0f}) | Sıra: {', '.join(route_report['order'])}")
+        tour_report['route'] = route_report
+
+    # Ön filtre sayaçları kamera ID'si bazında tutulur; bu turun hedeflerine ait olanları sıfırla
+    target_camera_ids = {t.camera_id for t in targets}
+    prefilter = get_change_prefilter()
+    prefilter.reset_stats(target_camera_ids)
+
+    revisit = _get_revisit_settings(global_settings)
+    if _as_bool(get_setting(global_settings, 'pipelined_capture', False)):
+        # Pipeline modu: kare alınır alınmaz sonraki hedefe hareket, kontrol/yükleme arka planda
+        try:
+            workers = max(1, int(get_setting(global_settings, 'pipeline_workers', 2)))
+        except (TypeError, ValueError):
+            workers = 2
+        results = capture_targets_pipelined(
+            controller=controller,
+            camera_config=camera_config,
+            targets=targets,
+            workers=workers,
+            revisit=revisit,
+        )
+    elif revisit is not None:
+        results = _capture_targets_deferred(controller, camera_config, targets, revisit)
+    else:
+        results = _capture_targets_sequential(controller, camera_config, targets)
+
+    # Tur boyunca toplanan hareket süresi ölçümleri dosyaya tur sonunda bir kez yazılır
+    if camera_config.settle_detection or camera_config.travel_model:
+        get_travel_model().save()
+
+    prefilter_report = prefilter.tour_report(target_camera_ids)
+    if prefilter_report:
+        tour_report['prefilter'] = prefilter_report
+        print(f"[{camera_id}] Ön filtre: {prefilter_report['skipped_detection']}/{prefilter_report['checked']} "
+              f"karede YOLO atlandı (isabet %{prefilter_report['hit_rate'] * 100:.0f})")
+    return results, tour_report
+
+
 def capture_camera_snapshots(camera_id: str, config_path: str = 'cameras.yaml') -> Dict:
     """
     Tek bir kameradan tüm PTZ hedeflerini yakala
@@ -564,82 +1589,161 @@ def capture_camera_snapshots(camera_id: str, config_path: str = 'cameras.yaml')
         
         camera_config = camera_configs[camera_id]
         controller = CameraController(camera_config)
+        configure_inference_backend(global_settings)
         
         # Snapshot klasörü
-        snapshots_root = Path(global_settings.get('snapshots_root', 'snapshots'))
-        if not snapshots_root.is_absolute():
-            script_dir = Path(__file__).parent
-            snapshots_root = script_dir / snapshots_root
+        snapshots_root = _resolve_snapshots_root(global_settings)
         
         # Tüm hedefleri yakala
-        results = []
         total_targets = len(camera_config.ptz_targets)
         
         print(f"\n[{camera_id}] {camera_config.name}")
         print(f"[{camera_id}] {total_targets} hedef işlenecek...")
         
-        for i, (target_name, coords) in enumerate(camera_config.ptz_targets.items()):
-            try:
-                az = coords["azimuth"]
-                el = coords["elevation"]
-                zz = coords["zoom"]
-
-                # PTZ hareket
-                print(f"[{camera_id}] {target_name} → PTZ hareket: az={az}, el={el}, zoom={zz} ({i+1}/{total_targets})")
-                controller.move_ptz(az, el, zz)
-                
-                # Bekleme süresi
-                time.sleep(camera_config.move_settle_seconds)
-                
-                # Snapshot al (insan algılama ile tekrar çekme özelliği ile)
-                ptz_coords = {'azimuth': az, 'elevation': el, 'zoom': zz}
-                
-                # Genel görünüm için insan algılama yapılmaz (reyon_genel klasörü kontrolü)
-                is_genel_gorunum = 'reyon_genel' in str(snapshots_root)
-                
-                snapshot_path = capture_snapshot_with_retry(
-                    controller=controller,
-                    camera_config=camera_config,
-                    target_name=target_name,
-                    ptz_coords=ptz_coords,
-                    save_dir=snapshots_root / camera_id,
-                    snapshots_root=snapshots_root,
-                    max_retries=5,  # Maksimum 5 deneme
-                    min_coverage_ratio=0.15,  # %15 kaplama oranı
-                    retry_delay=3.0,  # 3 saniye bekleme
-                    skip_human_detection=is_genel_gorunum  # Genel görünüm için insan algılama yapılmaz
-                )
-                
-                if snapshot_path:
-                    results.append({
-                        'target_name': target_name,
-                        'snapshot_path': str(snapshot_path),
-                        'ptz_coords': {'azimuth': az, 'elevation': el, 'zoom': zz},
-                        'timestamp': get_turkey_time().isoformat()
-                    })
-                else:
-                    print(f"[UYARI] {camera_id} - {target_name} snapshot alınamadı")
-                
-            except Exception as e:
-                print(f"[HATA] {camera_id} - {target_name} yakalanırken hata: {e}")
-                continue
+        targets = build_tour_targets(camera_config, snapshots_root)
+        tour_results, tour_report = run_camera_tour(controller, camera_config, targets, global_settings)
+        results = [entry for _, entry in tour_results]
         
         print(f"[✓] {camera_id} - Tamamlandı: {len(results)}/{total_targets} snapshot alındı")
         
-        return {
+        summary = {
             'camera_id': camera_id,
             'total_snapshots': len(results),
             'snapshots': results,
             'timestamp': get_turkey_time().isoformat()
         }
+        summary.update(tour_report)
+        return summary
         
     except Exception as e:
         print(f"[HATA] {camera_id} - Snapshot yakalama başarısız: {e}")
         raise
 
 
+def _capture_targets_sequential(
+    controller: CameraController,
+    camera_config: CameraConfig,
+    targets: List[TourTarget]
+) -> List[Tuple[TourTarget, Dict]]:
+    """Hedefleri sırayla gez: hareket → bekleme → snapshot (insan algılama ile tekrar çekme)"""
+    camera_id = camera_config.camera_id
+    total_targets = len(targets)
+    results = []
+    for i, target in enumerate(targets):
+        target_name = target.target_name
+        try:
+            az = target.coords["azimuth"]
+            el = target.coords["elevation"]
+            zz = target.coords["zoom"]
+
+            # PTZ hareket
+            print(f"[{camera_id}] {target_name} → PTZ hareket: az={az}, el={el}, zoom={zz} ({i+1}/{total_targets})")
+            controller.move_ptz(az, el, zz)
+            
+            # Bekleme süresi (settle_detection açıksa konum geri bildirimiyle erken biter)
+            wait_for_ptz_settle(controller, az, el, zz)
+            
+            # Snapshot al (insan algılama ile tekrar çekme özelliği ile)
+            snapshot_path = capture_snapshot_with_retry(
+                controller=controller,
+                camera_config=target.config_or(camera_config),
+                target_name=target_name,
+                ptz_coords=target.ptz_coords,
+                save_dir=target.save_dir,
+                snapshots_root=target.snapshots_root,
+                max_retries=5,  # Maksimum 5 deneme
+                min_coverage_ratio=0.15,  # %15 kaplama oranı
+                retry_delay=3.0,  # 3 saniye bekleme
+                skip_human_detection=target.skip_human_detection  # Genel görünüm için insan algılama yapılmaz
+            )
+            
+            if snapshot_path:
+                results.append((target, _result_entry(target, snapshot_path, get_turkey_time().isoformat())))
+            else:
+                print(f"[UYARI] {camera_id} - {target_name} snapshot alınamadı")
+            
+        except Exception as e:
+            print(f"[HATA] {camera_id} - {target_name} yakalanırken hata: {e}")
+            continue
+
+    return results
+
+
+def _capture_targets_deferred(
+    controller: CameraController,
+    camera_config: CameraConfig,
+    targets: List[TourTarget],
+    revisit: RevisitSettings,
+    min_coverage_ratio: float = 0.15
+) -> List[Tuple[TourTarget, Dict]]:
+    """
+    Hedefleri sırayla gez; insan algılanan hedefte beklemek yerine hedefi ertele.
+
+    Ertelenen hedefler kamera yakınlarından geçerken (revisit_radius, revisit_min_delay) ya da
+    tur sonunda tekrar denenir; bu sürede alışveriş yapan kişi genelde uzaklaşmış olur.
+    """
+    camera_id = camera_config.camera_id
+    total_targets = len(targets)
+    accepted: Dict[int, Dict] = {}
+    queue: List[DeferredTarget] = []
+
+    for i, target in enumerate(targets):
+        coords = target.ptz_coords
+        try:
+            print(f"[{camera_id}] {target.target_name} → PTZ hareket: az={coords['azimuth']}, "
+                  f"el={coords['elevation']}, zoom={coords['zoom']} ({i+1}/{total_targets})")
+            controller.move_ptz(coords['azimuth'], coords['elevation'], coords['zoom'])
+            wait_for_ptz_settle(controller, coords['azimuth'], coords['elevation'], coords['zoom'])
+            snapshot_path = _capture_once(controller, camera_config, target, 0, min_coverage_ratio)
+        except Exception as e:
+            print(f"[HATA] {camera_id} - {target.target_name} yakalanırken hata: {e}")
+            snapshot_path = None
+
+        if snapshot_path:
+            accepted[i] = _result_entry(target, snapshot_path, get_turkey_time().isoformat())
+        elif revisit.max_attempts > 1:
+            print(f"[ERTELENDİ] {camera_id} - {target.target_name} tur içinde tekrar denenecek")
+            queue.append(DeferredTarget(i, target))
+
+        next_coords = targets[i + 1].coords if i + 1 < total_targets else None
+        _revisit_nearby_targets(controller, camera_config, queue, accepted, revisit, min_coverage_ratio, next_coords)
+
+    _drain_deferred_targets(controller, camera_config, queue, accepted, revisit, min_coverage_ratio)
+
+    results = []
+    for i, target in enumerate(targets):
+        if i not in accepted:
+            print(f"[UYARI] {camera_id} - {target.target_name} snapshot alınamadı")
+            continue
+        results.append((target, accepted[i]))
+    return results
+
+
+def _get_max_concurrent_cameras(config_path: str, camera_count: int) -> int:
+    """
+    Aynı anda işlenecek kamera sayısını belirle.
+
+    Öncelik: MAX_CONCURRENT_CAMERAS env > global_settings.max_concurrent_cameras > kamera sayısı.
+    1 verilirse kameralar eskisi gibi sırayla işlenir.
+    """
+    raw = get_setting(get_global_settings(config_path), 'max_concurrent_cameras')
+    try:
+        limit = int(raw) if raw is not None else camera_count
+    except (TypeError, ValueError):
+        print(f"[UYARI] Geçersiz max_concurrent_cameras değeri: {raw}, kamera sayısı kullanılıyor")
+        limit = camera_count
+    return max(1, min(limit, camera_count))
+
+
 def process_single_configuration(config_path: str) -> Dict:
-    """Tek bir konfigürasyon dosyasındaki tüm kameraları işle"""
+    """
+    Tek bir konfigürasyon dosyasındaki tüm kameraları işle
+
+    Her kamera ayrı bir ISAPI host'u olduğu için kameralar paralel worker'larda işlenir
+    (kamera başına bir worker, en fazla max_concurrent_cameras kadar). Her kameranın
+    PTZ hedefleri kendi worker'ı içinde YAML sırasıyla gezilir; toplam süre en yavaş
+    kameraya bağlıdır.
+    """
     camera_configs = load_camera_configs(config_path)
     camera_ids = list(camera_configs.keys())
 
@@ -660,17 +1764,25 @@ def process_single_configuration(config_path: str) -> Dict:
             'timestamp': get_turkey_time().isoformat(),
         }
 
-    # Tüm kameraları sırayla işle
-    snapshot_results = []
-    for idx, camera_id in enumerate(camera_ids, 1):
-        try:
-            print(f"\n[{idx}/{len(camera_ids)}] Kamera işleniyor: {camera_id}")
-            result = capture_camera_snapshots(camera_id, config_path)
-            snapshot_results.append(result)
-        except Exception as e:
-            print(f"[HATA] {camera_id} işlenirken hata: {e}")
-            continue
+    max_workers = _get_max_concurrent_cameras(config_path, len(camera_ids))
+    print(f"[SİSTEM] Paralel kamera sayısı: {max_workers}")
 
+    # Kameraları paralel işle (sonuçlar konfigürasyondaki kamera sırasıyla toplanır)
+    results_by_camera: Dict[str, Dict] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="camera") as executor:
+        futures = {}
+        for idx, camera_id in enumerate(camera_ids, 1):
+            print(f"\n[{idx}/{len(camera_ids)}] Kamera kuyruğa alındı: {camera_id}")
+            futures[executor.submit(capture_camera_snapshots, camera_id, config_path)] = camera_id
+
+        for future in as_completed(futures):
+            camera_id = futures[future]
+            try:
+                results_by_camera[camera_id] = future.result()
+            except Exception as e:
+                print(f"[HATA] {camera_id} işlenirken hata: {e}")
+
+    snapshot_results = [results_by_camera[cid] for cid in camera_ids if cid in results_by_camera]
     total_snapshots = sum(r['total_snapshots'] for r in snapshot_results if r)
 
     summary = {
@@ -687,6 +1799,145 @@ def process_single_configuration(config_path: str) -> Dict:
     return summary
 
 
+def _host_key(camera_config: CameraConfig) -> str:
+    """Fiziksel kamera anahtarı: aynı host + PTZ kanalı aynı mekanizmadır"""
+    return f"{camera_config.host}/ch{camera_config.ptz_channel}"
+
+
+# Birleşik turda kamera/tur bazında tek değeri olabilen ayarlar (hedef bazlı olanlar TourTarget.camera_config'ten)
+_TOUR_CAMERA_ATTRS = (
+    'username', 'stream_channel', 'azimuth_scale', 'elevation_scale', 'zoom_scale',
+    'settle_detection', 'settle_poll_interval', 'settle_angle_tolerance', 'settle_zoom_tolerance',
+    'settle_frame_diff_threshold', 'travel_model', 'travel_model_probe', 'route_optimization', 'route_zoom_weight',
+)
+_TOUR_GLOBAL_SETTINGS = (
+    'pipelined_capture', 'pipeline_workers', 'deferred_retry', 'deferred_max_attempts',
+    'revisit_radius', 'revisit_min_delay',
+)
+
+
+def _warn_tour_conflicts(key: str, members: List[Tuple[str, CameraConfig, Dict]]) -> None:
+    """Birleşik turdaki konfigürasyonlar tur bazlı bir ayarda ayrışıyorsa ilk konfigürasyonun değerini kullandığını bildir"""
+    primary_path, primary, primary_settings = members[0]
+    for attr in _TOUR_CAMERA_ATTRS:
+        for path, member, _ in members[1:]:
+            if getattr(member, attr) != getattr(primary, attr):
+                print(f"[UYARI] {key} birleşik tur: {attr} farklı ({primary_path}: {getattr(primary, attr)!r}, "
+                      f"{path}: {getattr(member, attr)!r}); turda {primary_path} değeri kullanılıyor")
+    for name in _TOUR_GLOBAL_SETTINGS:
+        for path, _, settings in members[1:]:
+            if get_setting(settings, name) != get_setting(primary_settings, name):
+                print(f"[UYARI] {key} birleşik tur: global_settings.{name} farklı ({primary_path}: "
+                      f"{get_setting(primary_settings, name)!r}, {path}: {get_setting(settings, name)!r}); "
+                      f"turda {primary_path} değeri kullanılıyor")
+
+
+def _capture_host_tour(key: str, members: List[Tuple[str, CameraConfig, Dict]],
+                       targets: List[TourTarget]) -> Tuple[List[Tuple[TourTarget, Dict]], Dict]:
+    """
+    Bir fiziksel kameranın tüm konfigürasyonlardan birleştirilmiş hedeflerini tek turda gez.
+
+    members: (konfigürasyon yolu, kamera konfigürasyonu, global_settings) - config_paths sırasıyla.
+    Hedef bazlı ayarlar her hedefin kendi konfigürasyonundan gelir; bekleme/rota/tur modu gibi
+    tur bazlı ayarlar ilk konfigürasyondan alınır (ayrışıyorsa uyarı verilir).
+    """
+    _warn_tour_conflicts(key, members)
+    _, primary, global_settings = members[0]
+    # Yüklenen konfigürasyon değiştirilmez; bekleme üst sınırı için en uzun süre (güvenli taraf)
+    camera_config = copy.copy(primary)
+    camera_config.move_settle_seconds = max(m.move_settle_seconds for _, m, _ in members)
+    controller = CameraController(camera_config)
+    print(f"\n[{camera_config.camera_id}] {camera_config.name} ({camera_config.host})")
+    print(f"[{camera_config.camera_id}] Birleşik tur: {len(targets)} hedef "
+          f"({', '.join(sorted({t.snapshots_root.name for t in targets}))})")
+    return run_camera_tour(controller, camera_config, targets, global_settings)
+
+
+def process_configurations_by_host(config_paths: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Birden fazla konfigürasyonu fiziksel kamera (host) bazında birleştirerek işle.
+
+    cameras.yaml ve cameras_reyon_genel.yaml aynı host'ları gösterdiği için her kamera saatte
+    iki kez gezilmek yerine tüm hedefleri tek bir turda gezilir. Her snapshot yine kendi
+    konfigürasyonunun snapshots_root'una ve S3 prefix'ine gider; insan algılama kuralı, ROI,
+    ön filtre, cascade ve burst de hedefin konfigürasyonuna göre uygulanır. Bekleme, rota ve
+    tur modu (pipelined_capture, deferred_retry) tur bazlıdır ve ilk konfigürasyondan gelir;
+    konfigürasyonlar bunlarda ayrışıyorsa uyarı verilir. Host'lar paralel işlenir.
+
+    Returns:
+        (config_runs, host_tours) - config_runs process_single_configuration çıktısıyla aynı formattadır
+    """
+    host_members: Dict[str, List[Tuple[str, CameraConfig, Dict]]] = {}
+    host_targets: Dict[str, List[TourTarget]] = {}
+    config_cameras: Dict[str, List[str]] = {}
+
+    for cfg in config_paths:
+        camera_configs = load_camera_configs(cfg)
+        global_settings = get_global_settings(cfg)
+        snapshots_root = _resolve_snapshots_root(global_settings)
+        config_cameras[cfg] = list(camera_configs.keys())
+        for camera_config in camera_configs.values():
+            key = _host_key(camera_config)
+            host_members.setdefault(key, []).append((cfg, camera_config, global_settings))
+            host_targets.setdefault(key, []).extend(build_tour_targets(camera_config, snapshots_root))
+
+    print(f"\n{'='*60}")
+    print(f"[SİSTEM] Birleşik tur: {', '.join(config_paths)}")
+    print(f"[SİSTEM] {len(host_members)} fiziksel kamera, {sum(len(t) for t in host_targets.values())} hedef")
+    print(f"{'='*60}")
+
+    # (konfigürasyon snapshots_root, camera_id) -> sonuçlar
+    collected: Dict[Tuple[Path, str], List[Dict]] = {}
+    host_tours: List[Dict] = []
+    if host_members:
+        max_workers = _get_max_concurrent_cameras(config_paths[0], len(host_members))
+        print(f"[SİSTEM] Paralel kamera sayısı: {max_workers}")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="camera") as executor:
+            futures = {
+                executor.submit(_capture_host_tour, key, host_members[key], host_targets[key]): key
+                for key in host_members
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    tour_results, tour_report = future.result()
+                except Exception as e:
+                    print(f"[HATA] {key} turu işlenirken hata: {e}")
+                    continue
+                for target, entry in tour_results:
+                    collected.setdefault((target.snapshots_root, target.camera_id), []).append(entry)
+                tour = {'host': key, 'total_targets': len(host_targets[key]), 'total_snapshots': len(tour_results)}
+                tour.update(tour_report)
+                host_tours.append(tour)
+
+    config_runs: List[Dict] = []
+    for cfg in config_paths:
+        camera_ids = config_cameras[cfg]
+        snapshots_root = _resolve_snapshots_root(get_global_settings(cfg))
+        snapshot_results = []
+        for camera_id in camera_ids:
+            entries = collected.get((snapshots_root, camera_id), [])
+            snapshot_results.append({
+                'camera_id': camera_id,
+                'total_snapshots': len(entries),
+                'snapshots': entries,
+                'timestamp': get_turkey_time().isoformat()
+            })
+        total_snapshots = sum(r['total_snapshots'] for r in snapshot_results)
+        config_runs.append({
+            'config_path': cfg,
+            'total_cameras': len(camera_ids),
+            'camera_ids': camera_ids,
+            'total_snapshots': total_snapshots,
+            'snapshot_results': snapshot_results,
+            'timestamp': get_turkey_time().isoformat(),
+            'status': 'success' if camera_ids else 'no_cameras'
+        })
+        print(f"[SİSTEM] Tamamlandı - {cfg}: {len(camera_ids)} kamera, {total_snapshots} snapshot")
+
+    return config_runs, sorted(host_tours, key=lambda t: t['host'])
+
+
 def process_all_cameras(config_path: str = 'cameras.yaml', additional_configs: List[str] = None) -> Dict:
     """
     Tüm kameralardan snapshot al
@@ -709,10 +1960,19 @@ def process_all_cameras(config_path: str = 'cameras.yaml', additional_configs: L
 
         combined_snapshot_results: List[Dict] = []
         config_runs: List[Dict] = []
+        host_tours: List[Dict] = []
+
+        primary_settings = get_global_settings(config_path)
+        configure_inference_backend(primary_settings)
+        merge_by_host = _as_bool(get_setting(primary_settings, 'merge_tours_by_host', False))
+        if merge_by_host and len(config_paths) > 1:
+            # Aynı fiziksel kameraya ait tüm konfigürasyon hedefleri tek turda gezilir
+            config_runs, host_tours = process_configurations_by_host(config_paths)
+        else:
+            for cfg in config_paths:
+                config_runs.append(process_single_configuration(cfg))
 
-        for cfg in config_paths:
-            summary = process_single_configuration(cfg)
-            config_runs.append(summary)
+        for summary in config_runs:
             combined_snapshot_results.extend(summary.get('snapshot_results', []))
 
         total_cameras = sum(run.get('total_cameras', 0) for run in config_runs)
@@ -726,6 +1986,8 @@ def process_all_cameras(config_path: str = 'cameras.yaml', additional_configs: L
             'timestamp': get_turkey_time().isoformat(),
             'status': 'success'
         }
+        if host_tours:
+            overall_summary['host_tours'] = host_tours
 
         return overall_summary
 
@@ -776,6 +2038,26 @@ def main():
                 cam_id = cam_result.get('camera_id')
                 count = cam_result.get('total_snapshots', 0)
                 print(f"    - {cam_id}: {count} snapshot")
+                route = cam_result.get('route')
+                if route:
+                    print(f"      Rota: {route['yaml_order_travel']} → {route['planned_travel']} "
+                          f"(kazanç {route['saved_travel']})")
+                prefilter = cam_result.get('prefilter')
+                if prefilter:
+                    print(f"      Ön filtre: {prefilter['skipped_detection']}/{prefilter['checked']} "
+                          f"YOLO atlandı (isabet %{prefilter['hit_rate'] * 100:.0f})")
+            print()
+        
+        for tour in result.get('host_tours', []):
+            line = f"Birleşik tur {tour['host']}: {tour['total_snapshots']}/{tour['total_targets']} snapshot"
+            route = tour.get('route')
+            if route:
+                line += f" | Rota: {route['yaml_order_travel']} → {route['planned_travel']} (kazanç {route['saved_travel']})"
+            prefilter = tour.get('prefilter')
+            if prefilter:
+                line += f" | Ön filtre isabet: %{prefilter['hit_rate'] * 100:.0f}"
+            print(line)
+        if result.get('host_tours'):
             print()
         
         # Snapshot klasörü bilgisi
@@ -0,0 +1,166 @@
+"""
+Change-Detection Prefilter
+Aynı kamera + hedef için son kabul edilen karenin küçültülmüş gri tonlamalı kopyasını saklar ve
+yeni kareyi onunla karşılaştırır. Görüntü değişmediyse YOLO insan algılaması atlanır.
+
+Modlar:
+- diff: Global parlaklık farkı çıkarıldıktan sonra piksel farkı pixel_threshold'u aşan alan oranı
+        (insan kaplama oranıyla aynı ölçekte; area_threshold altında "değişmedi").
+- ssim: 8x8 pencereli ortalama SSIM (ssim_threshold ve üstü "değişmedi").
+
+Referans yalnızca YOLO'dan geçip kabul edilen karelerle güncellenir; atlanan kareler referansı
+değiştirmez (yavaş kaymaların birikmesini önler). Referanslar max_age_hours'tan eskiyse YOLO
+zorunlu çalışır. Referanslar diskte .npy olarak saklanır (saatlik çalıştırmalar arasında kalıcı).
+"""
+
+import os
+import re
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_REFERENCE_DIR = Path(__file__).parent / "change_references"
+MODES = ("off", "diff", "ssim")
+
+
+def changed_area_ratio(reference: np.ndarray, frame: np.ndarray, pixel_threshold: float = 25.0) -> float:
+    """Global parlaklık kaymasından arındırılmış fark > pixel_threshold olan piksel oranı"""
+    diff = frame.astype(np.float32) - reference.astype(np.float32)
+    diff -= float(np.median(diff))
+    return float((np.abs(diff) > pixel_threshold).mean())
+
+
+def _block_means(x: np.ndarray, block: int) -> np.ndarray:
+    h, w = (x.shape[0] // block) * block, (x.shape[1] // block) * block
+    return x[:h, :w].reshape(h // block, block, w // block, block).mean(axis=(1, 3))
+
+
+def mean_ssim(reference: np.ndarray, frame: np.ndarray, block: int = 8) -> float:
+    """Örtüşmeyen block x block pencerelerde hesaplanan ortalama SSIM (0-255 gri tonlama)"""
+    a = reference.astype(np.float64)
+    b = frame.astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_a, mu_b = _block_means(a, block), _block_means(b, block)
+    var_a = _block_means(a * a, block) - mu_a ** 2
+    var_b = _block_means(b * b, block) - mu_b ** 2
+    cov = _block_means(a * b, block) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+class ChangePrefilter:
+    """Kamera + hedef bazında referans kareler ve tur bazında isabet istatistikleri (thread-safe)"""
+
+    def __init__(self, reference_dir: Path = DEFAULT_REFERENCE_DIR):
+        self.reference_dir = Path(reference_dir)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[np.ndarray, float]] = {}
+        # {camera_id: {"checked", "skipped", "no_reference"}}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _ref_path(self, camera_id: str, target_name: str) -> Path:
+        safe = re.sub(r"[^\w.-]", "_", f"{camera_id}__{target_name}")
+        return self.reference_dir / f"{safe}.npy"
+
+    def _get_reference(self, camera_id: str, target_name: str) -> Optional[Tuple[np.ndarray, float]]:
+        key = f"{camera_id}/{target_name}"
+        if key in self._cache:
+            return self._cache[key]
+        path = self._ref_path(camera_id, target_name)
+        if not path.exists():
+            return None
+        try:
+            ref = (np.load(path), path.stat().st_mtime)
+        except Exception as e:
+            print(f"[UYARI] Referans kare okunamadı ({path}): {e}")
+            return None
+        self._cache[key] = ref
+        return ref
+
+    def _count(self, camera_id: str, field: str) -> None:
+        stats = self._stats.setdefault(camera_id, {"checked": 0, "skipped": 0, "no_reference": 0})
+        stats[field] += 1
+
+    def is_unchanged(self, camera_id: str, target_name: str, thumbnail: np.ndarray, mode: str,
+                     area_threshold: float = 0.02, pixel_threshold: float = 25.0,
+                     ssim_threshold: float = 0.97, max_age_hours: float = 6.0) -> Tuple[bool, Optional[float]]:
+        """
+        Kare referansa göre değişmemiş mi?
+
+        Returns:
+            (unchanged, score) - score diff modunda değişen alan oranı, ssim modunda ortalama SSIM;
+            referans yoksa/eskiyse/boyut uyuşmuyorsa (False, None)
+        """
+        with self._lock:
+            self._count(camera_id, "checked")
+            ref = self._get_reference(camera_id, target_name)
+            if ref is None or ref[0].shape != thumbnail.shape or time.time() - ref[1] > max_age_hours * 3600:
+                self._count(camera_id, "no_reference")
+                return False, None
+            reference = ref[0]
+
+        if mode == "ssim":
+            score = mean_ssim(reference, thumbnail)
+            unchanged = score >= ssim_threshold
+        else:
+            score = changed_area_ratio(reference, thumbnail, pixel_threshold)
+            unchanged = score < area_threshold
+
+        if unchanged:
+            with self._lock:
+                self._count(camera_id, "skipped")
+        return unchanged, score
+
+    def update_reference(self, camera_id: str, target_name: str, thumbnail: np.ndarray) -> None:
+        """YOLO'dan geçip kabul edilen kareyi yeni referans yap"""
+        ref = np.clip(thumbnail, 0, 255).astype(np.uint8)
+        path = self._ref_path(camera_id, target_name)
+        with self._lock:
+            self._cache[f"{camera_id}/{target_name}"] = (ref, time.time())
+            try:
+                self.reference_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp.npy")
+                np.save(tmp_path, ref)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"[UYARI] Referans kare kaydedilemedi ({path}): {e}")
+
+    def reset_stats(self, camera_ids: Iterable[str]) -> None:
+        """Yeni tur başında kameraların sayaçlarını sıfırla"""
+        with self._lock:
+            for camera_id in camera_ids:
+                self._stats.pop(camera_id, None)
+
+    def tour_report(self, camera_ids: Iterable[str]) -> Optional[Dict]:
+        """Tur boyunca toplanan isabet oranı (hiç kontrol yapılmadıysa None)"""
+        with self._lock:
+            checked = skipped = no_reference = 0
+            for camera_id in set(camera_ids):
+                stats = self._stats.get(camera_id, {})
+                checked += stats.get("checked", 0)
+                skipped += stats.get("skipped", 0)
+                no_reference += stats.get("no_reference", 0)
+        if checked == 0:
+            return None
+        return {
+            "checked": checked,
+            "skipped_detection": skipped,
+            "no_reference": no_reference,
+            "hit_rate": round(skipped / checked, 3),
+        }
+
+
+_prefilter: Optional[ChangePrefilter] = None
+_prefilter_lock = threading.Lock()
+
+
+def get_change_prefilter() -> ChangePrefilter:
+    """Süreç genelinde tek örnek (CHANGE_REFERENCE_DIR env ile referans klasörü değiştirilebilir)"""
+    global _prefilter
+    with _prefilter_lock:
+        if _prefilter is None:
+            _prefilter = ChangePrefilter(Path(os.getenv("CHANGE_REFERENCE_DIR", str(DEFAULT_REFERENCE_DIR))))
+    return _prefilter
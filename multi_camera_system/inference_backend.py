@@ -0,0 +1,230 @@
+"""
+Inference Backend
+YOLO ağırlıklarını (best.pt, yolov8s.pt, yolov8n.pt) CPU için ONNX Runtime veya OpenVINO'ya
+dışa aktarır, istenirse kendi snapshot'larımızdan oluşturulan kalibrasyon setiyle INT8'e
+quantize eder ve Ultralytics YOLO nesnesi olarak yükler. Çağıran kod (model(...), model.predict(...))
+backend'den bağımsızdır.
+
+Backend'ler:
+- torch:    .pt doğrudan (varsayılan, mevcut davranış)
+- onnx:     <ad>_<imgsz>.onnx (INT8: onnxruntime statik quantization, QDQ, algılama başı hariç)
+- openvino: <ad>_<imgsz>_openvino_model/ (INT8: Ultralytics export, NNCF)
+
+Dışa aktarılan modeller ağırlık dosyasının yanında önbelleklenir; ağırlık dosyası değişirse
+(mtime daha yeni) yeniden oluşturulur. Opsiyonel bağımlılıklar (onnx, onnxruntime, openvino, nncf)
+sadece ilgili backend seçildiğinde import edilir.
+"""
+
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "openvino")
+CALIBRATION_IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+@dataclass(frozen=True)
+class BackendSettings:
+    """Model yükleme ayarları (model önbelleğinde anahtar olarak da kullanılır)"""
+    backend: str = "torch"
+    int8: bool = False
+    imgsz: int = 640
+    calibration_dir: Optional[str] = None   # INT8 kalibrasyon görüntüleri (alt klasörler dahil)
+    calibration_images: int = 200           # Kalibrasyonda kullanılacak en fazla görüntü
+
+    def normalized(self) -> "BackendSettings":
+        backend = (self.backend or "torch").lower()
+        if backend not in BACKENDS:
+            print(f"[UYARI] Bilinmeyen inference backend: {self.backend}, torch kullanılıyor")
+            backend = "torch"
+        return BackendSettings(backend, bool(self.int8) and backend != "torch", int(self.imgsz),
+                               self.calibration_dir, int(self.calibration_images))
+
+
+def _ensure_yolo():
+    from ultralytics import YOLO
+    return YOLO
+
+
+def collect_calibration_images(sources: Iterable, limit: int = 200) -> List[Path]:
+    """Klasör(ler) ve/veya dosya yollarından kalibrasyon görüntülerini topla (eşit aralıklı örnekleme)"""
+    paths: List[Path] = []
+    for src in sources:
+        if not src:
+            continue
+        p = Path(src)
+        if p.is_dir():
+            paths.extend(sorted(x for x in p.rglob("*") if x.suffix.lower() in CALIBRATION_IMAGE_EXTS))
+        elif p.suffix.lower() in CALIBRATION_IMAGE_EXTS and p.exists():
+            paths.append(p)
+    if len(paths) > limit:
+        step = len(paths) / float(limit)
+        paths = [paths[int(i * step)] for i in range(limit)]
+    return paths
+
+
+def _letterbox(path: Path, imgsz: int) -> np.ndarray:
+    """Ultralytics ön işlemesiyle aynı: oranı koru, 114 gri dolgu, RGB, 0-1, NCHW"""
+    from PIL import Image
+    img = Image.open(path)
+    img.draft("RGB", (imgsz, imgsz))
+    img = img.convert("RGB")
+    w, h = img.size
+    r = min(imgsz / w, imgsz / h)
+    nw, nh = max(1, round(w * r)), max(1, round(h * r))
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(img.resize((nw, nh), Image.BILINEAR), ((imgsz - nw) // 2, (imgsz - nh) // 2))
+    arr = np.asarray(canvas, dtype=np.float32) / 255.0
+    return arr.transpose(2, 0, 1)[None]
+
+
+def _head_node_names(onnx_model) -> List[str]:
+    """Son /model.N/ bloğu (Detect başı: DFL + kutu çözümü) - INT8'de doğruluğu en çok bozan kısım"""
+    import re
+    indices = {}
+    for node in onnx_model.graph.node:
+        m = re.match(r"^/model\.(\d+)/", node.name)
+        if m:
+            indices.setdefault(int(m.group(1)), []).append(node.name)
+    return indices[max(indices)] if indices else []
+
+
+def _quantize_onnx(fp32_path: Path, int8_path: Path, calibration: List[Path], imgsz: int) -> None:
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+
+    class _SnapshotReader(CalibrationDataReader):
+        def __init__(self, input_name: str):
+            self.input_name = input_name
+            self._iter = iter(calibration)
+
+        def get_next(self):
+            for path in self._iter:
+                try:
+                    return {self.input_name: _letterbox(path, imgsz)}
+                except Exception as e:
+                    print(f"[UYARI] Kalibrasyon görüntüsü atlandı ({path.name}): {e}")
+            return None
+
+    model = onnx.load(str(fp32_path))
+    input_name = model.graph.input[0].name
+    quantize_static(
+        str(fp32_path), str(int8_path), _SnapshotReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=_head_node_names(model),
+    )
+
+
+def _calibration_dataset_yaml(calibration: List[Path], names, work_dir: Path) -> Path:
+    """Ultralytics INT8 export'u için görüntü klasörünü gösteren geçici dataset yaml'ı"""
+    import yaml
+    images_dir = work_dir / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    for i, src in enumerate(calibration):
+        dst = images_dir / f"{i:05d}{src.suffix.lower()}"
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    data = {"path": str(work_dir), "train": "images", "val": "images",
+            "names": dict(names) if isinstance(names, dict) else list(names)}
+    data_path = work_dir / "calibration.yaml"
+    with open(data_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+    return data_path
+
+
+def _is_stale(artifact: Path, weights: Path) -> bool:
+    return not artifact.exists() or artifact.stat().st_mtime < weights.stat().st_mtime
+
+
+def export_model(weights: str, settings: BackendSettings,
+                 calibration_sources: Iterable = ()) -> str:
+    """
+    Ağırlıkları seçilen backend'e dışa aktar (önbellekte varsa tekrar etme) ve yüklenecek yolu döndür.
+
+    Args:
+        weights: .pt dosyası (ör. best.pt, yolov8s.pt - yoksa Ultralytics indirir)
+        settings: Backend ayarları
+        calibration_sources: settings.calibration_dir boşsa INT8 için kullanılacak klasör/dosyalar
+    """
+    settings = settings.normalized()
+    if settings.backend == "torch":
+        return weights
+
+    YOLO = _ensure_yolo()
+    model = YOLO(weights)
+    weights_path = Path(model.ckpt_path or weights)
+    stem = f"{weights_path.stem}_{settings.imgsz}"
+    suffix = "_int8" if settings.int8 else ""
+
+    calibration: List[Path] = []
+    if settings.int8:
+        sources = [settings.calibration_dir] if settings.calibration_dir else list(calibration_sources)
+        calibration = collect_calibration_images(sources, settings.calibration_images)
+        if not calibration:
+            raise RuntimeError(f"INT8 için kalibrasyon görüntüsü bulunamadı: {sources}")
+
+    if settings.backend == "onnx":
+        fp32_path = weights_path.with_name(f"{stem}.onnx")
+        if _is_stale(fp32_path, weights_path):
+            print(f"[BACKEND] ONNX export: {weights_path.name} (imgsz={settings.imgsz})")
+            exported = Path(model.export(format="onnx", imgsz=settings.imgsz, simplify=True, dynamic=False))
+            if exported != fp32_path:
+                os.replace(exported, fp32_path)
+        if not settings.int8:
+            return str(fp32_path)
+        int8_path = weights_path.with_name(f"{stem}_int8.onnx")
+        if _is_stale(int8_path, weights_path):
+            print(f"[BACKEND] ONNX INT8 quantization: {len(calibration)} kalibrasyon görüntüsü")
+            _quantize_onnx(fp32_path, int8_path, calibration, settings.imgsz)
+        return str(int8_path)
+
+    # openvino
+    out_dir = weights_path.with_name(f"{stem}{suffix}_openvino_model")
+    if _is_stale(out_dir, weights_path):
+        print(f"[BACKEND] OpenVINO export{' (INT8)' if settings.int8 else ''}: {weights_path.name} "
+              f"(imgsz={settings.imgsz})")
+        work_dir = Path(tempfile.mkdtemp(prefix="int8_calib_"))
+        try:
+            kwargs = {"format": "openvino", "imgsz": settings.imgsz}
+            if settings.int8:
+                kwargs.update(int8=True, data=str(_calibration_dataset_yaml(calibration, model.names, work_dir)),
+                              fraction=1.0)
+            exported = Path(model.export(**kwargs))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if exported != out_dir:
+            if out_dir.exists():
+                shutil.rmtree(out_dir)
+            os.replace(exported, out_dir)
+    return str(out_dir)
+
+
+def load_detector(weights: str, settings: Optional[BackendSettings] = None,
+                  calibration_sources: Iterable = ()):
+    """
+    Ayarlara göre YOLO modelini yükle. Dışa aktarma başarısız olursa .pt ile devam edilir.
+
+    Not: ONNX/OpenVINO modelleri sabit giriş boyutuyla dışa aktarılır; tahminde aynı imgsz kullanılmalı.
+    """
+    settings = (settings or BackendSettings()).normalized()
+    YOLO = _ensure_yolo()
+    if settings.backend == "torch":
+        return YOLO(weights)
+    try:
+        path = export_model(weights, settings, calibration_sources)
+        print(f"[BACKEND] Model yükleniyor: {path} ({settings.backend}{', INT8' if settings.int8 else ''})")
+        return YOLO(path, task="detect")
+    except Exception as e:
+        print(f"[UYARI] {settings.backend} backend hazırlanamadı ({weights}): {e} - PyTorch kullanılıyor")
+        return YOLO(weights)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Inference Backend Benchmark
+Aynı görüntüler üzerinde PyTorch (referans) ile ONNX / OpenVINO (FP32 ve INT8) backend'lerini
+karşılaştırır: görüntü başına gecikme ve PyTorch tespitlerine göre doğruluk.
+
+Doğruluk: her backend'in tespitleri aynı görüntüdeki PyTorch tespitleriyle sınıf + IoU >= 0.5
+ile eşleştirilir; precision / recall (sınıf bazında da), eşleşen kutuların ortalama IoU'su ve
+güven farkı raporlanır. INT8'in ürün (best.pt) tespitlerini kötüleştirmediğini buradan kontrol ederiz.
+
+Kullanım:
+    python multi_camera_system/inference_backend_benchmark.py --weights best.pt \\
+        --images /data/snapshots_eval --calibration /data/snapshots_calib --output backend_report.json
+    python inference_backend_benchmark.py --weights yolov8s.pt --classes 0 --images snapshots
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inference_backend import BackendSettings, collect_calibration_images, load_detector
+from jpeg_decode import decode_reduced
+
+Detection = Tuple[int, float, np.ndarray]  # (sınıf, güven, [x1, y1, x2, y2])
+
+VARIANTS = {
+    "torch": ("torch", False),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True),
+    "openvino": ("openvino", False),
+    "openvino-int8": ("openvino", True),
+}
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _predict(model, images: List[np.ndarray], imgsz: int, classes: Optional[List[int]]) -> Tuple[List[List[Detection]], List[float]]:
+    detections, latencies = [], []
+    for image in images:
+        t0 = time.perf_counter()
+        results = model.predict(image, imgsz=imgsz, classes=classes, verbose=False)
+        latencies.append(time.perf_counter() - t0)
+        dets: List[Detection] = []
+        for result in results:
+            if result.boxes is None:
+                continue
+            for box in result.boxes:
+                dets.append((int(box.cls[0]), float(box.conf[0]), box.xyxy[0].cpu().numpy()))
+        detections.append(dets)
+    return detections, latencies
+
+
+def _compare(reference: List[List[Detection]], candidate: List[List[Detection]],
+             names: Dict[int, str], iou_threshold: float = 0.5) -> Dict:
+    """Aday tespitleri referansla açgözlü (güvene göre) eşleştir"""
+    tp = fp = fn = 0
+    ious, conf_deltas = [], []
+    per_class: Dict[str, Dict[str, int]] = {}
+    for ref_dets, cand_dets in zip(reference, candidate):
+        used = set()
+        for cls, conf, box in sorted(cand_dets, key=lambda d: -d[1]):
+            best_j, best_iou = -1, iou_threshold
+            for j, (rcls, _, rbox) in enumerate(ref_dets):
+                if j in used or rcls != cls:
+                    continue
+                iou = _iou(box, rbox)
+                if iou >= best_iou:
+                    best_j, best_iou = j, iou
+            if best_j >= 0:
+                used.add(best_j)
+                tp += 1
+                ious.append(best_iou)
+                conf_deltas.append(conf - ref_dets[best_j][1])
+            else:
+                fp += 1
+        for j, (rcls, _, _) in enumerate(ref_dets):
+            stats = per_class.setdefault(names.get(rcls, str(rcls)), {"reference": 0, "matched": 0})
+            stats["reference"] += 1
+            if j in used:
+                stats["matched"] += 1
+            else:
+                fn += 1
+    return {
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 1.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_conf_delta": round(float(np.mean(conf_deltas)), 4) if conf_deltas else None,
+        "per_class_recall": {
+            name: round(s["matched"] / s["reference"], 4) for name, s in sorted(per_class.items())
+        },
+    }
+
+
+def _latency(values: List[float]) -> Dict:
+    ms = np.asarray(values) * 1000.0
+    return {
+        "mean_ms": round(float(ms.mean()), 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+def run_benchmark(weights: str, image_paths: List[Path], variants: List[str], imgsz: int = 640,
+                  calibration_dir: Optional[str] = None, classes: Optional[List[int]] = None) -> Dict:
+    # Tüm backend'ler aynı (küçültülmüş decode edilmiş) girdiyi görür; decode süresi ölçüme girmez
+    images = [decode_reduced(p, imgsz).bgr() for p in image_paths]
+    report = {"weights": weights, "images": len(images), "imgsz": imgsz, "backends": {}}
+
+    reference = None
+    names: Dict[int, str] = {}
+    for variant in ["torch"] + [v for v in variants if v != "torch"]:
+        backend, int8 = VARIANTS[variant]
+        settings = BackendSettings(backend=backend, int8=int8, imgsz=imgsz, calibration_dir=calibration_dir)
+        model = load_detector(weights, settings)
+        names = names or dict(model.names)
+        model.predict(images[0], imgsz=imgsz, verbose=False)  # ısınma
+        detections, latencies = _predict(model, images, imgsz, classes)
+        entry = {"latency": _latency(latencies), "detections": sum(len(d) for d in detections)}
+        if reference is None:
+            reference = detections
+        else:
+            entry["vs_torch"] = _compare(reference, detections, names)
+        report["backends"][variant] = entry
+
+    base = report["backends"]["torch"]["latency"]["mean_ms"]
+    for entry in report["backends"].values():
+        entry["speedup"] = round(base / entry["latency"]["mean_ms"], 2) if entry["latency"]["mean_ms"] else None
+    return report
+
+
+def _print_report(report: Dict) -> None:
+    print(f"[BENCH] {report['weights']} | {report['images']} görüntü | imgsz={report['imgsz']}")
+    print(f"    {'backend':14s} {'ort ms':>8s} {'p95 ms':>8s} {'hız':>6s} {'tespit':>7s} {'prec':>6s} {'recall':>6s} {'IoU':>6s}")
+    for variant, e in report["backends"].items():
+        cmp_ = e.get("vs_torch", {})
+        print(f"    {variant:14s} {e['latency']['mean_ms']:8.1f} {e['latency']['p95_ms']:8.1f} "
+              f"{e['speedup']:5.2f}x {e['detections']:7d} "
+              f"{cmp_.get('precision', 1.0):6.3f} {cmp_.get('recall', 1.0):6.3f} "
+              f"{(cmp_.get('mean_iou') or 1.0):6.3f}")
+    for variant, e in report["backends"].items():
+        weak = {k: v for k, v in e.get("vs_torch", {}).get("per_class_recall", {}).items() if v < 0.9}
+        if weak:
+            print(f"    [DİKKAT] {variant}: recall < 0.90 olan sınıflar: {weak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO inference backend doğruluk/gecikme karşılaştırması")
+    parser.add_argument("--weights", required=True, help="best.pt, yolov8s.pt, ...")
+    parser.add_argument("--images", required=True, help="Değerlendirme görüntüleri klasörü")
+    parser.add_argument("--calibration", default=None,
+                        help="INT8 kalibrasyon klasörü (değerlendirme setinden ayrı olmalı)")
+    parser.add_argument("--backends", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--classes", type=int, nargs="*", default=None, help="Sadece bu sınıf ID'leri (ör. 0 = person)")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Raporu JSON olarak kaydet")
+    args = parser.parse_args()
+
+    image_paths = collect_calibration_images([args.images], args.limit)
+    if not image_paths:
+        print(f"[HATA] Görüntü bulunamadı: {args.images}")
+        return
+    if any(VARIANTS[v][1] for v in args.backends) and not args.calibration:
+        print("[UYARI] --calibration verilmedi; INT8 kalibrasyonu değerlendirme görüntüleriyle yapılacak")
+
+    report = run_benchmark(args.weights, image_paths, args.backends, args.imgsz,
+                           args.calibration or args.images, args.classes)
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] Rapor kaydedildi: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
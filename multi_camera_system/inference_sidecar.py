@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Inference Sidecar
+Modelleri (yolov8s / yolov8n, best.pt, MTCNN) bellekte sıcak tutan, Unix socket üzerinden
+hizmet veren uzun ömürlü lokal servis. Cron işleri her seferinde torch + ultralytics import edip
+modeli baştan yüklemek yerine buraya istek gönderir.
+
+- Aynı model + parametrelerle aynı anda gelen istekler (farklı script'lerden de olsa) batch_window_ms
+  içinde tek bir predict çağrısında birleştirilir (en fazla max_batch görüntü).
+- İstemci (SidecarClient) servis kapalıysa / cevap vermezse None döndürür; çağıran kod
+  in-process inference'a düşer. Kapalı servis RETRY_AFTER_SECONDS boyunca tekrar denenmez.
+
+Protokol (her mesaj): 4 bayt başlık uzunluğu + JSON başlık + 8 bayt veri uzunluğu + veri.
+İstek verisi ardışık RGB uint8 görüntülerdir (boyutlar başlıkta), cevapta veri yoktur.
+
+Kullanım:
+    python multi_camera_system/inference_sidecar.py --preload yolov8s.pt best.pt --faces
+    INFERENCE_SIDECAR=1 python ptz_yolo_llm_analysis.py    # istemci tarafı
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SOCKET_PATH = os.getenv("INFERENCE_SOCKET", "/tmp/ptz_inference.sock")
+RETRY_AFTER_SECONDS = 30.0
+FACES_MODEL = "mtcnn"
+MTCNN_MIN_FACE_SIZE = 20  # facenet_pytorch MTCNN varsayılanı (piksel)
+
+# (x1, y1, x2, y2, confidence, class_id)
+Detection = Tuple[float, float, float, float, float, int]
+
+
+# ============================================================================
+# PROTOKOL
+# ============================================================================
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Bağlantı kapandı")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def send_message(sock: socket.socket, header: Dict, payload: bytes = b"") -> None:
+    head = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(head)) + head + struct.pack(">Q", len(payload)))
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Dict, bytes]:
+    head_len = struct.unpack(">I", _recv_exact(sock, 4))[0]
+    header = json.loads(_recv_exact(sock, head_len).decode("utf-8"))
+    payload_len = struct.unpack(">Q", _recv_exact(sock, 8))[0]
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def _pack_images(images: Sequence[np.ndarray]) -> Tuple[List[List[int]], bytes]:
+    arrays = [np.ascontiguousarray(img, dtype=np.uint8) for img in images]
+    return [list(a.shape) for a in arrays], b"".join(a.tobytes() for a in arrays)
+
+
+def _unpack_images(shapes: List[List[int]], payload: bytes) -> List[np.ndarray]:
+    images, offset = [], 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        images.append(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(shape))
+        offset += size
+    return images
+
+
+# ============================================================================
+# SUNUCU
+# ============================================================================
+
+class _Batcher:
+    """Tek bir (model, parametre) anahtarı için istekleri toplayıp birlikte çalıştıran thread"""
+
+    def __init__(self, run_batch, max_batch: int, window_s: float):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, images: List[np.ndarray]) -> List[Future]:
+        futures = []
+        for image in images:
+            fut: Future = Future()
+            self._queue.put((image, fut))
+            futures.append(fut)
+        return futures
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, remaining)) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self.run_batch([image for image, _ in batch])
+                for (_, fut), result in zip(batch, results):
+                    fut.set_result(result)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+
+class InferenceService:
+    """Sıcak modeller + anahtar başına batcher'lar"""
+
+    def __init__(self, backend=None, max_batch: int = 8, batch_window_ms: float = 20.0):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.window_s = batch_window_ms / 1000.0
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, int], object] = {}
+        self._model_locks: Dict[str, threading.Lock] = {}
+        self._batchers: Dict[Tuple, _Batcher] = {}
+        self.requests = 0
+        self.images = 0
+
+    def _yolo(self, weights: str, imgsz: int):
+        key = (weights, imgsz)
+        with self._lock:
+            if key not in self._models:
+                from inference_backend import BackendSettings, load_detector
+                settings = self.backend or BackendSettings()
+                settings = BackendSettings(settings.backend, settings.int8, imgsz,
+                                           settings.calibration_dir, settings.calibration_images)
+                print(f"[SIDECAR] Model yükleniyor: {weights} (imgsz={imgsz})")
+                self._models[key] = load_detector(weights, settings)
+                self._model_locks.setdefault(weights, threading.Lock())
+            return self._models[key], self._model_locks[weights]
+
+    def _mtcnn(self):
+        with self._lock:
+            if (FACES_MODEL, 0) not in self._models:
+                import torch
+                from facenet_pytorch import MTCNN
+                device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                print(f"[SIDECAR] MTCNN yükleniyor ({device})")
+                self._models[(FACES_MODEL, 0)] = MTCNN(keep_all=True, device=device)
+                self._model_locks.setdefault(FACES_MODEL, threading.Lock())
+            return self._models[(FACES_MODEL, 0)], self._model_locks[FACES_MODEL]
+
+    def preload(self, weights_list: Sequence[str], faces: bool = False, imgsz: int = 640) -> None:
+        for weights in weights_list:
+            model, _ = self._yolo(weights, imgsz)
+            model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+        if faces:
+            self._mtcnn()
+
+    def _run_detect(self, weights: str, imgsz: int, conf: Optional[float],
+                    classes: Optional[List[int]], images: List[np.ndarray]) -> List[List[Detection]]:
+        model, model_lock = self._yolo(weights, imgsz)
+        kwargs = {"imgsz": imgsz, "verbose": False}
+        if conf is not None:
+            kwargs["conf"] = conf
+        if classes is not None:
+            kwargs["classes"] = classes
+        bgr = [np.ascontiguousarray(img[..., ::-1]) for img in images]
+        with model_lock:
+            results = model.predict(bgr, **kwargs)
+        out = []
+        for result in results:
+            dets: List[Detection] = []
+            if result.boxes is not None:
+                xyxy = result.boxes.xyxy.cpu().numpy()
+                confs = result.boxes.conf.cpu().numpy()
+                clss = result.boxes.cls.cpu().numpy()
+                for (x1, y1, x2, y2), c, k in zip(xyxy, confs, clss):
+                    dets.append((float(x1), float(y1), float(x2), float(y2), float(c), int(k)))
+            out.append(dets)
+        return out
+
+    def _run_faces(self, min_face_size: Optional[float], images: List[np.ndarray]) -> List[List[Detection]]:
+        mtcnn, model_lock = self._mtcnn()
+        out = []
+        with model_lock:
+            mtcnn.min_face_size = min_face_size if min_face_size is not None else MTCNN_MIN_FACE_SIZE
+            # MTCNN toplu algılama sadece aynı boyuttaki görüntülerde çalışır
+            if len({img.shape for img in images}) == 1:
+                boxes_list, probs_list = mtcnn.detect(list(images))
+            else:
+                pairs = [mtcnn.detect(img) for img in images]
+                boxes_list, probs_list = [p[0] for p in pairs], [p[1] for p in pairs]
+        for boxes, probs in zip(boxes_list, probs_list):
+            dets: List[Detection] = []
+            if boxes is not None:
+                for (x1, y1, x2, y2), p in zip(boxes, probs):
+                    dets.append((float(x1), float(y1), float(x2), float(y2), float(p), 0))
+            out.append(dets)
+        return out
+
+    def handle(self, header: Dict, payload: bytes) -> Dict:
+        op = header.get("op")
+        if op == "ping":
+            return {"ok": True, "requests": self.requests, "images": self.images,
+                    "models": [f"{w}@{s}" for w, s in self._models]}
+        images = _unpack_images(header.get("shapes", []), payload)
+        if op == "detect":
+            weights = header["model"]
+            imgsz = int(header.get("imgsz", 640))
+            conf = header.get("conf")
+            classes = header.get("classes")
+            key = ("detect", weights, imgsz, conf, tuple(classes) if classes else None)
+            run = lambda batch: self._run_detect(weights, imgsz, conf, classes, batch)  # noqa: E731
+        elif op == "faces":
+            min_face_size = header.get("min_face_size")
+            key = ("faces", min_face_size)
+            run = lambda batch: self._run_faces(min_face_size, batch)  # noqa: E731
+        else:
+            return {"ok": False, "error": f"bilinmeyen işlem: {op}"}
+
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = self._batchers[key] = _Batcher(run, self.max_batch, self.window_s)
+            self.requests += 1
+            self.images += len(images)
+        futures = batcher.submit(images)
+        response = {"ok": True, "detections": [f.result() for f in futures]}
+        if op == "detect":
+            model, _ = self._yolo(header["model"], int(header.get("imgsz", 640)))
+            response["names"] = {int(k): v for k, v in dict(model.names).items()}
+        return response
+
+
+def serve(socket_path: str, service: InferenceService) -> None:
+    class _Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    header, payload = recv_message(self.request)
+                except (ConnectionError, struct.error, OSError):
+                    return
+                try:
+                    response = service.handle(header, payload)
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    send_message(self.request, response)
+                except OSError:
+                    return
+
+    path = Path(socket_path)
+    if path.exists():
+        path.unlink()
+    server = socketserver.ThreadingUnixStreamServer(str(path), _Handler)
+    server.daemon_threads = True
+    os.chmod(str(path), 0o660)
+    print(f"[SIDECAR] Dinleniyor: {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if path.exists():
+            path.unlink()
+
+
+# ============================================================================
+# İSTEMCİ
+# ============================================================================
+
+class SidecarClient:
+    """İnce istemci: hata durumunda None döner (çağıran in-process inference'a düşer)"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout_s: float = 120.0):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._down_until = 0.0
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_s)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self._local.sock = None
+
+    def request(self, header: Dict, images: Sequence[np.ndarray] = ()) -> Optional[Dict]:
+        if time.monotonic() < self._down_until or not os.path.exists(self.socket_path):
+            return None
+        shapes, payload = _pack_images(images)
+        header = dict(header, shapes=shapes)
+        try:
+            sock = self._connect()
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+        except (OSError, ConnectionError, struct.error, ValueError) as e:
+            print(f"[UYARI] Inference sidecar erişilemedi ({self.socket_path}): {e} - lokal inference kullanılıyor")
+            self._close()
+            self._down_until = time.monotonic() + RETRY_AFTER_SECONDS
+            return None
+        if not response.get("ok"):
+            print(f"[UYARI] Inference sidecar hatası: {response.get('error')} - lokal inference kullanılıyor")
+            return None
+        return response
+
+    def detect(self, images: Sequence[np.ndarray], weights: str, imgsz: int = 640,
+               conf: Optional[float] = None, classes: Optional[List[int]] = None
+               ) -> Optional[Tuple[List[List[Detection]], Dict[int, str]]]:
+        """RGB görüntülerde YOLO tespiti: (görüntü başına [(x1, y1, x2, y2, conf, cls)], sınıf adları)"""
+        # Sunucunun çalışma dizini farklı olabilir; lokalde var olan ağırlıklar mutlak yolla gönderilir
+        model = str(Path(weights).resolve()) if Path(weights).exists() else weights
+        response = self.request({"op": "detect", "model": model, "imgsz": imgsz,
+                                 "conf": conf, "classes": classes}, images)
+        if response is None:
+            return None
+        names = {int(k): v for k, v in response.get("names", {}).items()}
+        return [[tuple(d) for d in dets] for dets in response["detections"]], names
+
+    def detect_faces(self, images: Sequence[np.ndarray],
+                     min_face_size: Optional[float] = None) -> Optional[List[List[Detection]]]:
+        """RGB görüntülerde MTCNN yüz tespiti (min_face_size: görüntü pikseli, None = MTCNN varsayılanı)"""
+        response = self.request({"op": "faces", "min_face_size": min_face_size}, images)
+        if response is None:
+            return None
+        return [[tuple(d) for d in dets] for dets in response["detections"]]
+
+
+_client: Optional[SidecarClient] = None
+_client_lock = threading.Lock()
+
+
+def sidecar_enabled() -> bool:
+    """INFERENCE_SIDECAR=1 ile açılır"""
+    return os.getenv("INFERENCE_SIDECAR", "").strip().lower() in ("1", "true", "yes", "on", "evet")
+
+
+def get_sidecar_client() -> SidecarClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SidecarClient(os.getenv("INFERENCE_SOCKET", DEFAULT_SOCKET_PATH))
+    return _client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sıcak model inference servisi (Unix socket)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--preload", nargs="*", default=[], help="Başlangıçta yüklenecek YOLO ağırlıkları")
+    parser.add_argument("--faces", action="store_true", help="MTCNN'i başlangıçta yükle")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--batch-window-ms", type=float, default=20.0)
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "torch"), help="torch | onnx | openvino")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--calibration-dir", default=None)
+    args = parser.parse_args()
+
+    from inference_backend import BackendSettings
+    backend = BackendSettings(backend=args.backend, int8=args.int8, calibration_dir=args.calibration_dir).normalized()
+    service = InferenceService(backend, args.max_batch, args.batch_window_ms)
+    service.preload([str(Path(w).resolve()) if Path(w).exists() else w for w in args.preload], args.faces)
+    serve(args.socket, service)
+
+
+if __name__ == "__main__":
+    main()
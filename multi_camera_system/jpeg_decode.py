@@ -0,0 +1,68 @@
+"""
+Reduced-Resolution JPEG Decode
+Dedektörler görüntüyü zaten kendi giriş boyutlarına (ör. YOLO 640) küçültüyor. Tam çözünürlüklü
+decode yerine JPEG'i DCT seviyesinde (PIL draft: 1/2, 1/4, 1/8) doğrudan gereken boyuta yakın
+decode eder; kutular scale ile tam çözünürlük koordinatlarına geri çevrilir.
+"""
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+JpegSource = Union[str, Path, bytes]
+
+
+@dataclass
+class ReducedImage:
+    """Küçük decode edilmiş görüntü + tam çözünürlüğe dönüş ölçeği"""
+    array: np.ndarray                 # (h, w, 3) uint8, RGB
+    full_size: Tuple[int, int]        # (genişlik, yükseklik) - orijinal JPEG
+    scale: Tuple[float, float]        # (sx, sy): tam = küçük * scale
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.array.shape[1], self.array.shape[0]
+
+    def bgr(self) -> np.ndarray:
+        """OpenCV / Ultralytics numpy girdisi için BGR kopya"""
+        return np.ascontiguousarray(self.array[..., ::-1])
+
+    def to_full(self, box: Sequence[float]) -> Tuple[float, float, float, float]:
+        """Küçük görüntüdeki (x1, y1, x2, y2) kutuyu tam çözünürlük koordinatlarına çevir"""
+        sx, sy = self.scale
+        x1, y1, x2, y2 = box[:4]
+        fw, fh = self.full_size
+        return (
+            min(max(0.0, x1 * sx), fw),
+            min(max(0.0, y1 * sy), fh),
+            min(max(0.0, x2 * sx), fw),
+            min(max(0.0, y2 * sy), fh),
+        )
+
+
+def _open(source: JpegSource) -> Image.Image:
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def decode_reduced(source: JpegSource, max_side: int = 640) -> ReducedImage:
+    """
+    JPEG'i uzun kenarı max_side'dan küçük olmayacak en küçük DCT ölçeğinde decode et.
+
+    draft() yalnızca 1/2, 1/4, 1/8 ölçeklerini destekler ve sonucu istenen boyutun altına
+    düşürmez; bu yüzden dedektörün göreceği çözünürlük kaybolmaz. JPEG olmayan dosyalarda
+    draft etkisizdir ve tam decode yapılır; max_side <= 0 ise küçültme yapılmaz.
+    """
+    img = _open(source)
+    full_w, full_h = img.size
+    ratio = max_side / float(max(full_w, full_h))
+    if 0.0 < ratio < 1.0:
+        img.draft("RGB", (max(1, int(full_w * ratio)), max(1, int(full_h * ratio))))
+    array = np.asarray(img.convert("RGB"))
+    h, w = array.shape[:2]
+    return ReducedImage(array=array, full_size=(full_w, full_h), scale=(full_w / w, full_h / h))
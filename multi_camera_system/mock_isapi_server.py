@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Mock ISAPI Server
+PTZ hareketini (pan/tilt/zoom hızları + odak oturma süresi) simüle eden lokal Hikvision ISAPI sunucusu.
+Konum geri bildirimli bekleme (wait_for_ptz_settle) gerçek kamera olmadan ölçülebilsin diye kullanılır.
+
+Kullanım:
+    python mock_isapi_server.py --port 8081                 # sunucuyu çalıştır
+    python mock_isapi_server.py --benchmark --camera camera_001  # sabit bekleme ile karşılaştır
+"""
+
+import io
+import re
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+
+class SimulatedPTZ:
+    """Tek kanallı PTZ mekanizmasının zamana bağlı konum modeli (değerler cameras.yaml ölçeğinde)"""
+
+    def __init__(self, pan_speed: float = 40.0, tilt_speed: float = 30.0, zoom_speed: float = 4.0,
+                 focus_seconds: float = 0.8):
+        self.pan_speed = pan_speed        # derece/sn
+        self.tilt_speed = tilt_speed      # derece/sn
+        self.zoom_speed = zoom_speed      # zoom birimi/sn
+        self.focus_seconds = focus_seconds  # hedefe vardıktan sonra görüntünün oturma süresi
+        self._lock = threading.Lock()
+        self._start = (0.0, 0.0, 1.0)
+        self._target = (0.0, 0.0, 1.0)
+        self._move_started = 0.0
+        self._travel_seconds = 0.0
+
+    @staticmethod
+    def _pan_delta(src: float, dst: float) -> float:
+        """En kısa yönlü azimuth farkı (-180, 180]"""
+        d = (dst - src) % 360.0
+        return d - 360.0 if d > 180.0 else d
+
+    def move_to(self, azimuth: float, elevation: float, zoom: float) -> None:
+        with self._lock:
+            current = self._position_at(time.monotonic())
+            self._start = current
+            self._target = (azimuth % 360.0, elevation, zoom)
+            self._move_started = time.monotonic()
+            self._travel_seconds = max(
+                abs(self._pan_delta(current[0], self._target[0])) / self.pan_speed,
+                abs(self._target[1] - current[1]) / self.tilt_speed,
+                abs(self._target[2] - current[2]) / self.zoom_speed,
+            )
+
+    def _position_at(self, now: float) -> Tuple[float, float, float]:
+        t = now - self._move_started
+        (az0, el0, z0), (az1, el1, z1) = self._start, self._target
+
+        def _step(src, delta, speed):
+            travel = min(abs(delta), speed * t)
+            return src + (travel if delta >= 0 else -travel)
+
+        az = _step(az0, self._pan_delta(az0, az1), self.pan_speed) % 360.0
+        el = _step(el0, el1 - el0, self.tilt_speed)
+        zoom = _step(z0, z1 - z0, self.zoom_speed)
+        return az, el, zoom
+
+    def position(self) -> Tuple[float, float, float]:
+        with self._lock:
+            return self._position_at(time.monotonic())
+
+    def focus_noise(self) -> float:
+        """Hedefe varıştan sonra sönen görüntü gürültüsü (0 = tamamen oturmuş)"""
+        with self._lock:
+            since_arrival = time.monotonic() - self._move_started - self._travel_seconds
+        if since_arrival < 0:
+            return 1.0
+        if since_arrival >= self.focus_seconds:
+            return 0.0
+        return 1.0 - since_arrival / self.focus_seconds
+
+
+def render_frame(ptz: SimulatedPTZ, size: Tuple[int, int] = (640, 360)) -> bytes:
+    """Konuma bağlı desenli bir JPEG üret; hareket/odak sırasında ardışık kareler farklı olur"""
+    az, el, zoom = ptz.position()
+    noise = ptz.focus_noise()
+    w, h = size
+    img = Image.new("L", size, 90)
+    draw = ImageDraw.Draw(img)
+    step = max(8, int(48 / max(zoom, 1.0) * 4))
+    x_off = int(az * 12) % step
+    y_off = int(el * 12) % step
+    for x in range(-step + x_off, w, step):
+        draw.rectangle([x, 0, x + step // 3, h], fill=200)
+    for y in range(-step + y_off, h, step):
+        draw.rectangle([0, y, w, y + step // 4], fill=30)
+    if noise > 0:
+        rnd = random.Random()
+        for _ in range(int(400 * noise)):
+            x, y = rnd.randrange(w), rnd.randrange(h)
+            draw.rectangle([x, y, x + 12, y + 12], fill=rnd.randrange(256))
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _make_handler(ptz: SimulatedPTZ, scale: Dict[str, float]):
+    tag_re = {k: re.compile(rf"<{k}>\s*(-?[\d.]+)\s*</{k}>") for k in ("azimuth", "elevation", "absoluteZoom")}
+
+    class MockISAPIHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler imzası
+            pass
+
+        def _send(self, code: int, body: bytes, content_type: str) -> None:
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_PUT(self):
+            if re.match(r"^/ISAPI/PTZCtrl/channels/\d+/Absolute$", self.path):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8", "ignore")
+                values = {}
+                for key, rx in tag_re.items():
+                    m = rx.search(body)
+                    if not m:
+                        self._send(400, b"missing " + key.encode(), "text/plain")
+                        return
+                    values[key] = float(m.group(1))
+                ptz.move_to(values["azimuth"] / scale["azimuth"],
+                            values["elevation"] / scale["elevation"],
+                            values["absoluteZoom"] / scale["zoom"])
+                self._send(200, b"<ResponseStatus><statusCode>1</statusCode></ResponseStatus>", "application/xml")
+                return
+            self._send(404, b"not found", "text/plain")
+
+        def do_GET(self):
+            if re.match(r"^/ISAPI/PTZCtrl/channels/\d+/status$", self.path):
+                az, el, zoom = ptz.position()
+                xml = (
+                    '<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<PTZStatus version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">'
+                    f"<AbsoluteHigh><elevation>{int(round(el * scale['elevation']))}</elevation>"
+                    f"<azimuth>{int(round(az * scale['azimuth']))}</azimuth>"
+                    f"<absoluteZoom>{int(round(zoom * scale['zoom']))}</absoluteZoom></AbsoluteHigh>"
+                    "</PTZStatus>"
+                )
+                self._send(200, xml.encode("utf-8"), "application/xml")
+                return
+            if re.match(r"^/ISAPI/Streaming/channels/\d+/picture$", self.path):
+                self._send(200, render_frame(ptz), "image/jpeg")
+                return
+            self._send(404, b"not found", "text/plain")
+
+    return MockISAPIHandler
+
+
+def start_mock_server(port: int = 0, ptz: Optional[SimulatedPTZ] = None,
+                      azimuth_scale: float = 10, elevation_scale: float = 10, zoom_scale: float = 10):
+    """
+    Mock sunucuyu arka plan thread'inde başlat.
+
+    Returns:
+        (server, ptz) - server.server_address[1] gerçek port, kapatmak için server.shutdown()
+    """
+    ptz = ptz or SimulatedPTZ()
+    scale = {"azimuth": azimuth_scale, "elevation": elevation_scale, "zoom": zoom_scale}
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(ptz, scale))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ptz
+
+
+def run_settle_benchmark(config_path: str = "cameras.yaml", camera_id: str = "camera_001",
+                         settle_seconds: Optional[float] = None) -> Dict:
+    """
+    Bir kameranın PTZ turunu mock sunucuda konum geri bildirimli bekleme ile gez ve
+    sabit move_settle_seconds beklemesine göre kazanılan süreyi raporla.
+    """
+    from camera_snapshot_system import CameraController, load_camera_configs, wait_for_ptz_settle
+
+    camera_config = load_camera_configs(config_path)[camera_id]
+    server, _ = start_mock_server(
+        azimuth_scale=camera_config.azimuth_scale,
+        elevation_scale=camera_config.elevation_scale,
+        zoom_scale=camera_config.zoom_scale,
+    )
+    try:
+        camera_config.base_url = f"http://127.0.0.1:{server.server_address[1]}/ISAPI"
+        camera_config.settle_detection = True
+        if settle_seconds is not None:
+            camera_config.move_settle_seconds = settle_seconds
+        controller = CameraController(camera_config)
+
+        moves = []
+        for target_name, coords in camera_config.ptz_targets.items():
+            controller.move_ptz(coords["azimuth"], coords["elevation"], coords["zoom"])
+            waited = wait_for_ptz_settle(controller, coords["azimuth"], coords["elevation"], coords["zoom"])
+            moves.append({"target_name": target_name, "waited_seconds": round(waited, 2)})
+    finally:
+        server.shutdown()
+
+    fixed_total = len(moves) * float(camera_config.move_settle_seconds)
+    feedback_total = sum(m["waited_seconds"] for m in moves)
+    report = {
+        "camera_id": camera_id,
+        "moves": moves,
+        "fixed_total_seconds": round(fixed_total, 2),
+        "feedback_total_seconds": round(feedback_total, 2),
+        "saved_seconds": round(fixed_total - feedback_total, 2),
+    }
+    print(f"[BENCH] {camera_id}: {len(moves)} hareket")
+    for m in moves:
+        print(f"    - {m['target_name']}: {m['waited_seconds']:.2f} sn")
+    print(f"[BENCH] Sabit bekleme: {fixed_total:.1f} sn | Geri bildirimli: {feedback_total:.1f} sn | "
+          f"Kazanç: {report['saved_seconds']:.1f} sn/tur")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Hikvision ISAPI PTZ sunucusu")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--benchmark", action="store_true", help="Sabit bekleme ile geri bildirimli beklemeyi karşılaştır")
+    parser.add_argument("--config", default="cameras.yaml")
+    parser.add_argument("--camera", default="camera_001")
+    parser.add_argument("--settle-seconds", type=float, default=None, help="move_settle_seconds yerine kullanılacak üst sınır")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_settle_benchmark(args.config, args.camera, args.settle_seconds)
+        return
+
+    server, _ = start_mock_server(args.port)
+    print(f"[MOCK] ISAPI sunucusu çalışıyor: http://127.0.0.1:{server.server_address[1]}/ISAPI")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Person Detector Benchmark
+Tek aşamalı (yolov8s, tam çözünürlük) ve kademeli (yolov8n küçük giriş → gerekirse yolov8s)
+insan algılamayı aynı snapshot'lar üzerinde CPU'da karşılaştırır.
+
+Rapor: aşama bazında gecikme (ortalama / p50 / p95), 2. aşamaya devredilen kare oranı,
+insan var/yok kararlarının tek aşamalı algılamayla uyumu ve toplam süre kazancı.
+
+Kullanım:
+    python person_detector_benchmark.py snapshots/camera_001/2026-01-15 --limit 200
+    python person_detector_benchmark.py snapshots --fast-imgsz 256 --output bench_detector.json
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from camera_snapshot_system import (
+    PersonCascadeSettings,
+    _coverage,
+    detect_person_boxes,
+    run_person_cascade,
+)
+
+
+def _latency_stats(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000.0
+    return {
+        "count": len(values),
+        "mean_ms": round(float(ms.mean()), 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+def run_benchmark(image_paths: List[Path], min_coverage_ratio: float,
+                  settings: PersonCascadeSettings) -> Dict:
+    """Her görüntüde iki yöntemi çalıştır ve raporu döndür"""
+    # Model yükleme / ilk çağrı maliyeti ölçüme girmesin
+    warmup = np.zeros((480, 640, 3), dtype=np.uint8)
+    detect_person_boxes(warmup)
+    detect_person_boxes(warmup, settings.fast_weights, imgsz=settings.fast_imgsz, conf=settings.fast_conf)
+
+    baseline_s, stage1_s, stage2_s, cascade_s = [], [], [], []
+    agree = escalated = 0
+    mismatches = []
+    for path in image_paths:
+        image = np.asarray(Image.open(path).convert("RGB"))
+        area = float(image.shape[0] * image.shape[1])
+
+        t0 = time.perf_counter()
+        base_boxes = detect_person_boxes(image)
+        baseline_s.append(time.perf_counter() - t0)
+        base_human = _coverage(base_boxes, area) >= min_coverage_ratio
+
+        boxes, timings = run_person_cascade(image, min_coverage_ratio, settings)
+        stage1_s.append(timings["stage1_seconds"])
+        if timings["stage"] == 2:
+            escalated += 1
+            stage2_s.append(timings["stage2_seconds"])
+        cascade_s.append(timings["stage1_seconds"] + timings["stage2_seconds"])
+        cascade_human = _coverage(boxes, area) >= min_coverage_ratio
+
+        if cascade_human == base_human:
+            agree += 1
+        else:
+            mismatches.append({"image": str(path), "single_stage_human": base_human, "cascade_human": cascade_human})
+
+    n = len(image_paths)
+    baseline_total = sum(baseline_s)
+    cascade_total = sum(cascade_s)
+    return {
+        "images": n,
+        "min_coverage_ratio": min_coverage_ratio,
+        "cascade": {
+            "fast_weights": settings.fast_weights,
+            "fast_imgsz": settings.fast_imgsz,
+            "margin": settings.margin,
+        },
+        "single_stage": _latency_stats(baseline_s),
+        "stage1": _latency_stats(stage1_s),
+        "stage2": _latency_stats(stage2_s),
+        "cascade_total": _latency_stats(cascade_s),
+        "escalation_rate": round(escalated / n, 3) if n else 0.0,
+        "decision_agreement": round(agree / n, 3) if n else 0.0,
+        "speedup": round(baseline_total / cascade_total, 2) if cascade_total else None,
+        "mismatches": mismatches,
+    }
+
+
+def _print_report(report: Dict) -> None:
+    print(f"[BENCH] {report['images']} görüntü, min_coverage_ratio={report['min_coverage_ratio']}")
+    for key, label in (("single_stage", "Tek aşama (yolov8s)"), ("stage1", "Aşama 1"),
+                       ("stage2", "Aşama 2"), ("cascade_total", "Kademeli toplam")):
+        st = report[key]
+        if st["count"]:
+            print(f"    {label:22s}: ort {st['mean_ms']:.1f} ms | p50 {st['p50_ms']:.1f} ms | "
+                  f"p95 {st['p95_ms']:.1f} ms ({st['count']} kare)")
+        else:
+            print(f"    {label:22s}: -")
+    print(f"[BENCH] 2. aşamaya devredilen: %{report['escalation_rate'] * 100:.1f} | "
+          f"Karar uyumu: %{report['decision_agreement'] * 100:.1f} | Hızlanma: {report['speedup']}x")
+    for m in report["mismatches"]:
+        print(f"    [FARK] {m['image']}: tek aşama={m['single_stage_human']}, kademeli={m['cascade_human']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tek aşamalı ve kademeli insan algılama karşılaştırması")
+    parser.add_argument("images", help="Görüntü klasörü (alt klasörler dahil .jpg)")
+    parser.add_argument("--limit", type=int, default=0, help="En fazla bu kadar görüntü (0 = hepsi)")
+    parser.add_argument("--min-coverage", type=float, default=0.15)
+    parser.add_argument("--fast-weights", default="yolov8n.pt")
+    parser.add_argument("--fast-imgsz", type=int, default=320)
+    parser.add_argument("--margin", type=float, default=0.5)
+    parser.add_argument("--output", default=None, help="Raporu JSON olarak kaydet")
+    args = parser.parse_args()
+
+    image_paths = sorted(Path(args.images).rglob("*.jpg"))
+    if args.limit:
+        image_paths = image_paths[:args.limit]
+    if not image_paths:
+        print(f"[HATA] Görüntü bulunamadı: {args.images}")
+        return
+
+    settings = PersonCascadeSettings(fast_weights=args.fast_weights, fast_imgsz=args.fast_imgsz, margin=args.margin)
+    report = run_benchmark(image_paths, args.min_coverage, settings)
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] Rapor kaydedildi: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
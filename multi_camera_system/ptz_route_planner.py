@@ -0,0 +1,111 @@
+"""
+PTZ Route Planner
+Bir kameranın ptz_targets listesini toplam azimuth + elevation + zoom hareketini en aza
+indirecek sırada dizer (açık gezgin satıcı yolu: başlangıç ve bitiş serbest).
+
+Azimuth 360°'de sarmalıdır (359° → 1° arası 2°). Çözüm: her hedeften başlayan en yakın komşu
+turları + 2-opt iyileştirmesi; 16 hedefe kadar milisaniyeler içinde biter.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+Target = Tuple[str, Dict]
+
+
+def _pan_distance(a: float, b: float) -> float:
+    """360° sarmalı azimuth mesafesi"""
+    d = abs(a - b) % 360.0
+    return min(d, 360.0 - d)
+
+
+def ptz_distance(a: Dict, b: Dict, zoom_weight: float = 1.0) -> float:
+    """İki PTZ konumu arasındaki hareket maliyeti (derece + ağırlıklı zoom birimi)"""
+    return (
+        _pan_distance(float(a["azimuth"]), float(b["azimuth"]))
+        + abs(float(a["elevation"]) - float(b["elevation"]))
+        + zoom_weight * abs(float(a["zoom"]) - float(b["zoom"]))
+    )
+
+
+def route_length(targets: List[Target], zoom_weight: float = 1.0) -> float:
+    """Verilen sırayla gezildiğinde toplam hareket maliyeti"""
+    return sum(
+        ptz_distance(targets[i][1], targets[i + 1][1], zoom_weight)
+        for i in range(len(targets) - 1)
+    )
+
+
+def _path_cost(order: List[int], dist: List[List[float]]) -> float:
+    return sum(dist[order[i]][order[i + 1]] for i in range(len(order) - 1))
+
+
+def _nearest_neighbour(start: int, dist: List[List[float]]) -> List[int]:
+    n = len(dist)
+    order = [start]
+    remaining = set(range(n)) - {start}
+    while remaining:
+        last = order[-1]
+        nxt = min(remaining, key=lambda j: (dist[last][j], j))
+        order.append(nxt)
+        remaining.remove(nxt)
+    return order
+
+
+def _two_opt(order: List[int], dist: List[List[float]]) -> List[int]:
+    """Açık yol için 2-opt: kenar (i-1,i) ve (j,j+1) ters çevrilerek iyileştirilir"""
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = order[i - 1], order[i]
+                c = order[j]
+                d = order[j + 1] if j + 1 < n else None
+                before = dist[a][b] + (dist[c][d] if d is not None else 0.0)
+                after = dist[a][c] + (dist[b][d] if d is not None else 0.0)
+                if after + 1e-9 < before:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+        # Yolun başını da serbest bırak: ilk segmenti ters çevirmek (0..j) başlangıcı değiştirir
+        for j in range(1, n - 1):
+            c, d = order[j], order[j + 1]
+            if dist[order[0]][d] + 1e-9 < dist[c][d]:
+                order[0:j + 1] = reversed(order[0:j + 1])
+                improved = True
+    return order
+
+
+def plan_route(targets: List[Target], zoom_weight: float = 1.0,
+               start: Optional[Dict] = None) -> List[Target]:
+    """
+    Hedefleri toplam PTZ hareketini en aza indirecek sırada döndür.
+
+    Args:
+        targets: [(target_name, {"azimuth", "elevation", "zoom"}), ...] (YAML sırası)
+        zoom_weight: Zoom biriminin derece cinsinden ağırlığı
+        start: Kameranın bilinen mevcut konumu (varsa ilk hedefe olan mesafe de hesaba katılır)
+    """
+    n = len(targets)
+    if n <= 2 and start is None:
+        return list(targets)
+
+    dist = [[ptz_distance(targets[i][1], targets[j][1], zoom_weight) for j in range(n)] for i in range(n)]
+
+    def _total(order: List[int]) -> float:
+        lead = ptz_distance(start, targets[order[0]][1], zoom_weight) if start is not None else 0.0
+        return lead + _path_cost(order, dist)
+
+    best = list(range(n))
+    best_cost = _total(best)
+    for s in range(n):
+        order = _two_opt(_nearest_neighbour(s, dist), dist)
+        if start is not None:
+            # Mevcut konuma yakın uçtan başla
+            order_rev = list(reversed(order))
+            if _total(order_rev) < _total(order):
+                order = order_rev
+        cost = _total(order)
+        if cost + 1e-9 < best_cost:
+            best, best_cost = order, cost
+    return [targets[i] for i in best]
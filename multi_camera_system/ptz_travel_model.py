@@ -0,0 +1,152 @@
+"""
+PTZ Travel-Time Model
+Kamera başına gerçek PTZ hareket sürelerini (from → to konum çifti) kaydeder ve
+bir sonraki hareket için bekleme süresini tahmin eder.
+
+- Aynı konum çifti için yeterli ölçüm varsa o çiftin ölçümlerinin 90. yüzdeliği kullanılır.
+- Yoksa kameranın tüm ölçümlerinden süre = a + b·|Δpan| + c·|Δtilt| + d·|Δzoom| doğrusal modeli kurulur.
+- Tahmin hiçbir zaman move_settle_seconds üst sınırını aşmaz (sınırlama çağıran tarafta).
+
+Ölçümler konum geri bildirimli bekleme (settle_detection) veya model (travel_model) açıkken her
+hareketten sonra toplanır; bellekte biriktirilir ve tur sonunda save() ile JSON dosyasına bir kez yazılır.
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+Position = Tuple[float, float, float]
+
+DEFAULT_MODEL_PATH = Path(__file__).parent / "ptz_travel_times.json"
+MAX_SAMPLES_PER_PAIR = 20
+
+
+def _pan_distance(a: float, b: float) -> float:
+    """360° sarmalı azimuth mesafesi"""
+    d = abs(a - b) % 360.0
+    return min(d, 360.0 - d)
+
+
+def _features(origin: Position, target: Position) -> List[float]:
+    return [
+        1.0,
+        _pan_distance(origin[0], target[0]),
+        abs(origin[1] - target[1]),
+        abs(origin[2] - target[2]),
+    ]
+
+
+def pair_key(origin: Position, target: Position) -> str:
+    """Konum çifti anahtarı: 'az,el,zoom->az,el,zoom'"""
+    def _fmt(p: Position) -> str:
+        return ",".join(f"{round(v, 1):g}" for v in p)
+    return f"{_fmt(origin)}->{_fmt(target)}"
+
+
+class TravelTimeModel:
+    """Kamera başına PTZ hareket süresi ölçümleri ve tahmin modeli (thread-safe)"""
+
+    def __init__(self, path: Path = DEFAULT_MODEL_PATH, min_samples: int = 3):
+        self.path = Path(path)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        # {camera_id: {pair_key: {"origin": [...], "target": [...], "seconds": [..]}}}
+        self._data: Dict[str, Dict[str, Dict]] = {}
+        self._fits: Dict[str, Optional[Tuple[np.ndarray, float]]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._data = data if isinstance(data, dict) else {}
+        except Exception as e:
+            print(f"[UYARI] PTZ hareket süresi modeli okunamadı ({self.path}): {e}")
+            self._data = {}
+
+    def _save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[UYARI] PTZ hareket süresi modeli kaydedilemedi ({self.path}): {e}")
+
+    def save(self) -> None:
+        """Son kayıttan beri yeni ölçüm varsa modeli dosyaya yaz (tur sonunda bir kez çağrılır)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._save()
+            self._dirty = False
+
+    def record(self, camera_id: str, origin: Position, target: Position, seconds: float) -> None:
+        """Ölçülen bir hareket süresini belleğe ekle (dosyaya save() ile yazılır)"""
+        key = pair_key(origin, target)
+        with self._lock:
+            pairs = self._data.setdefault(camera_id, {})
+            entry = pairs.setdefault(key, {"origin": list(origin), "target": list(target), "seconds": []})
+            entry["seconds"] = (entry["seconds"] + [round(float(seconds), 3)])[-MAX_SAMPLES_PER_PAIR:]
+            self._fits.pop(camera_id, None)
+            self._dirty = True
+
+    def _fit(self, camera_id: str) -> Optional[Tuple[np.ndarray, float]]:
+        """Kameranın tüm ölçümlerinden doğrusal model + artık payı (90. yüzdelik) çıkar"""
+        if camera_id in self._fits:
+            return self._fits[camera_id]
+        rows, durations = [], []
+        for entry in self._data.get(camera_id, {}).values():
+            feats = _features(tuple(entry["origin"]), tuple(entry["target"]))
+            for sec in entry["seconds"]:
+                rows.append(feats)
+                durations.append(sec)
+        fit = None
+        # 4 katsayı için en az birkaç farklı hareket gerekir
+        if len(durations) >= max(8, self.min_samples * 2):
+            X = np.asarray(rows, dtype=np.float64)
+            y = np.asarray(durations, dtype=np.float64)
+            coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+            residuals = y - X @ coef
+            fit = (coef, float(np.percentile(residuals, 90)))
+        self._fits[camera_id] = fit
+        return fit
+
+    def predict(self, camera_id: str, origin: Optional[Position], target: Position) -> Optional[float]:
+        """
+        Hareket süresini tahmin et (saniye). Yeterli veri yoksa veya başlangıç konumu
+        bilinmiyorsa None döner; çağıran sabit move_settle_seconds'a düşer.
+        """
+        if origin is None:
+            return None
+        with self._lock:
+            entry = self._data.get(camera_id, {}).get(pair_key(origin, target))
+            if entry and len(entry["seconds"]) >= self.min_samples:
+                return float(np.percentile(entry["seconds"], 90))
+            fit = self._fit(camera_id)
+        if fit is None:
+            return None
+        coef, residual_margin = fit
+        estimate = float(np.dot(coef, _features(origin, target))) + max(0.0, residual_margin)
+        return max(0.0, estimate)
+
+
+_model: Optional[TravelTimeModel] = None
+_model_lock = threading.Lock()
+
+
+def get_travel_model() -> TravelTimeModel:
+    """Süreç genelinde tek model örneği (PTZ_TRAVEL_MODEL_PATH env ile dosya yolu değiştirilebilir)"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = TravelTimeModel(Path(os.getenv("PTZ_TRAVEL_MODEL_PATH", str(DEFAULT_MODEL_PATH))))
+    return _model
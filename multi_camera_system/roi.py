@@ -0,0 +1,162 @@
+"""
+Region of Interest (ROI)
+PTZ hedefleri hep aynı tezgahlara baktığı için algılama tüm kare yerine hedefin ROI
+poligonlarında yapılır. cameras.yaml:
+
+    ptz_targets:
+      konum1:
+        azimuth: 319
+        elevation: 21
+        zoom: 2
+        roi:                                  # normalize (0-1) [x, y] köşeler, bir veya daha fazla poligon
+          - [[0.05, 0.35], [0.95, 0.35], [0.95, 0.98], [0.05, 0.98]]
+
+Koordinatlar normalize olduğu için küçültülmüş decode (jpeg_decode) ve tam çözünürlükte aynı
+ROI geçerlidir. Dedektör poligonların sınırlayıcı dikdörtgenlerinden (karo) çalışır; kutunun
+alanının min_overlap kadarı ROI içinde değilse kutu atılır.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+Rect = Tuple[int, int, int, int]  # (x1, y1, x2, y2), piksel
+
+TILE_PAD = 0.02          # Karo kenarlarına eklenen pay (kare boyutuna oranla) - kenardaki ürünler kesilmesin
+MAX_TILES = 4            # Daha fazla karo çıkarsa tek birleşim dikdörtgeni kullanılır
+TILE_MERGE_RATIO = 0.8   # Karoların toplam alanı birleşim dikdörtgeninin bu oranını geçerse tek karo
+_RETRY_SUFFIX = re.compile(r"(_retry\d*)+$")
+
+
+def _overlaps(a: Rect, b: Rect) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _area(r: Rect) -> int:
+    return max(0, r[2] - r[0]) * max(0, r[3] - r[1])
+
+
+class RegionOfInterest:
+    """Bir PTZ hedefinin ROI poligonları (normalize koordinatlar)"""
+
+    def __init__(self, polygons: Sequence[Sequence[Sequence[float]]], min_overlap: float = 0.5):
+        self.polygons = [np.clip(np.asarray(p, dtype=np.float64), 0.0, 1.0) for p in polygons]
+        self.min_overlap = float(min_overlap)
+        self._masks: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @classmethod
+    def from_config(cls, raw, min_overlap: float = 0.5, name: str = "") -> Optional["RegionOfInterest"]:
+        """YAML'daki roi değerini doğrula; geçersiz poligonlar uyarıyla atlanır"""
+        if not raw:
+            return None
+        if isinstance(raw, (list, tuple)) and raw and isinstance(raw[0], (list, tuple)) \
+                and raw[0] and not isinstance(raw[0][0], (list, tuple)):
+            raw = [raw]  # tek poligon iç içe liste olmadan yazılmış
+        polygons = []
+        for poly in raw if isinstance(raw, (list, tuple)) else []:
+            try:
+                pts = np.asarray(poly, dtype=np.float64)
+            except (TypeError, ValueError):
+                pts = None
+            if pts is None or pts.ndim != 2 or pts.shape[1] != 2 or len(pts) < 3:
+                print(f"[UYARI] Geçersiz ROI poligonu atlandı ({name}): {poly}")
+                continue
+            if pts.max() > 1.0 or pts.min() < 0.0:
+                print(f"[UYARI] ROI koordinatları 0-1 aralığında olmalı ({name}), kırpılıyor")
+            polygons.append(pts)
+        if not polygons:
+            return None
+        return cls(polygons, min_overlap)
+
+    def mask(self, width: int, height: int) -> np.ndarray:
+        """(height, width) bool maske - boyut başına önbelleklenir"""
+        key = (width, height)
+        if key not in self._masks:
+            img = Image.new("L", (width, height), 0)
+            draw = ImageDraw.Draw(img)
+            for poly in self.polygons:
+                draw.polygon([(float(x * width), float(y * height)) for x, y in poly], fill=1)
+            self._masks[key] = np.asarray(img, dtype=bool)
+        return self._masks[key]
+
+    def tiles(self, width: int, height: int) -> List[Rect]:
+        """Dedektöre verilecek dikdörtgenler: poligon kutuları (paylı), çakışanlar birleştirilir"""
+        pad_x, pad_y = int(TILE_PAD * width), int(TILE_PAD * height)
+        rects: List[Rect] = []
+        for poly in self.polygons:
+            x1, y1 = poly.min(axis=0)
+            x2, y2 = poly.max(axis=0)
+            rects.append((max(0, int(x1 * width) - pad_x), max(0, int(y1 * height) - pad_y),
+                          min(width, int(np.ceil(x2 * width)) + pad_x),
+                          min(height, int(np.ceil(y2 * height)) + pad_y)))
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    if _overlaps(rects[i], rects[j]):
+                        a, b = rects[i], rects.pop(j)
+                        rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                        merged = True
+                        break
+                if merged:
+                    break
+        rects = [r for r in rects if _area(r) > 0]
+        union = (min(r[0] for r in rects), min(r[1] for r in rects),
+                 max(r[2] for r in rects), max(r[3] for r in rects))
+        if len(rects) > MAX_TILES or sum(_area(r) for r in rects) > TILE_MERGE_RATIO * _area(union):
+            return [union]
+        return rects
+
+    def overlap(self, box: Sequence[float], width: int, height: int) -> float:
+        """Kutu alanının ROI içinde kalan oranı"""
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(width, int(np.ceil(box[2]))), min(height, int(np.ceil(box[3])))
+        if x2 <= x1 or y2 <= y1:
+            return 0.0
+        return float(self.mask(width, height)[y1:y2, x1:x2].mean())
+
+    def filter_boxes(self, boxes: Sequence[Tuple], width: int, height: int) -> List[Tuple]:
+        """(x1, y1, x2, y2, ...) kutularından ROI dışında kalanları at"""
+        return [b for b in boxes if self.overlap(b, width, height) >= self.min_overlap]
+
+    def pixel_ratio(self, width: int, height: int) -> float:
+        """Karoların toplam alanının kareye oranı (dedektöre giden piksel kazancı)"""
+        return sum(_area(r) for r in self.tiles(width, height)) / float(width * height)
+
+
+def target_rois(ptz_targets: Dict, min_overlap: float = 0.5) -> Dict[str, RegionOfInterest]:
+    """ptz_targets sözlüğünden ROI tanımlı hedefleri çıkar"""
+    rois = {}
+    for target_name, coords in (ptz_targets or {}).items():
+        if isinstance(coords, dict):
+            roi = RegionOfInterest.from_config(coords.get("roi"), min_overlap, target_name)
+            if roi is not None:
+                rois[target_name] = roi
+    return rois
+
+
+def snapshot_target_name(stem: str) -> str:
+    """
+    Snapshot dosya adından (<target_name>_HHMMSS) hedef adını çıkar. Tekrar çekimlerin
+    sonekleri (<target_name>_retry2_HHMMSS, tur sonu: <target_name>_retry_retry2_HHMMSS) atılır.
+    """
+    return _RETRY_SUFFIX.sub("", stem.rsplit("_", 1)[0])
+
+
+def detect_in_roi(image: np.ndarray, roi: Optional[RegionOfInterest],
+                  detect: Callable[[np.ndarray], List[Tuple]]) -> List[Tuple]:
+    """
+    detect(dizi) -> [(x1, y1, x2, y2, ...)] fonksiyonunu ROI karolarında çalıştır; kutuları tam
+    kare koordinatlarına taşı ve ROI dışındakileri at. roi None ise tüm kare kullanılır.
+    """
+    if roi is None:
+        return detect(image)
+    height, width = image.shape[:2]
+    boxes = []
+    for x1, y1, x2, y2 in roi.tiles(width, height):
+        for box in detect(np.ascontiguousarray(image[y1:y2, x1:x2])):
+            boxes.append((box[0] + x1, box[1] + y1, box[2] + x1, box[3] + y1) + tuple(box[4:]))
+    return roi.filter_boxes(boxes, width, height)
@@ -5,14 +5,14 @@ S3'ten snapshot'ları alır, yüzleri blur'lar ve tekrar S3'e yükler.
 """
 import os
 import cv2
-import torch
 from pathlib import Path
 from datetime import datetime
-from facenet_pytorch import MTCNN
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
 from dotenv import load_dotenv
+from multi_camera_system.jpeg_decode import decode_reduced
+from multi_camera_system.inference_sidecar import get_sidecar_client, sidecar_enabled
 # urllib3 SSL uyarılarını bastır (self-signed certificate için)
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -28,6 +28,12 @@ os.environ.setdefault("AWS_RESPONSE_CHECKSUM_VALIDATION", "when_required")
 # === Klasörler ===
 SNAPSHOTS_ROOT = Path("snapshots")  # camera_XXX/YYYY-MM-DD/HH/*.jpg
 
+# Yüz algılama varsayılan olarak tam çözünürlükte yapılır (0). > 0 ise bu uzun kenara kadar küçültülmüş
+# (JPEG DCT) görüntüde yapılır ve MTCNN'in en küçük yüz boyutu ölçekle küçültülür; tam çözünürlükte
+# FACE_MIN_SIZE pikselden büyük yüzler her iki durumda da bulanıklaştırılır
+FACE_DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "0"))
+FACE_MIN_SIZE = float(os.getenv("FACE_MIN_SIZE", "20"))  # px, tam çözünürlük (MTCNN varsayılanı)
+
 # === S3 Object Storage Ayarları ===
 S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "https://161cohesity.carrefoursa.com:3000")
 S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "sWxdTl3ERx7myBE1qpW06_haVvuhATcdsmBbqaWkXYU")
@@ -112,8 +118,28 @@ def _list_blobs_in_path(prefix: str) -> list:
         print(f"⚠️  S3 listeleme hatası ({prefix}): {e}")
         return []
 
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-mtcnn = MTCNN(keep_all=True, device=device)
+_mtcnn = None
+
+def _get_mtcnn():
+    """MTCNN'i lazy load et (sidecar kullanılıyorsa torch hiç import edilmez)"""
+    global _mtcnn
+    if _mtcnn is None:
+        import torch
+        from facenet_pytorch import MTCNN
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        _mtcnn = MTCNN(keep_all=True, device=device)
+    return _mtcnn
+
+def _detect_faces(rgb, min_face_size: float = FACE_MIN_SIZE):
+    """Yüz kutuları: önce sıcak inference sidecar'ı (INFERENCE_SIDECAR), erişilemezse lokal MTCNN"""
+    if sidecar_enabled():
+        remote = get_sidecar_client().detect_faces([rgb], min_face_size)
+        if remote is not None:
+            return [det[:4] for det in remote[0]]
+    mtcnn = _get_mtcnn()
+    mtcnn.min_face_size = min_face_size
+    boxes, _ = mtcnn.detect(rgb)
+    return boxes
 
 def _to_snapshot_blob_path(local_path: Path) -> str:
     """Lokal dosya yolundan S3 blob yolunu oluşturur: snapshots/camera_XXX/YYYY-MM-DD/HH/filename.jpg"""
@@ -136,24 +162,29 @@ def _to_snapshot_blob_path(local_path: Path) -> str:
 
 def blur_faces(img_path: Path):
     """Yüzleri bulanıklaştır, yerinde kaydet ve S3 Object Storage'a aynı yapıyla yükle."""
-    img = cv2.imread(str(img_path))
-    if img is None:
-        print(f"⚠️  Görsel okunamadı: {img_path}")
+    try:
+        reduced = decode_reduced(img_path, FACE_DETECT_MAX_SIDE)
+    except Exception as e:
+        print(f"⚠️  Görsel okunamadı: {img_path} ({e})")
         return None
 
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    boxes, _ = mtcnn.detect(rgb)
+    # Küçültülmüş görüntüde en küçük yüz de aynı oranda küçülür; tam çözünürlükteki alt sınır korunur
+    boxes = _detect_faces(reduced.array, FACE_MIN_SIZE / max(reduced.scale))
 
-    if boxes is not None:
+    # Yüz yoksa dosya olduğu gibi yüklenir (tam çözünürlük decode + yeniden encode yok)
+    if boxes is not None and len(boxes) > 0:
+        img = cv2.imread(str(img_path))
+        if img is None:
+            print(f"⚠️  Görsel okunamadı: {img_path}")
+            return None
         for box in boxes:
-            x1, y1, x2, y2 = [int(coord) for coord in box]
+            x1, y1, x2, y2 = [int(coord) for coord in reduced.to_full(box)]
             face = img[y1:y2, x1:x2]
             if face.size == 0:
                 continue
             blurred = cv2.GaussianBlur(face, (51, 51), 30)
             img[y1:y2, x1:x2] = blurred
-
-    cv2.imwrite(str(img_path), img)
+        cv2.imwrite(str(img_path), img)
 
     # S3'e yükle
     s3_key = _to_snapshot_blob_path(img_path)
@@ -12,8 +12,12 @@ import base64
 import mimetypes
 import tempfile
 import shutil
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Set, Tuple, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
@@ -110,7 +114,18 @@ def upload_file_to_blob(local_path: Path, s3_key: str, content_type: str = "imag
         # Dosyayı okuyup bytes olarak al
         with open(local_path, "rb") as f:
             data = f.read()
-        
+    except Exception as e:
+        print(f"⚠️  S3 upload hatası ({local_path.name}): {e}")
+        return None
+    return upload_bytes_to_blob(data, s3_key, content_type, name=local_path.name)
+
+def upload_bytes_to_blob(data: bytes, s3_key: str, content_type: str = "image/jpeg",
+                         name: Optional[str] = None) -> Optional[str]:
+    """Bellekteki veriyi S3'e yükle"""
+    s3 = _ensure_s3_client()
+    if not s3:
+        return None
+    try:
         # put_object kullan (ContentLength otomatik hesaplanır)
         s3.put_object(
             Bucket=S3_BUCKET_NAME,
@@ -120,9 +135,53 @@ def upload_file_to_blob(local_path: Path, s3_key: str, content_type: str = "imag
         )
         return s3_key
     except Exception as e:
-        print(f"⚠️  S3 upload hatası ({local_path.name}): {e}")
+        print(f"⚠️  S3 upload hatası ({name or s3_key}): {e}")
         return None
 
+def delete_blob(s3_key: str) -> bool:
+    """S3 objesini sil"""
+    s3 = _ensure_s3_client()
+    if not s3:
+        return False
+    try:
+        s3.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+        return True
+    except ClientError as e:
+        print(f"⚠️  S3 silme hatası ({s3_key}): {e}")
+        return False
+
+def read_blob_range(s3_key: str, offset: int, length: int) -> Optional[bytes]:
+    """S3 objesinin bir byte aralığını oku (ranged GET)"""
+    s3 = _ensure_s3_client()
+    if not s3:
+        return None
+    try:
+        resp = s3.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key,
+                             Range=f"bytes={offset}-{offset + length - 1}")
+        return resp["Body"].read()
+    except ClientError as e:
+        print(f"⚠️  S3 okuma hatası ({s3_key} @{offset}+{length}): {e}")
+        return None
+
+def load_crop_pack_index(index_key: str) -> Optional[Dict[str, Any]]:
+    """Crop paketinin JSON index'ini S3'ten oku"""
+    s3 = _ensure_s3_client()
+    if not s3:
+        return None
+    try:
+        resp = s3.get_object(Bucket=S3_BUCKET_NAME, Key=index_key)
+        return json.loads(resp["Body"].read())
+    except (ClientError, ValueError) as e:
+        print(f"⚠️  Crop paket index'i okunamadı ({index_key}): {e}")
+        return None
+
+def read_packed_crop(index: Dict[str, Any], name: str) -> Optional[bytes]:
+    """Paketlenmiş tek bir crop'u (dosya adıyla) index'teki offset'ten ranged GET ile getir"""
+    for entry in index.get("crops", []):
+        if entry["name"] == name:
+            return read_blob_range(index["pack"], entry["offset"], entry["length"])
+    return None
+
 def list_blobs_in_path(prefix: str) -> List[str]:
     """S3'te belirli bir prefix altındaki tüm object'leri listele"""
     s3 = _ensure_s3_client()
@@ -178,8 +237,54 @@ CAPTION_H = 28
 PADDING = 6
 FONT_SIZE = 16
 FONT_PATH = os.getenv("COLLAGE_FONT", "")
+# Collage yerleşimi: grid (sabit GRID_COLS x GRID_ROWS, BATCH_SIZE crop) | adaptive (karo boyutu crop'un
+# piksel sayısı ve oranından; collage görsel token bütçesine sığdığı kadar crop alır). adaptive, etiketli
+# saatlerde çürük sınıflandırma doğruluğu doğrulanana kadar opsiyoneldir
+COLLAGE_MODE = os.getenv("COLLAGE_MODE", "grid").strip().lower()
+COLLAGE_IMAGE_TOKENS = int(os.getenv("COLLAGE_IMAGE_TOKENS", "765"))  # 765: 1024x768 (sabit grid ile aynı maliyet)
+COLLAGE_MAX_ITEMS = int(os.getenv("COLLAGE_MAX_ITEMS", "40"))
+# Adaptive karo kenarı (geometrik ortalama) sınırları. Grid tuvalini (1360x1184) model ~0.65 küçültür, 256 karo
+# ~166 px görünür; 128 çağrı sayısını düşürür, 160 grid çözünürlüğünü korur (collage_packing_benchmark.py)
+COLLAGE_MIN_TILE = int(os.getenv("COLLAGE_MIN_TILE", "96"))
+COLLAGE_MAX_TILE = int(os.getenv("COLLAGE_MAX_TILE", "128"))
+# Detection için snapshot bu uzun kenara kadar küçültülmüş (JPEG DCT) decode edilir; crop'lar tam çözünürlükten alınır
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", "640"))
+# Inference backend: torch | onnx | openvino; INT8 kalibrasyonu INT8_CALIBRATION_DIR (yoksa o saatin snapshot'ları)
+DETECT_BACKEND = os.getenv("DETECT_BACKEND", "torch").strip().lower()
+DETECT_INT8 = os.getenv("DETECT_INT8", "false").strip().lower() in ("1", "true", "yes")
+DETECT_IMGSZ = int(os.getenv("DETECT_IMGSZ", "640"))
+# model.predict'e tek seferde verilen snapshot sayısı (analiz sunucusunun CPU sayısına göre ayarlanır)
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "4"))
+# Crop JPEG encode ve S3 yükleme thread sayıları
+CROP_ENCODE_WORKERS = int(os.getenv("CROP_ENCODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+CROP_UPLOAD_WORKERS = int(os.getenv("CROP_UPLOAD_WORKERS", "4"))
+# S3'e crop yükleme biçimi: off (crop başına bir obje) | snapshot | hour (tek paket + JSON index, ranged GET ile okunur)
+CROP_PACK_MODE = os.getenv("CROP_PACK_MODE", "off").strip().lower()
+# Collage öncesi crop triage (kurallar cameras.yaml > crop_triage). Atılan crop'lar raporda yer almaz
+# (sadece triage_dropped.json), eşikler doğrulanana kadar açıkça açılmalıdır
+CROP_TRIAGE = os.getenv("CROP_TRIAGE", "false").strip().lower() in ("1", "true", "yes")
+# Komşu PTZ hedeflerinde aynı kasanın tekrarları: görüş alanı örtüşen hedeflerden (ptz_targets.<konum>.overlaps)
+# gelen, aynı sınıftan ve perceptual hash Hamming mesafesi bu değere kadar olan crop'lardan sadece biri LLM'e
+# gider, karar diğerlerine kopyalanır. Benzer paketleri birleştirme riski nedeniyle açıkça açılmalıdır
+CROP_DEDUP = os.getenv("CROP_DEDUP", "false").strip().lower() in ("1", "true", "yes")
+CROP_DEDUP_MAX_DISTANCE = int(os.getenv("CROP_DEDUP_MAX_DISTANCE", "8"))
+INT8_CALIBRATION_DIR = os.getenv("INT8_CALIBRATION_DIR", "").strip() or None
+# Akış hattı (main): aşama başına thread sayısı ve aşamalar arası kuyruk kapasitesi
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "4"))
+PIPELINE_DETECT_WORKERS = int(os.getenv("PIPELINE_DETECT_WORKERS", "1"))  # her biri kendi modelini yükler
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
 
 MIN_CONF_ROTTEN = float(os.getenv("MIN_CONF_ROTTEN", "0.85"))
+# Azure sınıflandırma eşzamanlılığı ve deployment kotası (0 = limit yok); 429'da Retry-After'a uyulur
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+AZURE_RPM_LIMIT = int(os.getenv("AZURE_RPM_LIMIT", "60"))
+AZURE_TPM_LIMIT = int(os.getenv("AZURE_TPM_LIMIT", "60000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_MAX_TOKENS = 1000
+# LLM'in iki denemede de başarısız olduğu batch'ler S3'teki kuyruğa yazılır, sonraki çalıştırmada önce onlar denenir
+LLM_RETRY_PREFIX = os.getenv("LLM_RETRY_PREFIX", "llm_retry_queue/")
+LLM_RETRY_MAX_AGE_HOURS = float(os.getenv("LLM_RETRY_MAX_AGE_HOURS", "48"))
+LLM_RETRY_BASE_MINUTES = float(os.getenv("LLM_RETRY_BASE_MINUTES", "10"))
 AZURE_ENDPOINT = (os.getenv("AZURE_OPENAI_ENDPOINT") or "").strip()
 AZURE_API_KEY = (os.getenv("AZURE_OPENAI_API_KEY") or "").strip()
 DEPLOYMENT = (os.getenv("AZURE_OPENAI_DEPLOYMENT") or "gpt-4.1").strip()
@@ -187,6 +292,11 @@ DEPLOYMENT = (os.getenv("AZURE_OPENAI_DEPLOYMENT") or "gpt-4.1").strip()
 # ------- 3rd party -------
 PIL = _ensure("PIL", "pillow")
 from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from multi_camera_system.jpeg_decode import decode_reduced
+from multi_camera_system.inference_backend import BackendSettings, load_detector
+from multi_camera_system.inference_sidecar import get_sidecar_client, sidecar_enabled
+from multi_camera_system.roi import RegionOfInterest, snapshot_target_name, target_rois
 
 yaml_mod = _ensure("yaml", "pyyaml")
 import yaml
@@ -213,6 +323,7 @@ class Rec:
     saat: str
     magaza: str
     snapshot_blob_url: Optional[str] = None
+    size: Optional[Tuple[int, int]] = None  # crop piksel boyutu (collage yerleşimi; yoksa dosyadan okunur)
 
 # ------- Yardımcılar -------
 def load_camera_config(camera_id: str) -> Dict[str, Any]:
@@ -225,6 +336,23 @@ def load_camera_config(camera_id: str) -> Dict[str, Any]:
     camera = cameras.get(camera_id, {})
     return camera
 
+def load_target_rois(camera_id: str) -> Dict[str, RegionOfInterest]:
+    """Kameranın ptz_targets.<konum>.roi poligonları (hedef adı -> ROI)"""
+    config = load_camera_config(camera_id)
+    return target_rois(config.get("ptz_targets"), float(config.get("roi_min_overlap", 0.5)))
+
+def load_target_overlaps(camera_id: str) -> Dict[str, Set[str]]:
+    """Görüş alanı örtüşen hedefler (ptz_targets.<konum>.overlaps, iki yönlü): hedef adı -> komşular"""
+    overlaps: Dict[str, Set[str]] = {}
+    targets = load_camera_config(camera_id).get("ptz_targets") or {}
+    for name, target in targets.items():
+        for other in (target or {}).get("overlaps") or []:
+            if str(other) == str(name):
+                continue
+            overlaps.setdefault(str(name), set()).add(str(other))
+            overlaps.setdefault(str(other), set()).add(str(name))
+    return overlaps
+
 def get_store_name(camera_id: str) -> str:
     """Kamera ID'sine göre mağaza ismini al"""
     config = load_camera_config(camera_id)
@@ -303,88 +431,467 @@ def _ensure_yolo():
         from ultralytics import YOLO
         return YOLO
 
-def run_detection_and_crop(snapshot_paths: List[Path], output_dir: Path, 
-                           model_path: Path = MODEL_PATH,
-                           upload_to_s3: bool = True) -> List[Dict[str, Any]]:
+def _result_detections(result) -> List[Tuple[float, float, float, float, float, int]]:
+    """Ultralytics sonucunu [(x1, y1, x2, y2, conf, cls)] listesine çevir"""
+    detections = []
+    if result.boxes is not None:
+        for box in result.boxes:
+            bx1, by1, bx2, by2 = box.xyxy[0].cpu().numpy()
+            detections.append((bx1, by1, bx2, by2, float(box.conf[0].cpu().numpy()),
+                               int(box.cls[0].cpu().numpy())))
+    return detections
+
+CROP_PACK_MODES = ("off", "snapshot", "hour")
+
+def laplacian_variance(rgb: np.ndarray) -> float:
+    """Keskinlik ölçüsü: gri tonlamada 4-komşu Laplacian'ın varyansı (bulanık crop'ta düşük)"""
+    gray = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    lap = (4.0 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1]
+           - gray[1:-1, :-2] - gray[1:-1, 2:])
+    return float(lap.var())
+
+def build_crop_pack(entries: List[Tuple[Dict[str, Any], bytes]], pack_key: str) -> Tuple[bytes, Dict[str, Any]]:
     """
-    YOLOv12 ile detection yapıp crop'ları kaydeder ve S3'e yükler.
+    Crop JPEG'lerini art arda tek bir blob'a yaz ve byte offset'li index üret.
+    Okuyucu bir crop için index'teki (offset, length) ile ranged GET yapar; blob'da ek başlık yoktur.
     """
-    YOLO = _ensure_yolo()
-    if not model_path.exists():
-        raise FileNotFoundError(f"Model dosyası bulunamadı: {model_path}")
-    
-    print(f"[i] Model yükleniyor: {model_path}")
-    model = YOLO(str(model_path))
-    
-    all_crops = []
-    for snapshot_path in snapshot_paths:
-        print(f"[→] Detection: {snapshot_path.name}")
+    blob = BytesIO()
+    crops = []
+    for info, data in entries:
+        crops.append({
+            "name": info["crop_path"].name,
+            "snapshot": info["snapshot_path"].name,
+            "class_name": info["class_name"],
+            "class_id": info["class_id"],
+            "confidence": round(float(info["confidence"]), 6),
+            "bbox": info["bbox"],
+            "offset": blob.tell(),
+            "length": len(data),
+        })
+        blob.write(data)
+    index = {"version": 1, "pack": pack_key, "content_type": "image/jpeg", "crops": crops}
+    return blob.getvalue(), index
+
+class CropEngine:
+    """
+    Snapshot başına tek decode: tüm kutular aynı diziden dilimlenir, crop'lar thread havuzunda
+    JPEG'e encode edilir ve S3 yüklemeleri ayrı bir kuyruğa (thread havuzu) verilir.
+    Crop maliyeti kutu sayısıyla değil snapshot sayısıyla büyür; encode/yükleme detection ile örtüşür.
+
+    pack_mode snapshot/hour ise crop'lar tek tek yüklenmez; snapshot (veya saat) başına bir
+    packs/<ad>.pack + packs/<ad>.json (index) yüklenir. Lokal .jpg/.txt dosyaları her modda yazılır.
+    """
+
+    def __init__(self, output_dir: Path, upload_to_s3: bool = True,
+                 encode_workers: int = CROP_ENCODE_WORKERS, upload_workers: int = CROP_UPLOAD_WORKERS,
+                 pack_mode: str = CROP_PACK_MODE):
+        self.output_dir = output_dir
+        self.upload_to_s3 = upload_to_s3 and _ensure_s3_client() is not None  # client thread'lerden önce oluşsun
+        if pack_mode not in CROP_PACK_MODES:
+            print(f"[UYARI] Bilinmeyen CROP_PACK_MODE: {pack_mode}, off kullanılıyor")
+            pack_mode = "off"
+        self.pack_mode = pack_mode
+        self._encode_pool = ThreadPoolExecutor(max_workers=max(1, encode_workers), thread_name_prefix="crop-encode")
+        self._upload_pool = ThreadPoolExecutor(max_workers=max(1, upload_workers), thread_name_prefix="crop-upload")
+        self._pending: List[Tuple[Dict[str, Any], Future]] = []
+        self._uploads: List[Future] = []
+        self._upload_lock = threading.Lock()
+
+    def _s3_key(self, crop_path: Path) -> str:
+        temp_parts = list(crop_path.parts)
+        crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
+        return "/".join(temp_parts[crops_idx:])
+
+    def _encode(self, region: np.ndarray, crop_path: Path, label_line: str, info: Dict[str, Any]) -> bytes:
+        info["sharpness"] = laplacian_variance(region)  # triage için; dizi zaten bellekte
+        info["phash"] = perceptual_hash(region)        # tekrar bastırma için
+        buf = BytesIO()
+        Image.fromarray(region).save(buf, format="JPEG", quality=95)
+        data = buf.getvalue()
+        with open(crop_path, "wb") as f:
+            f.write(data)
+        with open(crop_path.with_suffix(".txt"), "w") as f:
+            f.write(label_line)
+        if self.upload_to_s3 and self.pack_mode == "off":
+            fut = self._upload_pool.submit(upload_bytes_to_blob, data, self._s3_key(crop_path),
+                                           "image/jpeg", crop_path.name)
+            with self._upload_lock:
+                self._uploads.append(fut)
+        return data
+
+    def _upload_pack(self, name: str, pending: List[Tuple[Dict[str, Any], Future]]) -> Optional[str]:
+        """Encode'ları biten crop'ları paketle; önce paket, sonra index yüklenir (index varsa paket tamdır)"""
+        entries = []
+        for info, fut in pending:
+            try:
+                entries.append((info, fut.result()))
+            except Exception:
+                continue  # hata close() içinde raporlanır
+        if not entries:
+            return None
+        pack_key = self._s3_key(self.output_dir / "packs" / f"{name}.pack")
+        blob, index = build_crop_pack(entries, pack_key)
+        if not upload_bytes_to_blob(blob, pack_key, "application/octet-stream", f"{name}.pack"):
+            return None
+        index_key = pack_key[:-len(".pack")] + ".json"
+        return upload_bytes_to_blob(json.dumps(index, ensure_ascii=False).encode("utf-8"),
+                                    index_key, "application/json", f"{name}.json")
+
+    @staticmethod
+    def _notify_when_done(pending: List[Tuple[Dict[str, Any], Future]], on_done) -> None:
+        """Snapshot'ın tüm encode'ları bitince başarıyla yazılan crop'larla on_done çağır"""
+        if not pending:
+            on_done([])
+            return
+        remaining = [len(pending)]
+        lock = threading.Lock()
+
+        def _done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                on_done([info for info, fut in pending if fut.exception() is None])
+
+        for _, fut in pending:
+            fut.add_done_callback(_done)
+
+    def submit(self, snapshot_path: Path, reduced, detections, names, on_done=None) -> None:
+        """
+        Bir snapshot'ın tespitlerini crop kuyruğuna ekle (tam çözünürlük decode tek sefer).
+        on_done verilirse snapshot'ın crop'ları yazılınca (encode thread'inde) crop listesiyle çağrılır.
+        """
         try:
-            results = model.predict(str(snapshot_path), verbose=False)
+            with Image.open(snapshot_path) as im:
+                full = np.asarray(im.convert("RGB"))
         except Exception as e:
-            print(f"⚠️  Detection hatası ({snapshot_path.name}): {e}")
-            continue
-            
-        if not results or len(results) == 0: 
-            continue
-        result = results[0]
-        if result.boxes is None or len(result.boxes) == 0: 
-            continue
+            print(f"⚠️  Snapshot açılamadı ({snapshot_path.name}): {e}")
+            if on_done is not None:
+                on_done([])
+            return
+        img_height, img_width = full.shape[:2]
+        first = len(self._pending)
         
-        for idx, box in enumerate(result.boxes):
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            conf = float(box.conf[0].cpu().numpy())
-            cls_id = int(box.cls[0].cpu().numpy())
-            class_name = result.names[cls_id] if cls_id < len(result.names) else f"class_{cls_id}"
+        for idx, (bx1, by1, bx2, by2, conf, cls_id) in enumerate(detections):
+            x1, y1, x2, y2 = reduced.to_full((bx1, by1, bx2, by2))
+            class_name = names[cls_id] if cls_id < len(names) else f"class_{cls_id}"
+            x1 = max(0, int(x1))
+            y1 = max(0, int(y1))
+            x2 = min(img_width, int(x2))
+            y2 = min(img_height, int(y2))
+            if x2 <= x1 or y2 <= y1:
+                print(f"⚠️  Geçersiz bounding box: ({x1},{y1},{x2},{y2})")
+                continue
             
-            class_dir = output_dir / class_name
+            class_dir = self.output_dir / class_name
             class_dir.mkdir(parents=True, exist_ok=True)
-            crop_filename = f"{snapshot_path.stem}_{idx:03d}_{conf:.2f}.jpg"
-            crop_path = class_dir / crop_filename
-            
+            crop_path = class_dir / f"{snapshot_path.stem}_{idx:03d}_{conf:.2f}.jpg"
+            info = {
+                "crop_path": crop_path,
+                "snapshot_path": snapshot_path,
+                "class_name": class_name,
+                "class_id": cls_id,
+                "confidence": conf,
+                "bbox": [float(x1), float(y1), float(x2), float(y2)]
+            }
+            # Dilim kopyalanmaz (view); encode thread'inde doğrudan kullanılır
+            fut = self._encode_pool.submit(self._encode, full[y1:y2, x1:x2], crop_path,
+                                           f"{cls_id} {conf:.6f} {x1} {y1} {x2} {y2}\n", info)
+            self._pending.append((info, fut))
+        
+        if self.upload_to_s3 and self.pack_mode == "snapshot" and len(self._pending) > first:
+            # Yükleme thread'i bu snapshot'ın encode'larını bekler; detection beklemeden devam eder
+            self._uploads.append(self._upload_pool.submit(
+                self._upload_pack, snapshot_path.stem, self._pending[first:]))
+        if on_done is not None:
+            self._notify_when_done(self._pending[first:], on_done)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Encode'ları ve yüklemeleri bekle; başarıyla yazılan crop'ları gönderim sırasıyla döndür"""
+        if self.upload_to_s3 and self.pack_mode == "hour" and self._pending:
+            self._uploads.append(self._upload_pool.submit(self._upload_pack, "crops", list(self._pending)))
+        crops = []
+        for info, fut in self._pending:
             try:
-                img = Image.open(snapshot_path)
-                img_width, img_height = img.size
-                x1 = max(0, int(x1))
-                y1 = max(0, int(y1))
-                x2 = min(img_width, int(x2))
-                y2 = min(img_height, int(y2))
-                
-                if x2 <= x1 or y2 <= y1:
-                    print(f"⚠️  Geçersiz bounding box: ({x1},{y1},{x2},{y2})")
-                    continue
-                    
-                crop_img = img.crop((x1, y1, x2, y2))
-                crop_img.save(crop_path, quality=95)
-                
-                if upload_to_s3:
-                    temp_parts = list(crop_path.parts)
-                    crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
-                    s3_key = "/".join(temp_parts[crops_idx:])
-                    upload_file_to_blob(crop_path, s3_key, content_type="image/jpeg")
-                
-                txt_path = crop_path.with_suffix(".txt")
-                with open(txt_path, "w") as f:
-                    f.write(f"{cls_id} {conf:.6f} {x1} {y1} {x2} {y2}\n")
-                
-                all_crops.append({
-                    "crop_path": crop_path,
-                    "snapshot_path": snapshot_path,
-                    "class_name": class_name,
-                    "class_id": cls_id,
-                    "confidence": conf,
-                    "bbox": [float(x1), float(y1), float(x2), float(y2)]
-                })
+                fut.result()
+                crops.append(info)
             except Exception as e:
-                print(f"⚠️  Crop işleme hatası ({snapshot_path.name}, {idx}): {e}")
-                continue
+                print(f"⚠️  Crop işleme hatası ({info['crop_path'].name}): {e}")
+        self._encode_pool.shutdown(wait=True)
+        self._upload_pool.shutdown(wait=True)
+        failed = sum(1 for fut in self._uploads if fut.exception() is not None or fut.result() is None)
+        if failed:
+            unit = "crop" if self.pack_mode == "off" else "crop paketi"
+            print(f"⚠️  {failed}/{len(self._uploads)} {unit} S3'e yüklenemedi")
+        return crops
+
+def _detection_inputs(batch, rois: List[Optional[RegionOfInterest]]):
+    """
+    Batch'teki her snapshot için dedektöre gidecek diziler: ROI tanımlı hedefte ROI karoları,
+    değilse tüm kare. (snapshot indeksi, x ofset, y ofset) eşlemesiyle döner.
+    """
+    images, owners = [], []
+    pixels = full_pixels = 0
+    for i, ((snapshot_path, reduced), roi) in enumerate(zip(batch, rois)):
+        w, h = reduced.size
+        full_pixels += w * h
+        tiles = roi.tiles(w, h) if roi else [(0, 0, w, h)]
+        for x1, y1, x2, y2 in tiles:
+            images.append(reduced.array if (x1, y1, x2, y2) == (0, 0, w, h)
+                          else np.ascontiguousarray(reduced.array[y1:y2, x1:x2]))
+            owners.append((i, x1, y1))
+            pixels += (x2 - x1) * (y2 - y1)
+    return images, owners, pixels, full_pixels
+
+class SnapshotDetector:
+    """
+    Batch detection. INFERENCE_SIDECAR açıksa sıcak inference servisinde yapılır; servis
+    erişilemezse model lokal olarak (ilk ihtiyaçta) yüklenir. ROI verilen snapshot'larda sadece
+    ROI karoları işlenir ve ROI dışında kalan kutular atılır.
+    """
+
+    def __init__(self, model_path: Path = MODEL_PATH, calibration_sources: List[Path] = None):
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model dosyası bulunamadı: {model_path}")
+        self.model_path = model_path
+        self.calibration_sources = calibration_sources
+        self.sidecar = get_sidecar_client() if sidecar_enabled() else None
+        self._model = None
+        self.detected = 0
+        self.detect_seconds = 0.0
+        self.roi_pixels = self.roi_full_pixels = self.roi_dropped = 0
+
+    def _local_model(self, batch_paths: List[Path]):
+        if self._model is None:
+            _ensure_yolo()
+            print(f"[i] Model yükleniyor: {self.model_path} (backend={DETECT_BACKEND}{', INT8' if DETECT_INT8 else ''})")
+            backend = BackendSettings(backend=DETECT_BACKEND, int8=DETECT_INT8, imgsz=DETECT_IMGSZ,
+                                      calibration_dir=INT8_CALIBRATION_DIR)
+            self._model = load_detector(str(self.model_path), backend,
+                                        calibration_sources=self.calibration_sources or batch_paths)
+        return self._model
+
+    def detect(self, batch, rois: List[Optional[RegionOfInterest]]):
+        """
+        batch: [(snapshot_path, ReducedImage)], rois: batch ile hizalı ROI (veya None).
+        Returns: (snapshot başına [(x1, y1, x2, y2, conf, cls)] küçültülmüş koordinatlarda, sınıf adları)
+        """
+        images, owners, pixels, full_pixels = _detection_inputs(batch, rois)
+        self.roi_pixels += pixels
+        self.roi_full_pixels += full_pixels
+        t0 = time.perf_counter()
+        try:
+            remote = self.sidecar.detect(images, str(self.model_path), imgsz=DETECT_IMGSZ) if self.sidecar else None
+            if remote is not None:
+                image_detections, names = remote
+            else:
+                results = self._local_model([p for p, _ in batch]).predict(
+                    [np.ascontiguousarray(img[..., ::-1]) for img in images], imgsz=DETECT_IMGSZ, verbose=False)
+                names = results[0].names if results else {}
+                image_detections = [_result_detections(result) for result in results]
+        finally:
+            self.detect_seconds += time.perf_counter() - t0
+        self.detected += len(batch)
+        
+        # Karo kutularını snapshot (küçültülmüş) koordinatlarına taşı, ROI dışındakileri at
+        batch_detections = [[] for _ in batch]
+        for (i, ox, oy), detections in zip(owners, image_detections):
+            batch_detections[i].extend((x1 + ox, y1 + oy, x2 + ox, y2 + oy, conf, cls_id)
+                                       for x1, y1, x2, y2, conf, cls_id in detections)
+        for i, ((snapshot_path, reduced), roi) in enumerate(zip(batch, rois)):
+            if roi is not None:
+                kept = roi.filter_boxes(batch_detections[i], *reduced.size)
+                self.roi_dropped += len(batch_detections[i]) - len(kept)
+                batch_detections[i] = kept
+        return batch_detections, names
+
+    def report(self, elapsed: float, batch_size: int) -> None:
+        if self.detected:
+            print(f"[i] Throughput: {self.detected} snapshot / {elapsed:.1f} sn = {self.detected / elapsed:.2f} snapshot/sn "
+                  f"(batch={batch_size}, detection {self.detect_seconds:.1f} sn, CPU={os.cpu_count()})")
+        if self.roi_full_pixels and self.roi_pixels < self.roi_full_pixels:
+            print(f"[i] ROI: dedektöre giden piksel %{100.0 * self.roi_pixels / self.roi_full_pixels:.0f}, "
+                  f"ROI dışında atılan kutu: {self.roi_dropped}")
+
+_DCT_MATRIX = None
+
+def perceptual_hash(rgb: np.ndarray) -> int:
+    """64 bit pHash: 32x32 gri görüntünün DCT'sinin sol üst 8x8 katsayıları medyana göre"""
+    global _DCT_MATRIX
+    if _DCT_MATRIX is None:
+        n = np.arange(32)
+        _DCT_MATRIX = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64.0).astype(np.float32)
+    gray = np.asarray(Image.fromarray(rgb).convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    coeffs = (_DCT_MATRIX @ gray @ _DCT_MATRIX.T)[:8, :8].ravel()
+    bits = coeffs[1:] > np.median(coeffs[1:])  # DC terimi parlaklık; karşılaştırmaya katılmaz
+    return int(sum(1 << i for i, b in enumerate(bits) if b))
+
+class DuplicateIndex:
+    """
+    Akış halinde tekrar bastırma (kamera-saat başına bir tane): aynı sınıftan, görüş alanı örtüşen
+    bir komşu hedefin snapshot'ından ve gruptaki o komşu crop'a pHash mesafesi max_distance'a kadar
+    olan crop o gruba girer. Komşu tanımlanmamış hedeflerin crop'ları hiç gruplanmaz; bir grupta
+    aynı hedeften iki crop olmaz (aynı görüntüdeki benzer paketler ayrı kasalardır). Grubun en
+    güvenli crop'u temsilcidir; temsilci collage'a girene kadar grup açıktır, daha güvenli bir
+    tekrar gelirse temsilcinin yerini alır. Collage'a girmiş grubun yeni üyeleri kararı kopyalar.
+    """
+
+    def __init__(self, neighbors: Dict[str, Set[str]], max_distance: int = CROP_DEDUP_MAX_DISTANCE):
+        self.neighbors = neighbors
+        self.max_distance = max_distance
+        self._groups: List[Dict[str, Any]] = []           # {"rep", "infos", "targets", "open"}
+        self._by_rep: Dict[Path, Dict[str, Any]] = {}     # temsilci crop_path -> grup
+
+    @staticmethod
+    def _target(info: Dict[str, Any]) -> str:
+        return snapshot_target_name(info["snapshot_path"].stem)
+
+    def add(self, info: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Crop'u indeksle. ("new", None): yeni temsilci; ("member", None): tekrar;
+        ("replace", önceki temsilci): crop grubun yeni temsilcisi, önceki temsilci üye oldu.
+        """
+        target = self._target(info)
+        neighbors = self.neighbors.get(target, set())
+        group = None
+        if info.get("phash") is not None and neighbors:
+            best_distance = self.max_distance + 1
+            for candidate in self._groups:
+                if (candidate["rep"]["class_name"] != info["class_name"]
+                        or target in candidate["targets"]
+                        or not neighbors & candidate["targets"]):
+                    continue
+                distance = min(bin(other["phash"] ^ info["phash"]).count("1")
+                               for other in candidate["infos"] if self._target(other) in neighbors)
+                if distance < best_distance:
+                    group, best_distance = candidate, distance
+        if group is None:
+            group = {"rep": info, "infos": [info], "targets": {target}, "open": True}
+            if info.get("phash") is not None and neighbors:
+                self._groups.append(group)
+            self._by_rep[info["crop_path"]] = group
+            return "new", None
+        group["infos"].append(info)
+        group["targets"].add(target)
+        previous = group["rep"]
+        if group["open"] and info["confidence"] > previous["confidence"]:
+            group["rep"] = info
+            del self._by_rep[previous["crop_path"]]
+            self._by_rep[info["crop_path"]] = group
+            return "replace", previous
+        return "member", None
+
+    def close(self, crop_path: Path) -> None:
+        """Temsilci collage'a girdi; grubun temsilcisi artık değişmez"""
+        group = self._by_rep.get(crop_path)
+        if group is not None:
+            group["open"] = False
+
+    @property
+    def members(self) -> Dict[Path, List[Dict[str, Any]]]:
+        """Temsilci crop_path -> diğer üyeler (gruba giriş sırasıyla)"""
+        return {g["rep"]["crop_path"]: [i for i in g["infos"] if i is not g["rep"]]
+                for g in self._groups if len(g["infos"]) > 1}
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(len(g["infos"]) - 1 for g in self._groups)
+
+# ------- Crop triage -------
+@dataclass
+class TriageRule:
+    min_side: int = 24            # Crop'un kısa kenarı (tam çözünürlük piksel)
+    min_sharpness: float = 0.0    # Laplacian varyansı (0 = kontrol yok)
+    min_confidence: float = 0.0   # YOLO güveni
+    nms_iou: float = 0.7          # Aynı snapshot'ta daha güvenli bir kutuyla bu IoU'yu geçen kutu atılır
+
+def load_triage_rules() -> Tuple[TriageRule, Dict[str, TriageRule]]:
+    """cameras.yaml > crop_triage: default kuralı ve sınıf bazında (classes.<sınıf>) ezmeler"""
+    raw = {}
+    if CAMERAS_YAML.exists():
+        with open(CAMERAS_YAML, "r", encoding="utf-8") as f:
+            raw = (yaml.safe_load(f) or {}).get("crop_triage") or {}
+    fields = TriageRule.__dataclass_fields__
+    default_values = {k: v for k, v in (raw.get("default") or {}).items() if k in fields}
+    default = TriageRule(**default_values)
+    per_class = {}
+    for class_name, values in (raw.get("classes") or {}).items():
+        merged = dict(default_values)
+        merged.update({k: v for k, v in (values or {}).items() if k in fields})
+        per_class[str(class_name)] = TriageRule(**merged)
+    return default, per_class
+
+def _box_iou(a: List[float], b: List[float]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def triage_crops(crop_data: List[Dict[str, Any]], default: TriageRule,
+                 per_class: Dict[str, TriageRule]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Collage'a girecek crop'ları seç: boyut / keskinlik / güven kuralları, ardından snapshot
+    içinde güvene göre açgözlü IoU bastırma (sınıftan bağımsız; aynı ürün iki sınıfla da
+    tespit edilebiliyor). Atılanlar "reason" ile döner.
+    """
+    kept, dropped = [], []
+    survivors: Dict[Path, List[Dict[str, Any]]] = {}
+    for info in crop_data:
+        rule = per_class.get(info["class_name"], default)
+        x1, y1, x2, y2 = info["bbox"]
+        side = min(x2 - x1, y2 - y1)
+        sharpness = info.get("sharpness")
+        if side < rule.min_side:
+            reason = f"küçük ({side:.0f}px < {rule.min_side})"
+        elif info["confidence"] < rule.min_confidence:
+            reason = f"düşük güven ({info['confidence']:.2f} < {rule.min_confidence})"
+        elif sharpness is not None and sharpness < rule.min_sharpness:
+            reason = f"bulanık (laplacian {sharpness:.0f} < {rule.min_sharpness})"
+        else:
+            survivors.setdefault(info["snapshot_path"], []).append(info)
+            continue
+        dropped.append(dict(info, reason=reason))
     
-    print(f"[✓] Toplam {len(all_crops)} crop oluşturuldu")
-    return all_crops
+    for infos in survivors.values():
+        selected: List[Dict[str, Any]] = []
+        for info in sorted(infos, key=lambda i: -i["confidence"]):
+            rule = per_class.get(info["class_name"], default)
+            best = max(selected, key=lambda k: _box_iou(info["bbox"], k["bbox"]), default=None)
+            iou = _box_iou(info["bbox"], best["bbox"]) if best else 0.0
+            if best is not None and iou >= rule.nms_iou:
+                dropped.append(dict(info, reason=f"çakışma (IoU {iou:.2f}, {best['crop_path'].name})"))
+            else:
+                selected.append(info)
+        kept.extend(selected)
+    # Collage sırası crop sırasını izlesin
+    order = {id(info): i for i, info in enumerate(crop_data)}
+    kept.sort(key=lambda info: order[id(info)])
+    return kept, dropped
 
-def chunked(seq, n: int):
-    for i in range(0, len(seq), n):
-        yield seq[i:i+n]
+def log_triage(dropped: List[Dict[str, Any]], total: int, out_path: Optional[Path] = None) -> None:
+    """Atılan crop'ları nedenleriyle yazdır (ve istenirse JSON olarak kaydet)"""
+    for info in dropped:
+        print(f"    [TRIAGE] {info['crop_path'].name} atıldı: {info['reason']}")
+    by_reason: Dict[str, int] = {}
+    for info in dropped:
+        key = info["reason"].split(" (")[0]
+        by_reason[key] = by_reason.get(key, 0) + 1
+    print(f"[i] Triage: {total - len(dropped)}/{total} crop collage'a gidiyor"
+          + (f" (atılan: {', '.join(f'{k}={v}' for k, v in by_reason.items())})" if by_reason else ""))
+    if out_path is not None:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump([{
+                "crop": info["crop_path"].name,
+                "snapshot": info["snapshot_path"].name,
+                "class_name": info["class_name"],
+                "confidence": round(float(info["confidence"]), 4),
+                "bbox": info["bbox"],
+                "sharpness": round(info["sharpness"], 1) if info.get("sharpness") is not None else None,
+                "reason": info["reason"],
+            } for info in dropped], f, ensure_ascii=False, indent=2)
 
 try:
     RESAMPLE = Image.Resampling.LANCZOS
@@ -408,57 +915,247 @@ def _text_size(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont):
     except Exception:
         return (len(text)*8, FONT_SIZE)
 
-def draw_caption_bar(draw, xy, text, font):
-    x1,y1,x2,y2 = xy
-    draw.rectangle([x1,y1,x2,y2], fill=(0,0,0))
-    tw, th = _text_size(draw, text, font)
-    tx = x1 + (x2-x1-tw)//2
-    ty = y1 + (y2-y1-th)//2
-    draw.text((tx,ty), text, fill=(255,255,255), font=font)
+def llm_image_scale(image_size: Tuple[int, int]) -> float:
+    """Modelin görseli küçültme oranı (high detail: 2048'e sığdır, sonra kısa kenar en fazla 768)"""
+    w, h = image_size
+    scale = min(1.0, 2048.0 / max(w, h))
+    return scale * min(1.0, 768.0 / (min(w, h) * scale))
+
+def llm_image_tokens(image_size: Tuple[int, int]) -> int:
+    """Görselin token maliyeti: küçültülmüş boyuttaki 512'lik karo başına 170 + 85"""
+    scale = llm_image_scale(image_size)
+    w, h = image_size[0] * scale, image_size[1] * scale
+    return 85 + 170 * int(np.ceil(w / 512.0)) * int(np.ceil(h / 512.0))
 
-def make_collage(batch: List['Rec'], out_dir: Path, index: int, upload_to_s3: bool = True) -> Tuple[Path, Optional[str]]:
-    """Collage oluştur ve S3'e yükle."""
+@dataclass
+class CollageLayout:
+    """Collage tuvali ve batch sırasıyla her crop'un görüntü alanı (altında CAPTION_H numara şeridi)"""
+    size: Tuple[int, int]
+    slots: List[Tuple[int, int, int, int]]  # (x, y, genişlik, yükseklik)
+    upscale: bool = False                   # küçük crop'lar karoya büyütülür (adaptive)
+
+def grid_layout(count: int) -> CollageLayout:
+    """Sabit GRID_COLS x GRID_ROWS yerleşim (TILE_SIZE karolar, crop ortalanır)"""
     W = GRID_COLS * (TILE_SIZE[0] + 2*PADDING)
     H = GRID_ROWS * (TILE_SIZE[1] + CAPTION_H + 2*PADDING)
-    canvas = Image.new("RGB", (W,H), (30,30,30))
-    draw = ImageDraw.Draw(canvas)
-    font = load_font()
-
-    for i, rec in enumerate(batch):
+    slots = []
+    for i in range(min(count, GRID_COLS * GRID_ROWS)):
         r = i // GRID_COLS
         c = i % GRID_COLS
-        x0 = c * (TILE_SIZE[0] + 2*PADDING) + PADDING
-        y0 = r * (TILE_SIZE[1] + CAPTION_H + 2*PADDING) + PADDING
+        slots.append((c * (TILE_SIZE[0] + 2*PADDING) + PADDING,
+                      r * (TILE_SIZE[1] + CAPTION_H + 2*PADDING) + PADDING,
+                      TILE_SIZE[0], TILE_SIZE[1]))
+    return CollageLayout((W, H), slots)
+
+def collage_canvas_size(image_tokens: int) -> Tuple[int, int]:
+    """
+    Token bütçesine sığan en büyük tuval. Kısa kenar 768'i, uzun kenar 2048'i geçmez; böylece model
+    görseli küçültmez ve collage'daki piksel modelin gördüğü pikseldir (768 yükseklik = 2 karo sırası).
+    """
+    tiles = max(1, (image_tokens - 85) // 170)
+    if tiles < 2:
+        return (512, 512)
+    return (512 * min(4, tiles // 2), 768)
+
+def collage_tile_size(crop_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Adaptive karo: kenar sqrt(piksel sayısı) [COLLAGE_MIN_TILE, COLLAGE_MAX_TILE] aralığına, oran 1:3-3:1'e sıkıştırılır"""
+    w, h = max(1, crop_size[0]), max(1, crop_size[1])
+    side = min(max(float(np.sqrt(w * h)), COLLAGE_MIN_TILE), COLLAGE_MAX_TILE)
+    aspect = min(max(w / float(h), 1 / 3.0), 3.0)
+    return max(1, int(round(side * np.sqrt(aspect)))), max(1, int(round(side / np.sqrt(aspect))))
+
+def _pack_shelves(tiles: List[Tuple[int, int]], canvas: Tuple[int, int]) -> Optional[Tuple[List[int], CollageLayout]]:
+    """
+    Raf (shelf) yerleşimi, yüksekliğe göre azalan sıra (FFDH). Sığmazsa None; sığarsa okuma
+    sırası (raf, soldan sağa) ve o sıradaki slotlar. Tuval kullanılan alana kırpılır.
+    """
+    W, H = canvas
+    order = sorted(range(len(tiles)), key=lambda i: -tiles[i][1])
+    shelves: List[List[int]] = []  # [y, yükseklik, dolu genişlik]
+    placed: List[Tuple[int, int, int, int]] = []  # (raf, x, y, crop indeksi)
+    used_h = 0
+    for i in order:
+        sw, sh = tiles[i][0] + 2*PADDING, tiles[i][1] + CAPTION_H + 2*PADDING
+        for n, shelf in enumerate(shelves):
+            if shelf[2] + sw <= W and sh <= shelf[1]:
+                placed.append((n, shelf[2], shelf[0], i))
+                shelf[2] += sw
+                break
+        else:
+            if sw > W or used_h + sh > H:
+                return None
+            shelves.append([used_h, sh, sw])
+            placed.append((len(shelves) - 1, 0, used_h, i))
+            used_h += sh
+    placed.sort()
+    slots = [(x + PADDING, y + PADDING, tiles[i][0], tiles[i][1]) for _, x, y, i in placed]
+    width = max(shelf[2] for shelf in shelves) if shelves else W
+    return [i for _, _, _, i in placed], CollageLayout((width, used_h), slots, upscale=True)
+
+class CollagePacker:
+    """
+    Bekleyen crop'lardan bir sonraki collage'ı seçer. grid: ilk BATCH_SIZE crop, sabit yerleşim.
+    adaptive: tuvale (COLLAGE_IMAGE_TOKENS) sığan en uzun ön ek, en fazla COLLAGE_MAX_ITEMS;
+    crop'lar okuma sırasına dizilir, numaralar bu sıradadır.
+    """
+
+    def __init__(self, mode: str = COLLAGE_MODE, image_tokens: int = COLLAGE_IMAGE_TOKENS,
+                 max_items: int = COLLAGE_MAX_ITEMS):
+        if mode not in ("grid", "adaptive"):
+            print(f"[UYARI] Bilinmeyen COLLAGE_MODE: {mode}, grid kullanılıyor")
+            mode = "grid"
+        self.mode = mode
+        self.canvas = collage_canvas_size(image_tokens)
+        self.capacity = BATCH_SIZE if mode == "grid" else max(1, max_items)
+
+    @staticmethod
+    def _tile(rec: Rec) -> Tuple[int, int]:
+        if rec.size is None:
+            try:
+                with Image.open(rec.path) as im:
+                    rec.size = im.size  # sadece başlık okunur
+            except Exception:
+                rec.size = (COLLAGE_MIN_TILE, COLLAGE_MIN_TILE)
+        return collage_tile_size(rec.size)
+
+    def take(self, recs: List[Rec]) -> Tuple[List[Rec], CollageLayout]:
+        """recs'in başından bir collage'lık crop (collage sırasıyla) ve yerleşimi; len(sonuç) tüketilen ön ektir"""
+        if self.mode == "grid":
+            batch = recs[:BATCH_SIZE]
+            return batch, grid_layout(len(batch))
+        tiles = [self._tile(rec) for rec in recs[:self.capacity]]
+        packed = _pack_shelves(tiles, self.canvas)
+        if packed is None:
+            lo, hi = 1, len(tiles) - 1  # en uzun sığan ön ek (ikili arama)
+            packed = _pack_shelves(tiles[:1], self.canvas)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                attempt = _pack_shelves(tiles[:mid], self.canvas)
+                if attempt is None:
+                    hi = mid - 1
+                else:
+                    lo, packed = mid, attempt
+            if packed is None:  # tek crop bile sığmıyor (COLLAGE_MAX_TILE bütçeye göre büyük): tuval genişletilir
+                w, h = tiles[0]
+                packed = _pack_shelves(tiles[:1], (max(self.canvas[0], w + 2*PADDING),
+                                                   max(self.canvas[1], h + CAPTION_H + 2*PADDING)))
+        order, layout = packed
+        return [recs[i] for i in order], layout
+
+    def is_full(self, pending: List[Rec]) -> bool:
+        """Bekleyenlerden bir collage dolduysa (bir sonraki crop sığmıyor ya da kapasite doldu) True"""
+        if len(pending) >= self.capacity:
+            return True
+        return len(self.take(pending)[0]) < len(pending)
+
+@dataclass
+class Collage:
+    """Bir kez encode edilmiş collage: aynı JPEG baytları S3'e, LLM'e (base64) ve lokal kopyaya gider"""
+    path: Path
+    s3_path: Optional[str]
+    data: bytes
+    size: Tuple[int, int]
+
+class CollageRenderer:
+    """
+    Collage'ı NumPy tuvalinde birleştirir (karo ve numara şeridi dizi dilimleriyle) ve tek sefer
+    JPEG'e encode eder. Font ve numara etiketleri (siyah zemin üzerine beyaz, CAPTION_H yükseklik)
+    önbelleklenir; crop'lar karo boyutuna yakın ölçekte decode edilir (PIL draft).
+    """
+
+    def __init__(self):
+        self.font = load_font()
+        self._labels: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _label(self, text: str) -> np.ndarray:
+        """Numara etiketi: (CAPTION_H, metin genişliği) gri ton dizi, metin dikeyde ortalı"""
+        with self._lock:
+            label = self._labels.get(text)
+            if label is None:
+                probe = ImageDraw.Draw(Image.new("L", (1, 1)))
+                tw, th = _text_size(probe, text, self.font)
+                img = Image.new("L", (max(1, tw + 4), CAPTION_H), 0)
+                ImageDraw.Draw(img).text((0, (CAPTION_H - th) // 2), text, fill=255, font=self.font)
+                label = self._labels[text] = np.asarray(img)
+            return label
+
+    @staticmethod
+    def _tile_image(path: Path, tw: int, th: int, upscale: bool) -> np.ndarray:
+        """Crop'u karoya sığdır (oran korunur; upscale=False ise büyütülmez)"""
         try:
-            im = Image.open(rec.path).convert("RGB")
+            with Image.open(path) as im:
+                w, h = im.size
+                r = min(tw / float(w), th / float(h))
+                if not upscale:
+                    r = min(1.0, r)
+                size = (max(1, min(tw, round(w * r))), max(1, min(th, round(h * r))))
+                im.draft("RGB", size)  # JPEG: DCT ölçeğinde, hedefin altına inmeden decode
+                im = im.convert("RGB")
+                if im.size != size:
+                    im = im.resize(size, RESAMPLE)
+                return np.asarray(im)
         except Exception as e:
-            print(f"⚠️  Collage görüntü yüklenemedi: {rec.path} - {e}")
-            im = Image.new("RGB", TILE_SIZE, (80,80,80))
-        im = im.copy()
-        im.thumbnail(TILE_SIZE, RESAMPLE)
-        tile = Image.new("RGB", TILE_SIZE, (20,20,20))
-        ox = (TILE_SIZE[0]-im.size[0])//2
-        oy = (TILE_SIZE[1]-im.size[1])//2
-        tile.paste(im, (ox,oy))
-        canvas.paste(tile, (x0,y0))
-
-        num = str(i+1)
-        cap_y1 = y0 + TILE_SIZE[1]
-        cap_y2 = cap_y1 + CAPTION_H
-        draw_caption_bar(draw, (x0,cap_y1,x0+TILE_SIZE[0],cap_y2), num, font)
+            print(f"⚠️  Collage görüntü yüklenemedi: {path} - {e}")
+            return np.full((th, tw, 3), 80, dtype=np.uint8)
+
+    def render(self, batch: List['Rec'], layout: CollageLayout) -> Tuple[bytes, List[Dict[str, Any]]]:
+        """Collage JPEG baytları ve numara → crop konum haritası"""
+        W, H = layout.size
+        canvas = np.full((H, W, 3), 30, dtype=np.uint8)
+        positions = []
+        for i, (rec, (x0, y0, tw, th)) in enumerate(zip(batch, layout.slots)):
+            tile = self._tile_image(rec.path, tw, th, layout.upscale)
+            ih, iw = tile.shape[:2]
+            ox, oy = (tw - iw) // 2, (th - ih) // 2
+            canvas[y0:y0+th, x0:x0+tw] = 20
+            canvas[y0+oy:y0+oy+ih, x0+ox:x0+ox+iw] = tile
+
+            label = self._label(str(i + 1))
+            strip = canvas[y0+th:y0+th+CAPTION_H, x0:x0+tw]
+            strip[:] = 0
+            lw = min(label.shape[1], tw)
+            lx = max(0, (tw - label.shape[1]) // 2)
+            strip[:, lx:lx+lw] = label[:strip.shape[0], :lw, None]
+            positions.append({"id": i + 1, "crop_id": rec.id, "urun": rec.urun,
+                              "box": [x0 + ox, y0 + oy, x0 + ox + iw, y0 + oy + ih]})
+
+        buf = BytesIO()
+        Image.fromarray(canvas).save(buf, format="JPEG", quality=88, optimize=True)  # tek encode; küçük payload 3 yere gider
+        return buf.getvalue(), positions
+
+_collage_renderer: Optional[CollageRenderer] = None
+_collage_renderer_lock = threading.Lock()
+
+def _get_collage_renderer() -> CollageRenderer:
+    global _collage_renderer
+    with _collage_renderer_lock:
+        if _collage_renderer is None:
+            _collage_renderer = CollageRenderer()
+        return _collage_renderer
+
+def make_collage(batch: List['Rec'], out_dir: Path, index: int, upload_to_s3: bool = True,
+                 layout: Optional[CollageLayout] = None) -> Collage:
+    """
+    Collage oluştur ve S3'e yükle. layout verilmezse sabit grid. JPEG bir kez encode edilir;
+    lokal kopya ve S3 aynı baytlardır. Yanına numara → crop konum haritası (collage_XXX.map.json) yazılır.
+    """
+    layout = layout or grid_layout(len(batch))
+    data, positions = _get_collage_renderer().render(batch, layout)
 
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"collage_{index:03d}.jpg"
-    canvas.save(out_path, quality=88, optimize=True)
+    out_path.write_bytes(data)
+    position_map = json.dumps({"size": list(layout.size), "items": positions}, ensure_ascii=False, indent=2)
+    map_path = out_path.with_suffix(".map.json")
+    map_path.write_text(position_map, encoding="utf-8")
     
     s3_path = None
     if upload_to_s3:
-        temp_parts = list(out_path.parts)
-        crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
-        s3_key = "/".join(temp_parts[crops_idx:])
-        s3_path = upload_file_to_blob(out_path, s3_key, content_type="image/jpeg")
+        s3_path = upload_bytes_to_blob(data, crops_s3_key(out_path), "image/jpeg", out_path.name)
+        upload_bytes_to_blob(position_map.encode("utf-8"), crops_s3_key(map_path), "application/json", map_path.name)
     
-    return out_path, s3_path
+    return Collage(out_path, s3_path, data, layout.size)
 
 def guess_mime(path: Path) -> str:
     mt, _ = mimetypes.guess_type(str(path))
@@ -485,7 +1182,119 @@ def prompt_rotten_only(batch_size: int, min_conf: float, num_to_class: Dict[int,
     )
 
 def _ensure_openai_client():
-    return AzureOpenAI(api_key=AZURE_API_KEY, api_version="2024-06-01", azure_endpoint=AZURE_ENDPOINT)
+    # Yeniden denemeler (429 / 5xx / bağlantı) _call_with_rate_limit'te, tüm thread'ler ortak limiter ile
+    return AzureOpenAI(api_key=AZURE_API_KEY, api_version="2024-06-01", azure_endpoint=AZURE_ENDPOINT,
+                       max_retries=0)
+
+class TokenBucket:
+    """Dakikalık kota için token bucket (kapasite = dakikalık limit, saniyede limit/60 dolar)"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)  # kotadan büyük tek istek dolu kovayla geçer
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+class AzureRateLimiter:
+    """İstek/dakika ve token/dakika kovaları + 429 sonrası tüm isteklerin ortak beklemesi"""
+
+    def __init__(self, rpm: int = AZURE_RPM_LIMIT, tpm: int = AZURE_TPM_LIMIT):
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                    if bucket is not None:
+                        wait = max(wait, bucket.wait_time(amount, now))
+                if wait <= 0:
+                    for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                        if bucket is not None:
+                            bucket.take(amount)
+                    return
+            time.sleep(min(wait, 5.0))
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+_llm_limiter: Optional[AzureRateLimiter] = None
+_llm_limiter_lock = threading.Lock()
+
+def _get_llm_limiter() -> AzureRateLimiter:
+    global _llm_limiter
+    with _llm_limiter_lock:
+        if _llm_limiter is None:
+            _llm_limiter = AzureRateLimiter()
+        return _llm_limiter
+
+def estimate_request_tokens(image_size: Tuple[int, int], text: str, max_tokens: int = LLM_MAX_TOKENS) -> int:
+    """
+    Kota hesabı için istek maliyeti: görsel (llm_image_tokens), metin (~3 karakter/token)
+    ve max_tokens (Azure kotadan düşer).
+    """
+    return llm_image_tokens(image_size) + len(SAFE_SYSTEM_MESSAGE + text) // 3 + max_tokens
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """429 yanıtındaki retry-after-ms / retry-after (saniye veya HTTP tarihi) başlığı"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except Exception:
+        return None
+
+def _call_with_rate_limit(call, tokens: int, label: str, limiter: Optional[AzureRateLimiter] = None):
+    """
+    Limiter'dan kota alıp çağır. 429'da Retry-After kadar tüm istekler durdurulur; 5xx ve
+    bağlantı hatalarında üstel bekleme. LLM_MAX_RETRIES sonrası hata yukarı fırlatılır.
+    """
+    limiter = limiter or _get_llm_limiter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        limiter.acquire(tokens)
+        try:
+            return call()
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            transient = (status == 429 or (status is not None and status >= 500)
+                         or type(e).__name__ in ("APIConnectionError", "APITimeoutError"))
+            if not transient or attempt >= LLM_MAX_RETRIES:
+                raise
+            delay = _retry_after_seconds(e) if status == 429 else None
+            if delay is None:
+                delay = min(60.0, 2.0 ** attempt)
+            print(f"⚠️  Azure {status or type(e).__name__} ({label}), {delay:.1f} sn sonra tekrar "
+                  f"({attempt + 1}/{LLM_MAX_RETRIES})")
+            if status == 429:
+                limiter.pause(delay)  # bir sonraki acquire bekler; diğer thread'ler de
+            else:
+                time.sleep(delay)
 
 SAFE_SYSTEM_MESSAGE = (
     "Evaluate produce freshness in retail photos. "
@@ -496,10 +1305,16 @@ SAFE_SYSTEM_MESSAGE = (
 
 def azure_classify_collage(client, deployment: str, collage_path: Path, batch_size: int,
                            num_to_class: Dict[int, str], min_conf: float, 
-                           batch_records: List = None) -> Dict[str, Any]:
-    """Azure OpenAI ile collage analizi."""
-    b64 = b64_image(collage_path)
+                           batch_records: List = None, collage: Optional[Collage] = None) -> Dict[str, Any]:
+    """Azure OpenAI ile collage analizi. collage verilirse bellekteki JPEG baytları kullanılır (dosya okunmaz)."""
     user_text = prompt_rotten_only(batch_size, min_conf, num_to_class)
+    if collage is not None:
+        b64 = base64.b64encode(collage.data).decode("utf-8")
+        tokens = estimate_request_tokens(collage.size, user_text)
+    else:
+        b64 = b64_image(collage_path)
+        with Image.open(collage_path) as im:
+            tokens = estimate_request_tokens(im.size, user_text)
     base_messages = [
         {"role": "system", "content": SAFE_SYSTEM_MESSAGE},
         {"role": "user", "content": [
@@ -509,13 +1324,13 @@ def azure_classify_collage(client, deployment: str, collage_path: Path, batch_si
     ]
 
     def _call(messages):
-        return client.chat.completions.create(
+        return _call_with_rate_limit(lambda: client.chat.completions.create(
             model=deployment,
             messages=messages,
             temperature=0.0,
-            max_tokens=1000,
+            max_tokens=LLM_MAX_TOKENS,
             response_format={"type": "json_object"},
-        )
+        ), tokens, collage_path.name)
 
     try:
         resp = _call(base_messages)
@@ -540,7 +1355,7 @@ def azure_classify_collage(client, deployment: str, collage_path: Path, batch_si
             err_file = collage_path.with_suffix(".llm_error.json")
             with open(err_file, "w", encoding="utf-8") as f:
                 json.dump(error_log, f, ensure_ascii=False, indent=2)
-            return {"rotten": [], "error": "llm_error", "skipped": True}
+            return {"rotten": [], "error": "llm_error", "skipped": True, "detail": str(e2)}
 
     try:
         j = json.loads(resp.choices[0].message.content)
@@ -548,44 +1363,19 @@ def azure_classify_collage(client, deployment: str, collage_path: Path, batch_si
     except Exception:
         return {"rotten": []}
 
-def gather_crops_for_hour(crops_dir: Path, magaza: str, date_name: str, hour_name: str, 
-                          crop_data: List[Dict[str, Any]], camera_id: str) -> List[Rec]:
-    """Crop klasöründeki tüm jpg dosyalarını Rec objesine dönüştürür."""
-    exts = (".jpg",".jpeg",".png",".bmp",".webp")
-    recs: List[Rec] = []
-    excluded_dirs = {"collages", ".git", "__pycache__"}
-    
-    crop_to_snapshot = {}
-    for crop_info in crop_data:
-        crop_path = crop_info.get("crop_path")
-        snapshot_path = crop_info.get("snapshot_path")
-        if crop_path and snapshot_path:
-            crop_to_snapshot[crop_path] = snapshot_path
-    
-    for class_dir in sorted([d for d in crops_dir.iterdir() 
-                             if d.is_dir() and d.name not in excluded_dirs]):
-        urun = class_dir.name
-        for p in sorted(class_dir.glob("*")):
-            if p.suffix.lower() in exts:
-                snapshot_path = crop_to_snapshot.get(p)
-                snapshot_blob_url = None
-                
-                if snapshot_path:
-                    snapshot_s3_key = get_snapshot_blob_path_from_local(
-                        snapshot_path, camera_id, date_name, hour_name
-                    )
-                    snapshot_blob_url = get_blob_url(snapshot_s3_key)
-                
-                recs.append(Rec(
-                    path=p, 
-                    id=p.stem, 
-                    urun=urun, 
-                    tarih=date_name,
-                    saat=hour_name.zfill(2) + ":00:00", 
-                    magaza=magaza,
-                    snapshot_blob_url=snapshot_blob_url
-                ))
-    return recs
+def rec_from_crop(info: Dict[str, Any], magaza: str, date_name: str, hour_name: str, camera_id: str) -> Rec:
+    """CropEngine çıktısını (crop dict) Rec'e çevir"""
+    snapshot_s3_key = get_snapshot_blob_path_from_local(info["snapshot_path"], camera_id, date_name, hour_name)
+    return Rec(
+        path=info["crop_path"],
+        id=info["crop_path"].stem,
+        urun=info["class_name"],
+        tarih=date_name,
+        saat=hour_name.zfill(2) + ":00:00",
+        magaza=magaza,
+        snapshot_blob_url=get_blob_url(snapshot_s3_key),
+        size=(int(info["bbox"][2] - info["bbox"][0]), int(info["bbox"][3] - info["bbox"][1]))
+    )
 
 def write_csv(path: Path, rows: List[Dict]):
     if not rows: 
@@ -610,10 +1400,592 @@ def write_summary(path: Path, rows: List[Dict]):
     with open(path, "w", encoding="utf-8") as f:
         f.write(f"Toplam: {total}\nÇürük : {rotten}\nSağlıklı: {fresh}\nÇürük Oranı: {rate:.2f}%\n")
 
+def crops_s3_key(local_path: Path) -> str:
+    """TEMP_DIR/crops/... lokal yolunu S3 anahtarına (crops/...) çevir"""
+    temp_parts = list(local_path.parts)
+    crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
+    return "/".join(temp_parts[crops_idx:])
+
+# ------- Batch sonuçları -------
+def base_row(rec: Rec) -> Dict[str, Any]:
+    """Rapor satırının karar dışındaki alanları"""
+    return {
+        "id": rec.id,
+        "urun": rec.urun,
+        "magaza": rec.magaza,
+        "tarih": rec.tarih,
+        "saat": rec.saat,
+        "dosya": rec.snapshot_blob_url or str(rec.path)
+    }
+
+def batch_result_rows(base_rows: List[Dict[str, Any]], member_rows: List[Tuple[int, Dict[str, Any]]],
+                      result: Dict[str, Any], min_conf: float) -> Tuple[List[Dict], List[Dict], Dict[int, float]]:
+    """
+    LLM sonucunu satırlara uygula.
+
+    Args:
+        base_rows: Collage sırasıyla temsilci satırları (base_row)
+        member_rows: (temsilcinin 1'den başlayan sırası, tekrar grubundaki üyenin base_row'u)
+
+    Returns:
+        (batch_items - .llm.json'a, duplicate_items - sadece report_all'a, rotten_pos)
+    """
+    rotten_pos: Dict[int, float] = {}
+    for x in result.get("rotten", []) if isinstance(result, dict) else []:
+        try:
+            idx = int(x.get("id"))
+            conf = float(x.get("guven", 0.0))
+            if 1 <= idx <= len(base_rows) and conf >= min_conf:
+                rotten_pos[idx] = conf
+        except Exception:
+            pass
+    
+    batch_items: List[Dict] = []
+    for i, base in enumerate(base_rows, start=1):
+        row = dict(base)
+        if i in rotten_pos:
+            row.update({"durum": "çürük", "guven": rotten_pos[i]})
+        else:
+            row.update({"durum": "sağlıklı"})
+        batch_items.append(row)
+    
+    # Tekrar grubundaki diğer crop'lar temsilcinin kararını alır
+    duplicate_items: List[Dict] = []
+    for pos, member in member_rows:
+        row = batch_items[pos - 1]
+        copy = dict(row, id=member["id"], urun=member["urun"], dosya=member["dosya"])
+        copy["kopya_of"] = row["id"]
+        duplicate_items.append(copy)
+    return batch_items, duplicate_items, rotten_pos
+
+def write_llm_dump(collage_path: str, collage_s3_path: Optional[str], num_to_class: Dict[int, str],
+                   result: Dict[str, Any], batch_items: List[Dict], out_llm: Path, s3_llm_key: str) -> None:
+    """Batch'in .llm.json çıktısını yaz ve S3'e yükle"""
+    llm_dump = {
+        "collage_path": collage_path,
+        "collage_blob_path": collage_s3_path,
+        "batch_size": len(batch_items),
+        "model_name": DEPLOYMENT,
+        "prompt_version": "rotten_only_v2_safe",
+        "latency_ms": None,
+        "num_to_class": num_to_class,
+        "min_conf_rotten": MIN_CONF_ROTTEN,
+        "raw_llm": result,
+        "items": batch_items
+    }
+    out_llm.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_llm, "w", encoding="utf-8") as f:
+        json.dump(llm_dump, f, ensure_ascii=False, indent=2)
+    upload_file_to_blob(out_llm, s3_llm_key, content_type="application/json")
+
+# ------- LLM yeniden deneme kuyruğu (S3) -------
+def enqueue_llm_retry(camera_id: str, date_name: str, hour_name: str, batch_no: int,
+                      collage_path: Path, collage_s3_path: Optional[str], num_to_class: Dict[int, str],
+                      base_rows: List[Dict], member_rows: List[Tuple[int, Dict]], error: str) -> Optional[str]:
+    """LLM'den sonuç alınamayan batch'i kuyruğa yaz; collage S3'te değilse önce yüklenir"""
+    if not collage_s3_path:
+        collage_s3_path = upload_file_to_blob(collage_path, crops_s3_key(collage_path))
+        if not collage_s3_path:
+            print(f"⚠️  Batch {batch_no} kuyruğa alınamadı: collage S3'e yüklenemedi")
+            return None
+    now = time.time()
+    entry = {
+        "version": 1,
+        "camera_id": camera_id,
+        "date": date_name,
+        "hour": hour_name,
+        "batch_no": batch_no,
+        "collage_path": str(collage_path),
+        "collage_blob_path": collage_s3_path,
+        "llm_json_key": crops_s3_key(collage_path.with_suffix(".llm.json")),
+        "report_prefix": crops_s3_key(collage_path.parent.parent),
+        "num_to_class": num_to_class,
+        "base_rows": base_rows,
+        "member_rows": member_rows,
+        "attempts": 1,
+        "first_failed_ts": now,
+        "next_attempt_ts": now + LLM_RETRY_BASE_MINUTES * 60.0,
+        "last_error": error,
+    }
+    key = f"{LLM_RETRY_PREFIX}{camera_id}/{date_name}/{hour_name}/{collage_path.stem}.json"
+    if upload_bytes_to_blob(json.dumps(entry, ensure_ascii=False).encode("utf-8"), key, "application/json"):
+        print(f"[i] Batch {batch_no} yeniden deneme kuyruğuna alındı: {key}")
+        return key
+    return None
+
+def _merge_into_hour_report(report_prefix: str, rows: List[Dict]) -> bool:
+    """
+    Geç gelen kararları saatin report_all.json/.csv ve summary.txt dosyalarına ekle.
+    Rapor sadece S3'te gerçekten yoksa (NoSuchKey) boş başlanır; başka bir okuma hatasında
+    (throttling, 5xx, yetki) mevcut kararların üzerine yazmamak için hiçbir şey yüklenmez ve False döner.
+    """
+    s3 = _ensure_s3_client()
+    if not s3:
+        return False
+    report_key = f"{report_prefix}/report_all.json"
+    items: List[Dict] = []
+    try:
+        items = json.loads(s3.get_object(Bucket=S3_BUCKET_NAME, Key=report_key)["Body"].read())
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            print(f"⚠️  Saat raporu okunamadı ({report_key}): {e}")
+            return False
+    except ValueError as e:
+        print(f"⚠️  Saat raporu bozuk ({report_key}): {e}")
+        return False
+    work_dir = TEMP_DIR / "llm_retry" / report_prefix
+    out_json = work_dir / "report_all.json"
+    known = {(r.get("id"), r.get("kopya_of")) for r in items}
+    items.extend(r for r in rows if (r.get("id"), r.get("kopya_of")) not in known)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_json, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    write_csv(work_dir / "report_all.csv", items)
+    write_summary(work_dir / "summary.txt", items)
+    uploaded = [
+        upload_file_to_blob(out_json, report_key, content_type="application/json"),
+        upload_file_to_blob(work_dir / "report_all.csv", f"{report_prefix}/report_all.csv", content_type="text/csv"),
+        upload_file_to_blob(work_dir / "summary.txt", f"{report_prefix}/summary.txt", content_type="text/plain"),
+    ]
+    return all(uploaded)
+
+_LLM_RETRY_FIELDS = ("camera_id", "date", "hour", "batch_no", "collage_path", "collage_blob_path", "llm_json_key",
+                     "report_prefix", "num_to_class", "base_rows", "member_rows", "attempts",
+                     "first_failed_ts", "next_attempt_ts")
+
+def _read_llm_retry_entry(local: Path) -> Dict[str, Any]:
+    """Kuyruk kaydını oku; bozuk JSON veya eksik/yanlış tipli alanlarda ValueError"""
+    with open(local, "r", encoding="utf-8") as f:
+        entry = json.load(f)
+    if not isinstance(entry, dict):
+        raise ValueError("kayıt bir JSON nesnesi değil")
+    missing = [k for k in _LLM_RETRY_FIELDS if k not in entry]
+    if missing:
+        raise ValueError(f"eksik alan: {', '.join(missing)}")
+    for k in ("first_failed_ts", "next_attempt_ts", "attempts"):
+        if isinstance(entry[k], bool) or not isinstance(entry[k], (int, float)):
+            raise ValueError(f"{k} sayı değil: {entry[k]!r}")
+    if not isinstance(entry["num_to_class"], dict) or not isinstance(entry["base_rows"], list) \
+            or not isinstance(entry["member_rows"], list):
+        raise ValueError("num_to_class/base_rows/member_rows biçimi hatalı")
+    return entry
+
+def _move_llm_retry_entry(local: Path, key: str, folder: str) -> None:
+    """Kaydı kuyruktan LLM_RETRY_PREFIX/<folder>/ altına taşı (sonraki çalıştırmalarda okunmaz)"""
+    if upload_file_to_blob(local, f"{LLM_RETRY_PREFIX}{folder}/{key[len(LLM_RETRY_PREFIX):]}",
+                           content_type="application/json"):
+        delete_blob(key)
+
+def _drain_llm_retry_entry(client, key: str, entry: Dict[str, Any], local: Path, work_dir: Path) -> Optional[str]:
+    """Tek kuyruk kaydını işle; sonucu drain istatistik anahtarı olarak döndür (None: sayılmaz)"""
+    now = time.time()
+    if now - entry["first_failed_ts"] > LLM_RETRY_MAX_AGE_HOURS * 3600.0:
+        print(f"⚠️  Kuyruk kaydı süresi doldu ({entry['attempts']} deneme): {key} - {entry.get('last_error')}")
+        _move_llm_retry_entry(local, key, "expired")
+        return "expired"
+    if now < entry["next_attempt_ts"]:
+        return "waiting"
+    
+    collage_local = work_dir / "collages" / Path(entry["collage_path"]).name
+    if not download_blob_to_path(entry["collage_blob_path"], collage_local):
+        return None
+    num_to_class = {int(k): v for k, v in entry["num_to_class"].items()}
+    base_rows = entry["base_rows"]
+    result = azure_classify_collage(client, DEPLOYMENT, collage_local, len(base_rows),
+                                    num_to_class, MIN_CONF_ROTTEN)
+    if result.get("skipped"):
+        entry["attempts"] += 1
+        delay_min = min(LLM_RETRY_BASE_MINUTES * (2 ** (entry["attempts"] - 1)), 12 * 60.0)
+        entry["next_attempt_ts"] = now + delay_min * 60.0
+        entry["last_error"] = result.get("detail") or result.get("error")
+        upload_bytes_to_blob(json.dumps(entry, ensure_ascii=False).encode("utf-8"), key, "application/json")
+        print(f"⚠️  {key}: {entry['attempts']}. deneme başarısız, {delay_min:.0f} dk sonra tekrar")
+        return "deferred"
+    
+    member_rows = [(int(pos), row) for pos, row in entry["member_rows"]]
+    batch_items, duplicate_items, rotten_pos = batch_result_rows(base_rows, member_rows, result, MIN_CONF_ROTTEN)
+    write_llm_dump(entry["collage_path"], entry["collage_blob_path"], num_to_class, result, batch_items,
+                   work_dir / entry["llm_json_key"], entry["llm_json_key"])
+    if not _merge_into_hour_report(entry["report_prefix"], batch_items + duplicate_items):
+        # Karar rapora işlenemedi; kayıt kuyrukta kalır, sonraki çalıştırmada tekrar denenir
+        print(f"⚠️  {key}: saat raporu güncellenemedi, kayıt kuyrukta bırakıldı")
+        return "deferred"
+    delete_blob(key)
+    print(f"[OK] Kuyruktan: {entry['camera_id']} {entry['date']}/{entry['hour']} batch {entry['batch_no']} "
+          f"(çürük={len(rotten_pos)}/{len(base_rows)}, {entry['attempts']} başarısız denemeden sonra)")
+    return "done"
+
+def drain_llm_retry_queue(client, camera_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    Kuyruktaki zamanı gelmiş batch'leri tekrar sınıflandır. Başarılıysa .llm.json yazılır, karar
+    saatin raporuna eklenir ve kayıt silinir; başarısızsa üstel bekleme ile ertelenir.
+    LLM_RETRY_MAX_AGE_HOURS'u aşan kayıtlar expired/, okunamayan (bozuk/eksik) kayıtlar bad/
+    altına taşınır; tek bir kaydın hatası kuyruğun geri kalanını ve analizi durdurmaz.
+    """
+    stats = {"done": 0, "deferred": 0, "expired": 0, "waiting": 0, "bad": 0, "failed": 0}
+    prefix = LLM_RETRY_PREFIX + (f"{camera_id}/" if camera_id else "")
+    keys = [k for k in list_blobs_in_path(prefix)
+            if k.endswith(".json") and not k.startswith((f"{LLM_RETRY_PREFIX}expired/", f"{LLM_RETRY_PREFIX}bad/"))]
+    if not keys:
+        return stats
+    print(f"[→] LLM yeniden deneme kuyruğu: {len(keys)} kayıt")
+    work_dir = TEMP_DIR / "llm_retry"
+    for key in keys:
+        local = work_dir / key
+        if not download_blob_to_path(key, local):
+            continue
+        try:
+            entry = _read_llm_retry_entry(local)
+        except ValueError as e:
+            print(f"⚠️  Kuyruk kaydı okunamadı, {LLM_RETRY_PREFIX}bad/ altına taşınıyor: {key} - {e}")
+            _move_llm_retry_entry(local, key, "bad")
+            stats["bad"] += 1
+            continue
+        try:
+            outcome = _drain_llm_retry_entry(client, key, entry, local, work_dir)
+        except Exception as e:
+            print(f"⚠️  Kuyruk kaydı işlenemedi, sonraki çalıştırmada tekrar denenecek: {key} - {e}")
+            outcome = "failed"
+        if outcome:
+            stats[outcome] += 1
+    print(f"[i] Kuyruk: {stats['done']} tamamlandı, {stats['deferred']} ertelendi, "
+          f"{stats['waiting']} beklemede, {stats['expired']} süresi doldu, {stats['bad']} bozuk, "
+          f"{stats['failed']} hatalı")
+    return stats
+
+# ------- Akış hattı -------
+class HourJob:
+    """Akış hattında bir kamera-saatin durumu (collage alanları sadece collage thread'inde değişir)"""
+
+    def __init__(self, cam_id: str, magaza: str, date_name: str, hour_name: str, s3_keys: List[str]):
+        self.cam_id = cam_id
+        self.magaza = magaza
+        self.date_name = date_name
+        self.hour_name = hour_name
+        self.s3_keys = s3_keys
+        self.expected = len(s3_keys)
+        self.snapshots_dir = TEMP_DIR / cam_id / date_name / hour_name
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        self.crops_dir = TEMP_DIR / "crops" / cam_id / date_name / hour_name
+        self.collages_dir = self.crops_dir / "collages"
+        self.collages_dir.mkdir(parents=True, exist_ok=True)
+        self.rois = load_target_rois(cam_id)
+        self.engine = CropEngine(self.crops_dir, upload_to_s3=True)
+        self.downloaded = 0
+        self._lock = threading.Lock()
+        # Collage aşaması. Snapshot'ların crop'ları s3_keys sırasıyla işlenir (sıralama tamponu);
+        # paralel indirme/detection/encode'a rağmen collage içerikleri ve numaralar her çalıştırmada aynıdır
+        self.snapshot_order = {key.split('/')[-1]: i for i, key in enumerate(s3_keys)}
+        self.ready: Dict[int, List[Dict[str, Any]]] = {}
+        self.next_snapshot = 0
+        self.received = 0
+        self.finished = False
+        self.crop_data: List[Dict[str, Any]] = []
+        self.dropped: List[Dict[str, Any]] = []
+        self.dedup = DuplicateIndex(load_target_overlaps(cam_id)) if CROP_DEDUP else None
+        self.rec_by_path: Dict[Path, Rec] = {}
+        self.pending: List[Rec] = []
+        self.submitted: List[Tuple] = []  # (batch_no, batch, collage_path, collage_s3_path, num_to_class, future)
+
+    def count_download(self) -> None:
+        with self._lock:
+            self.downloaded += 1
+
+    def roi_for(self, snapshot_path: Path) -> Optional[RegionOfInterest]:
+        return self.rois.get(snapshot_target_name(snapshot_path.stem))
+
+    def release(self, snapshot_path: Path, infos: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Snapshot'ın crop'larını tampona koy; sırası gelmiş snapshot'ların crop listelerini s3_keys sırasıyla döndür"""
+        self.received += 1
+        self.ready[self.snapshot_order[snapshot_path.name]] = infos
+        released = []
+        while self.next_snapshot in self.ready:
+            released.append(self.ready.pop(self.next_snapshot))
+            self.next_snapshot += 1
+        return released
+
+class AnalysisPipeline:
+    """
+    main() akış hattı: indirme(+decode) → detection → crop (CropEngine) → triage/tekrar/collage → LLM → rapor.
+    Aşamalar sınırlı kuyruklarla bağlıdır; kameralar da birbirinin üzerine biner. Crop'lar collage
+    aşamasına snapshot sırasıyla (s3_keys) girer; sıradaki bekleyen crop'lar bir collage'ı
+    doldurduğunda (CollagePacker) collage Azure'a gider. Rapor o saatin tüm snapshot'ları
+    bittiğinde, batch sırasıyla yazılır.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.download_q: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.detect_q: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.collage_q: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.report_q: "queue.Queue" = queue.Queue()
+        self.llm_pool = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_IN_FLIGHT), thread_name_prefix="azure-llm")
+        self.triage_rules = load_triage_rules() if CROP_TRIAGE else None
+        self.packer = CollagePacker()
+        self.jobs: List[HourJob] = []
+
+    # --- indirme + decode
+    def _download_worker(self) -> None:
+        while True:
+            item = self.download_q.get()
+            if item is None:
+                break
+            job, s3_key = item
+            local_path = job.snapshots_dir / s3_key.split('/')[-1]
+            try:
+                if download_blob_to_path(s3_key, local_path):
+                    job.count_download()
+                    self.detect_q.put((job, local_path, decode_reduced(local_path, DETECT_MAX_SIDE)))
+                    continue
+            except Exception as e:
+                print(f"⚠️  Snapshot işlenemedi ({local_path.name}): {e}")
+            self.collage_q.put((job, local_path, []))
+
+    # --- detection
+    def _detect_worker(self, detector: SnapshotDetector) -> None:
+        stop = False
+        while not stop:
+            item = self.detect_q.get()
+            if item is None:
+                break
+            items = [item]
+            while len(items) < DETECT_BATCH_SIZE:  # hazır olanları bekletmeden topla
+                try:
+                    nxt = self.detect_q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                items.append(nxt)
+            batch = [(path, reduced) for _, path, reduced in items]
+            print(f"[→] Detection: {', '.join(p.name for p, _ in batch)}")
+            try:
+                batch_detections, names = detector.detect(batch, [job.roi_for(path) for job, path, _ in items])
+            except Exception as e:
+                print(f"⚠️  Detection hatası ({len(batch)} snapshot): {e}")
+                batch_detections, names = [[] for _ in items], {}
+            for (job, path, reduced), detections in zip(items, batch_detections):
+                if not detections:
+                    self.collage_q.put((job, path, []))
+                    continue
+                try:
+                    job.engine.submit(path, reduced, detections, names,
+                                      on_done=lambda infos, job=job, path=path: self.collage_q.put((job, path, infos)))
+                except Exception as e:
+                    print(f"⚠️  Crop kuyruğa alınamadı ({path.name}): {e}")
+                    self.collage_q.put((job, path, []))
+
+    # --- triage / tekrar / collage (tek thread)
+    def _accept_crops(self, job: HourJob, infos: List[Dict[str, Any]]) -> None:
+        job.crop_data.extend(infos)
+        selected = infos
+        if self.triage_rules is not None:
+            # Kurallar crop ve snapshot bazında; saatin tamamında çalıştırmakla aynı sonuç
+            selected, dropped = triage_crops(infos, *self.triage_rules)
+            job.dropped.extend(dropped)
+        for info in selected:
+            rec = rec_from_crop(info, job.magaza, job.date_name, job.hour_name, job.cam_id)
+            job.rec_by_path[rec.path] = rec
+            status, previous = job.dedup.add(info) if job.dedup is not None else ("new", None)
+            if status == "member":
+                continue
+            if status == "replace":
+                # Daha güvenli tekrar, bekleyen temsilcinin yerini (ve collage sırasını) alır
+                job.pending[job.pending.index(job.rec_by_path[previous["crop_path"]])] = rec
+            else:
+                job.pending.append(rec)
+            if self.packer.is_full(job.pending):
+                self._submit_batch(job)
+
+    def _submit_batch(self, job: HourJob) -> None:
+        batch, layout = self.packer.take(job.pending)
+        job.pending = job.pending[len(batch):]
+        if job.dedup is not None:
+            for rec in batch:
+                job.dedup.close(rec.path)
+        batch_no = len(job.submitted) + 1
+        print(f"[→] {job.cam_id} Batch {batch_no} işleniyor ({len(batch)} crop)...")
+        collage = make_collage(batch, job.collages_dir, batch_no, upload_to_s3=True, layout=layout)
+        num_to_class = {i + 1: rec.urun for i, rec in enumerate(batch)}
+        future = self.llm_pool.submit(
+            azure_classify_collage,
+            self.client, DEPLOYMENT, collage.path, len(batch),
+            num_to_class, MIN_CONF_ROTTEN, batch, collage
+        )
+        # Baytlar sadece LLM isteğine kadar tutulur; rapor için yol yeterli
+        job.submitted.append((batch_no, batch, collage.path, collage.s3_path, num_to_class, future))
+
+    def _collage_worker(self) -> None:
+        closing = False
+        while True:
+            item = self.collage_q.get()
+            if item is None:
+                closing = True
+            else:
+                job, snapshot_path, infos = item
+                for released in job.release(snapshot_path, infos):
+                    try:
+                        self._accept_crops(job, released)
+                    except Exception as e:
+                        print(f"⚠️  {job.cam_id} crop işleme hatası: {e}")
+                if job.received == job.expected:
+                    try:
+                        while job.pending:
+                            self._submit_batch(job)
+                    except Exception as e:
+                        print(f"⚠️  {job.cam_id} collage hatası: {e}")
+                    job.finished = True
+                    self.report_q.put(job)
+            # Sinyalden sonra da geç gelen crop bildirimleri (encode thread'leri) beklenir
+            if closing and all(job.finished for job in self.jobs):
+                break
+
+    # --- rapor
+    def _report_worker(self) -> None:
+        while True:
+            job = self.report_q.get()
+            if job is None:
+                break
+            try:
+                self._write_reports(job)
+            except Exception as e:
+                print(f"[HATA] {job.cam_id} rapor yazılamadı: {e}")
+
+    def _write_reports(self, job: HourJob) -> None:
+        cam_id, crops_dir = job.cam_id, job.crops_dir
+        job.engine.close()  # kalan crop yüklemeleri
+        if not job.downloaded:
+            print(f"[!] {cam_id} - Snapshot indirilemedi")
+            return
+        if not job.crop_data:
+            print(f"[!] {cam_id} - Hiç tespit yapılamadı")
+            return
+        print(f"[i] {cam_id} toplam crop: {len(job.crop_data)}")
+        out_triage = None
+        if self.triage_rules is not None:
+            out_triage = crops_dir / "triage_dropped.json"
+            log_triage(job.dropped, len(job.crop_data), out_triage)
+        duplicates = job.dedup.members if job.dedup is not None else {}
+        if duplicates:
+            print(f"[i] Tekrar bastırma: {len(duplicates)} grup, {job.dedup.duplicate_count} kopya LLM'e gönderilmedi")
+        if not job.submitted:
+            print(f"[!] {cam_id} - Crop yok")
+            return
+        
+        all_items: List[Dict] = []
+        for batch_no, batch, collage_path, collage_s3_path, num_to_class, future in job.submitted:
+            result = future.result()
+            base_rows = [base_row(rec) for rec in batch]
+            member_rows = [(pos, base_row(job.rec_by_path[member["crop_path"]]))
+                           for pos, rec in enumerate(batch, start=1)
+                           for member in duplicates.get(rec.path, [])
+                           if member["crop_path"] in job.rec_by_path]
+            
+            if result.get("skipped"):
+                print(f"⚠️  {cam_id} Batch {batch_no} atlandı (LLM hatası).")
+                enqueue_llm_retry(cam_id, job.date_name, job.hour_name, batch_no, collage_path, collage_s3_path,
+                                  num_to_class, base_rows, member_rows,
+                                  result.get("detail") or result.get("error", ""))
+                continue
+            
+            batch_items, duplicate_items, rotten_pos = batch_result_rows(
+                base_rows, member_rows, result, MIN_CONF_ROTTEN)
+            out_llm = collage_path.with_suffix(".llm.json")
+            write_llm_dump(str(collage_path), collage_s3_path, num_to_class, result, batch_items,
+                           out_llm, crops_s3_key(out_llm))
+            
+            all_items.extend(batch_items)
+            all_items.extend(duplicate_items)
+            print(f"[OK] {cam_id} Batch {batch_no} -> {collage_path.name} (çürük={len(rotten_pos)}/{len(batch)})")
+        
+        out_json = crops_dir / "report_all.json"
+        with open(out_json, "w", encoding="utf-8") as f:
+            json.dump(all_items, f, ensure_ascii=False, indent=2)
+        
+        out_csv = crops_dir / "report_all.csv"
+        write_csv(out_csv, all_items)
+        
+        out_summary = crops_dir / "summary.txt"
+        write_summary(out_summary, all_items)
+        
+        upload_file_to_blob(out_json, crops_s3_key(out_json), content_type="application/json")
+        upload_file_to_blob(out_csv, crops_s3_key(out_csv), content_type="text/csv")
+        upload_file_to_blob(out_summary, crops_s3_key(out_summary), content_type="text/plain")
+        if out_triage is not None and out_triage.exists():
+            upload_file_to_blob(out_triage, crops_s3_key(out_triage), content_type="application/json")
+        
+        print(f"[✓] {cam_id} tamamlandı")
+        print(f"    - Crop'lar: {len(job.crop_data)} tespit (S3'e yüklendi)")
+        print(f"    - Collage'lar: {len(job.submitted)} adet (S3'e yüklendi)")
+        print(f"    - Raporlar: report_all.json, report_all.csv, summary.txt (S3'e yüklendi)")
+
+    # --- besleyici
+    def _open_job(self, cam_id: str) -> Optional[HourJob]:
+        print(f"\n{'='*60}")
+        print(f"[→] {cam_id} işleniyor...")
+        print(f"{'='*60}")
+        
+        magaza = get_store_name(cam_id)
+        print(f"[i] Mağaza: {magaza}")
+        
+        found = find_latest_date_hour_for_camera_from_s3(cam_id)
+        if not found:
+            print(f"[!] {cam_id} için snapshot bulunamadı.")
+            return None
+        
+        date_name, hour_name, s3_keys = found
+        print(f"[i] Son klasör: {date_name}/{hour_name}")
+        print(f"[i] Toplam snapshot: {len(s3_keys)}")
+        s3_keys = [k for k in s3_keys if k.lower().endswith(('.jpg', '.jpeg'))]
+        if not s3_keys:
+            print(f"[!] {cam_id} - Snapshot indirilemedi")
+            return None
+        return HourJob(cam_id, magaza, date_name, hour_name, s3_keys)
+
+    def run(self, cameras: List[str]) -> None:
+        started = time.perf_counter()
+        detectors = [SnapshotDetector(MODEL_PATH) for _ in range(max(1, PIPELINE_DETECT_WORKERS))]
+        download_threads = [threading.Thread(target=self._download_worker, name=f"download-{i}", daemon=True)
+                            for i in range(max(1, PIPELINE_DOWNLOAD_WORKERS))]
+        detect_threads = [threading.Thread(target=self._detect_worker, args=(d,), name=f"detect-{i}", daemon=True)
+                          for i, d in enumerate(detectors)]
+        collage_thread = threading.Thread(target=self._collage_worker, name="collage", daemon=True)
+        report_thread = threading.Thread(target=self._report_worker, name="report", daemon=True)
+        for t in download_threads + detect_threads + [collage_thread, report_thread]:
+            t.start()
+        
+        for cam_id in cameras:
+            job = self._open_job(cam_id)
+            if job is None:
+                continue
+            self.jobs.append(job)
+            for s3_key in job.s3_keys:
+                self.download_q.put((job, s3_key))
+        
+        # Kapanış sırası: her aşama, önceki aşamanın tüm işi kuyruğa girdikten sonra durur
+        for _ in download_threads:
+            self.download_q.put(None)
+        for t in download_threads:
+            t.join()
+        for _ in detect_threads:
+            self.detect_q.put(None)
+        for t in detect_threads:
+            t.join()
+        self.collage_q.put(None)
+        collage_thread.join()
+        self.report_q.put(None)
+        report_thread.join()
+        self.llm_pool.shutdown(wait=True)
+        
+        elapsed = time.perf_counter() - started
+        for detector in detectors:
+            detector.report(elapsed, DETECT_BATCH_SIZE)
+
 def main(camera_id: str = None):
     """
     Ana işlem: S3'ten snapshot'ları indirir, işler, 
-    crop'lar, LLM analizi yapar ve tüm çıktıları S3'e yükler.
+    crop'lar, LLM analizi yapar ve tüm çıktıları S3'e yükler (AnalysisPipeline).
     """
     if not AZURE_ENDPOINT or not AZURE_API_KEY:
         raise RuntimeError("AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_API_KEY eksik.")
@@ -631,162 +2003,11 @@ def main(camera_id: str = None):
     print(f"[i] İşlenecek kameralar: {', '.join(cameras_to_process)}")
     
     try:
-        for cam_id in cameras_to_process:
-            print(f"\n{'='*60}")
-            print(f"[→] {cam_id} işleniyor...")
-            print(f"{'='*60}")
-            
-            magaza = get_store_name(cam_id)
-            print(f"[i] Mağaza: {magaza}")
-            
-            found = find_latest_date_hour_for_camera_from_s3(cam_id)
-            if not found:
-                print(f"[!] {cam_id} için snapshot bulunamadı.")
-                continue
-            
-            date_name, hour_name, s3_keys = found
-            print(f"[i] Son klasör: {date_name}/{hour_name}")
-            print(f"[i] Toplam snapshot: {len(s3_keys)}")
-            
-            temp_snapshots_dir = TEMP_DIR / cam_id / date_name / hour_name
-            temp_snapshots_dir.mkdir(parents=True, exist_ok=True)
-            
-            print(f"[→] S3'ten snapshot'lar indiriliyor...")
-            snapshot_files = []
-            for s3_key in s3_keys:
-                if not s3_key.lower().endswith(('.jpg', '.jpeg')):
-                    continue
-                filename = s3_key.split('/')[-1]
-                local_path = temp_snapshots_dir / filename
-                if download_blob_to_path(s3_key, local_path):
-                    snapshot_files.append(local_path)
-            
-            if not snapshot_files:
-                print(f"[!] {cam_id} - Snapshot indirilemedi")
-                continue
-            
-            snapshot_files.sort()
-            print(f"[✓] {len(snapshot_files)} snapshot indirildi")
-            
-            crops_dir = TEMP_DIR / "crops" / cam_id / date_name / hour_name
-            crops_dir.mkdir(parents=True, exist_ok=True)
-            
-            print(f"[→] YOLOv12 detection başlıyor...")
-            crop_data = run_detection_and_crop(snapshot_files, crops_dir, MODEL_PATH, upload_to_s3=True)
-            if not crop_data:
-                print(f"[!] {cam_id} - Hiç tespit yapılamadı")
-                continue
-            
-            print(f"[i] Toplam crop: {len(crop_data)}")
-            
-            recs = gather_crops_for_hour(crops_dir, magaza, date_name, hour_name, crop_data, cam_id)
-            if not recs:
-                print(f"[!] {cam_id} - Crop yok")
-                continue
-            
-            client = _ensure_openai_client()
-            collages_dir = crops_dir / "collages"
-            collages_dir.mkdir(parents=True, exist_ok=True)
-            
-            all_items: List[Dict] = []
-            batch_idx = 1
-            
-            for batch in chunked(recs, BATCH_SIZE):
-                print(f"[→] Batch {batch_idx} işleniyor ({len(batch)} crop)...")
-                collage_path, collage_s3_path = make_collage(batch, collages_dir, batch_idx, upload_to_s3=True)
-                num_to_class = {i + 1: rec.urun for i, rec in enumerate(batch)}
-                
-                result = azure_classify_collage(
-                    client, DEPLOYMENT, collage_path, len(batch), 
-                    num_to_class, MIN_CONF_ROTTEN, batch
-                )
-                
-                if result.get("skipped"):
-                    print(f"⚠️  Batch {batch_idx} atlandı (LLM hatası).")
-                    batch_idx += 1
-                    continue
-                
-                rotten_pos: Dict[int, float] = {}
-                for x in result.get("rotten", []) if isinstance(result, dict) else []:
-                    try:
-                        idx = int(x.get("id"))
-                        conf = float(x.get("guven", 0.0))
-                        if 1 <= idx <= len(batch) and conf >= MIN_CONF_ROTTEN:
-                            rotten_pos[idx] = conf
-                    except Exception:
-                        pass
-                
-                batch_items: List[Dict] = []
-                for i, rec in enumerate(batch, start=1):
-                    dosya_url = rec.snapshot_blob_url or str(rec.path)
-                    
-                    row = {
-                        "id": rec.id,
-                        "urun": rec.urun,
-                        "magaza": rec.magaza,
-                        "tarih": rec.tarih,
-                        "saat": rec.saat,
-                        "dosya": dosya_url
-                    }
-                    if i in rotten_pos:
-                        row.update({"durum": "çürük", "guven": rotten_pos[i]})
-                    else:
-                        row.update({"durum": "sağlıklı"})
-                    batch_items.append(row)
-                
-                llm_dump = {
-                    "collage_path": str(collage_path),
-                    "collage_blob_path": collage_s3_path,
-                    "batch_size": len(batch),
-                    "model_name": DEPLOYMENT,
-                    "prompt_version": "rotten_only_v2_safe",
-                    "latency_ms": None,
-                    "num_to_class": num_to_class,
-                    "min_conf_rotten": MIN_CONF_ROTTEN,
-                    "raw_llm": result,
-                    "items": batch_items
-                }
-                out_llm = collage_path.with_suffix(".llm.json")
-                with open(out_llm, "w", encoding="utf-8") as f:
-                    json.dump(llm_dump, f, ensure_ascii=False, indent=2)
-                
-                temp_parts = list(out_llm.parts)
-                crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
-                s3_llm_key = "/".join(temp_parts[crops_idx:])
-                upload_file_to_blob(out_llm, s3_llm_key, content_type="application/json")
-                
-                all_items.extend(batch_items)
-                print(f"[OK] Batch {batch_idx} -> {collage_path.name} (çürük={len(rotten_pos)}/{len(batch)})")
-                batch_idx += 1
-            
-            out_json = crops_dir / "report_all.json"
-            with open(out_json, "w", encoding="utf-8") as f:
-                json.dump(all_items, f, ensure_ascii=False, indent=2)
-            
-            out_csv = crops_dir / "report_all.csv"
-            write_csv(out_csv, all_items)
-            
-            out_summary = crops_dir / "summary.txt"
-            write_summary(out_summary, all_items)
-            
-            def get_s3_key(local_path: Path) -> str:
-                temp_parts = list(local_path.parts)
-                crops_idx = next(i for i, p in enumerate(temp_parts) if p == "crops")
-                return "/".join(temp_parts[crops_idx:])
-            
-            s3_json_key = get_s3_key(out_json)
-            upload_file_to_blob(out_json, s3_json_key, content_type="application/json")
-            
-            s3_csv_key = get_s3_key(out_csv)
-            upload_file_to_blob(out_csv, s3_csv_key, content_type="text/csv")
-            
-            s3_summary_key = get_s3_key(out_summary)
-            upload_file_to_blob(out_summary, s3_summary_key, content_type="text/plain")
-            
-            print(f"[✓] {cam_id} tamamlandı")
-            print(f"    - Crop'lar: {len(crop_data)} tespit (S3'e yüklendi)")
-            print(f"    - Collage'lar: {batch_idx-1} adet (S3'e yüklendi)")
-            print(f"    - Raporlar: report_all.json, report_all.csv, summary.txt (S3'e yüklendi)")
+        client = _ensure_openai_client()
+        # Önceki çalıştırmalarda LLM'den karar alınamayan batch'ler
+        drain_llm_retry_queue(client, camera_id)
+        
+        AnalysisPipeline(client).run(cameras_to_process)
         
         print(f"\n{'='*60}")
         print("[✓] Tüm kameralar işlendi!")
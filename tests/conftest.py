@@ -0,0 +1,8 @@
+"""Kök dizindeki servisler ve multi_camera_system modülleri (birbirini düz `from X import ...` ile alır) testlerde bulunabilsin"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "multi_camera_system"))
@@ -0,0 +1,68 @@
+"""ptz_yolo_llm_analysis.DuplicateIndex - komşu hedefler arası tekrar kasa bastırma"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ptz_yolo_llm_analysis import DuplicateIndex, perceptual_hash
+
+NEIGHBORS = {"konum1": {"konum2"}, "konum2": {"konum1"}}
+
+
+def _package(seed: int) -> np.ndarray:
+    """Kasa görüntüsü: kaba doku (pHash'i belirler) + ince etiket gürültüsü"""
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(40, 220, size=(8, 8, 3)).repeat(16, axis=0).repeat(16, axis=1)
+    fine = np.random.default_rng(seed).integers(-12, 12, size=coarse.shape)
+    return np.clip(coarse + fine, 0, 255).astype(np.uint8)
+
+
+def _crop(target: str, index: int, phash: int, confidence: float = 0.9) -> dict:
+    snapshot = Path(f"/tmp/{target}_091502.jpg")
+    return {
+        "crop_path": Path(f"/tmp/crops/domates/{target}_091502_{index}.jpg"),
+        "snapshot_path": snapshot,
+        "class_name": "domates",
+        "confidence": confidence,
+        "phash": phash,
+    }
+
+
+@pytest.fixture
+def similar_hashes():
+    a, b = perceptual_hash(_package(1)), perceptual_hash(_package(2))
+    assert bin(a ^ b).count("1") <= 8  # pHash'e göre aynı kasa gibi görünen iki ayrı paket
+    return a, b
+
+
+def test_similar_packages_in_one_snapshot_are_not_merged(similar_hashes):
+    index = DuplicateIndex(NEIGHBORS)
+    assert index.add(_crop("konum1", 0, similar_hashes[0]))[0] == "new"
+    assert index.add(_crop("konum1", 1, similar_hashes[1]))[0] == "new"
+    assert index.duplicate_count == 0
+
+
+def test_similar_packages_on_unrelated_targets_are_not_merged(similar_hashes):
+    index = DuplicateIndex(NEIGHBORS)
+    assert index.add(_crop("konum1", 0, similar_hashes[0]))[0] == "new"
+    assert index.add(_crop("konum5", 0, similar_hashes[1]))[0] == "new"
+    assert index.duplicate_count == 0
+
+
+def test_no_grouping_without_declared_overlaps(similar_hashes):
+    index = DuplicateIndex({})
+    assert index.add(_crop("konum1", 0, similar_hashes[0]))[0] == "new"
+    assert index.add(_crop("konum2", 0, similar_hashes[0]))[0] == "new"
+    assert index.members == {}
+
+
+def test_same_crate_on_overlapping_targets_is_grouped(similar_hashes):
+    index = DuplicateIndex(NEIGHBORS)
+    first = _crop("konum1", 0, similar_hashes[0], confidence=0.7)
+    second = _crop("konum2", 0, similar_hashes[1], confidence=0.9)
+    assert index.add(first)[0] == "new"
+    assert index.add(second) == ("replace", first)
+    assert index.members == {second["crop_path"]: [first]}
+    # Grupta aynı hedeften ikinci crop olmaz
+    assert index.add(_crop("konum1", 1, similar_hashes[0]))[0] == "new"
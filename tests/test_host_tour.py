@@ -0,0 +1,83 @@
+"""multi_camera_system.camera_snapshot_system.process_configurations_by_host - host bazında birleşik tur"""
+
+import textwrap
+
+import pytest
+
+import camera_snapshot_system as css
+
+
+def _write(path, text):
+    path.write_text(textwrap.dedent(text), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def configs(tmp_path):
+    main = _write(tmp_path / "cameras.yaml", """
+        cameras:
+          camera_001:
+            host: "10.0.0.5:80"
+            move_settle_seconds: 5
+            change_prefilter: diff
+            burst_frames: 3
+            ptz_targets:
+              konum1: {azimuth: 10, elevation: 5, zoom: 2}
+        global_settings:
+          snapshots_root: "snapshots"
+          deferred_retry: false
+    """)
+    extra = _write(tmp_path / "cameras_reyon_genel.yaml", """
+        cameras:
+          camera_001:
+            host: "10.0.0.5:80"
+            move_settle_seconds: 8
+            settle_detection: true
+            ptz_targets:
+              reyon_genel: {azimuth: 40, elevation: 0, zoom: 1}
+        global_settings:
+          snapshots_root: "snapshots/reyon_genel"
+          deferred_retry: true
+    """)
+    return main, extra
+
+
+@pytest.fixture
+def tours(monkeypatch):
+    calls = []
+
+    def _fake_tour(controller, camera_config, targets, global_settings):
+        calls.append((camera_config, targets, global_settings))
+        return [], {}
+    monkeypatch.setattr(css, "run_camera_tour", _fake_tour)
+    return calls
+
+
+def test_targets_keep_their_own_config(configs, tours):
+    css.process_configurations_by_host(list(configs))
+
+    (tour_config, targets, _), = tours
+    by_name = {t.target_name: t for t in targets}
+    assert by_name["konum1"].config_or(tour_config).change_prefilter == "diff"
+    assert by_name["konum1"].config_or(tour_config).burst_frames == 3
+    assert by_name["reyon_genel"].config_or(tour_config).change_prefilter == "off"
+    assert by_name["reyon_genel"].config_or(tour_config).burst_frames == 1
+    assert by_name["reyon_genel"].skip_human_detection
+
+
+def test_settle_ceiling_does_not_mutate_loaded_config(configs, tours):
+    css.process_configurations_by_host(list(configs))
+
+    (tour_config, targets, _), = tours
+    assert tour_config.move_settle_seconds == 8
+    konum1 = next(t for t in targets if t.target_name == "konum1")
+    assert konum1.camera_config.move_settle_seconds == 5
+    assert konum1.camera_config is not tour_config
+
+
+def test_conflicting_tour_settings_are_reported(configs, tours, capsys):
+    css.process_configurations_by_host(list(configs))
+
+    out = capsys.readouterr().out
+    assert "settle_detection farklı" in out
+    assert "global_settings.deferred_retry farklı" in out
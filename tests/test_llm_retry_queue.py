@@ -0,0 +1,110 @@
+"""ptz_yolo_llm_analysis.drain_llm_retry_queue - S3'teki LLM yeniden deneme kuyruğu"""
+
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+from PIL import Image
+
+import ptz_yolo_llm_analysis as analysis
+
+PREFIX = analysis.LLM_RETRY_PREFIX
+REPORT_KEY = "crops/camera_001/2026-10-18/09/report_all.json"
+
+
+class FakeS3:
+    """Bellekte tutulan bucket (kuyruğun kullandığı çağrılar)"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def download_file(self, Bucket, Key, Filename):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        with open(Filename, "wb") as f:
+            f.write(self.objects[Key])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def get_paginator(self, name):
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                return [{"Contents": [{"Key": k} for k in sorted(objects) if k.startswith(Prefix)]}]
+        return Paginator()
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(analysis, "TEMP_DIR", tmp_path)
+    monkeypatch.setattr(analysis, "_ensure_s3_client", lambda: fake)
+    monkeypatch.setattr(analysis, "azure_classify_collage",
+                        lambda *args, **kwargs: {"rotten": [{"id": 1, "guven": 0.95}]})
+    return fake
+
+
+def _enqueue(tmp_path, batch_no: int) -> str:
+    collage = tmp_path / "crops" / "camera_001" / "2026-10-18" / "09" / "collages" / f"collage_{batch_no:03d}.jpg"
+    collage.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (40, 30)).save(collage)
+    rows = [{"id": f"crop{batch_no}", "urun": "domates", "magaza": "M", "tarih": "2026-10-18",
+             "saat": "09:00:00", "dosya": f"crop{batch_no}.jpg"}]
+    key = analysis.enqueue_llm_retry("camera_001", "2026-10-18", "09", batch_no, collage, None,
+                                     {1: "domates"}, rows, [], "timeout")
+    assert key is not None
+    return key
+
+
+def _make_due(s3, key):
+    entry = json.loads(s3.objects[key])
+    entry["next_attempt_ts"] = 0
+    s3.objects[key] = json.dumps(entry).encode("utf-8")
+
+
+def test_corrupt_entries_do_not_block_the_queue(s3, tmp_path):
+    truncated = _enqueue(tmp_path, 1)
+    s3.objects[truncated] = s3.objects[truncated][:40]
+    hand_edited = _enqueue(tmp_path, 2)
+    entry = json.loads(s3.objects[hand_edited])
+    del entry["next_attempt_ts"]
+    s3.objects[hand_edited] = json.dumps(entry).encode("utf-8")
+    good = _enqueue(tmp_path, 3)
+    _make_due(s3, good)
+
+    stats = analysis.drain_llm_retry_queue(None)
+
+    assert stats["bad"] == 2 and stats["done"] == 1
+    assert truncated not in s3.objects and hand_edited not in s3.objects and good not in s3.objects
+    assert f"{PREFIX}bad/{truncated[len(PREFIX):]}" in s3.objects
+    assert f"{PREFIX}bad/{hand_edited[len(PREFIX):]}" in s3.objects
+    assert [row["id"] for row in json.loads(s3.objects[REPORT_KEY])] == ["crop3"]
+
+    # bad/ altındaki kayıtlar sonraki çalıştırmada tekrar okunmaz
+    assert analysis.drain_llm_retry_queue(None) == {
+        "done": 0, "deferred": 0, "expired": 0, "waiting": 0, "bad": 0, "failed": 0}
+
+
+def test_processing_error_keeps_entry_queued(s3, tmp_path, monkeypatch):
+    key = _enqueue(tmp_path, 1)
+    _make_due(s3, key)
+
+    def _boom(*args, **kwargs):
+        raise RuntimeError("beklenmeyen hata")
+    monkeypatch.setattr(analysis, "azure_classify_collage", _boom)
+
+    stats = analysis.drain_llm_retry_queue(None)
+
+    assert stats["failed"] == 1
+    assert key in s3.objects
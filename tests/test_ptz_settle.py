@@ -0,0 +1,140 @@
+"""multi_camera_system.camera_snapshot_system.wait_for_ptz_settle - konum geri bildirimli bekleme"""
+
+import io
+import time
+
+import pytest
+from PIL import Image
+
+import ptz_travel_model
+from camera_snapshot_system import CameraConfig, wait_for_ptz_settle
+
+ORIGIN = (0.0, 0.0, 1.0)
+TARGET = (90.0, 10.0, 2.0)
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (90, 90, 90)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class FakeController:
+    """arrive_seconds sonra hedefte görünen, karesi hemen oturan kamera"""
+
+    def __init__(self, config: CameraConfig, arrive_seconds: float):
+        self.config = config
+        self.arrive_seconds = arrive_seconds
+        self.move_origin = None
+        self._frame = _jpeg()
+        self._moved_at = 0.0
+
+    def move(self, origin):
+        self.move_origin = origin
+        self._moved_at = time.monotonic()
+
+    def get_ptz_status(self):
+        return TARGET if time.monotonic() - self._moved_at >= self.arrive_seconds else ORIGIN
+
+    def fetch_frame_bytes(self) -> bytes:
+        return self._frame
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    model = ptz_travel_model.TravelTimeModel(tmp_path / "ptz_travel_times.json")
+    monkeypatch.setattr(ptz_travel_model, "_model", model)
+    monkeypatch.setattr(ptz_travel_model, "MAX_SAMPLES_PER_PAIR", 5)
+    return model
+
+
+def _config(**overrides) -> CameraConfig:
+    values = {"move_settle_seconds": 2, "settle_poll_interval": 0.02}
+    values.update(overrides)
+    return CameraConfig("camera_test", values)
+
+
+def test_travel_model_learns_faster_moves(model):
+    for _ in range(5):
+        model.record("camera_test", ORIGIN, TARGET, 0.5)
+    controller = FakeController(_config(travel_model=True), arrive_seconds=0.05)
+
+    predictions = [model.predict("camera_test", ORIGIN, TARGET)]
+    for _ in range(5):
+        controller.move(ORIGIN)
+        wait_for_ptz_settle(controller, *TARGET)
+        predictions.append(model.predict("camera_test", ORIGIN, TARGET))
+
+    assert predictions[0] == pytest.approx(0.5)
+    assert all(b <= a for a, b in zip(predictions, predictions[1:]))
+    assert predictions[-1] < 0.4
+
+
+def test_travel_model_keeps_polling_when_camera_is_slower(model):
+    for _ in range(5):
+        model.record("camera_test", ORIGIN, TARGET, 0.1)
+    controller = FakeController(_config(travel_model=True), arrive_seconds=0.4)
+
+    controller.move(ORIGIN)
+    waited = wait_for_ptz_settle(controller, *TARGET)
+
+    assert 0.4 <= waited < 2.0
+    assert model.predict("camera_test", ORIGIN, TARGET) > 0.1
+
+
+def test_travel_model_persists_only_on_save(model):
+    controller = FakeController(_config(travel_model=True), arrive_seconds=0.0)
+    controller.move(ORIGIN)
+    wait_for_ptz_settle(controller, *TARGET)
+
+    assert not model.path.exists()
+    model.save()
+    assert model.path.exists()
+
+
+# --- mock ISAPI sunucusu ile tur: sabit bekleme vs konum geri bildirimi
+
+TOUR = [(30.0, 10.0, 2.0), (75.0, 4.0, 3.0), (40.0, 12.0, 1.0)]
+
+
+@pytest.fixture
+def mock_camera():
+    from mock_isapi_server import SimulatedPTZ, start_mock_server
+
+    ptz = SimulatedPTZ(pan_speed=200.0, tilt_speed=100.0, zoom_speed=20.0, focus_seconds=0.2)
+    server, ptz = start_mock_server(ptz=ptz)
+    yield server, ptz
+    server.shutdown()
+
+
+def _run_tour(server, settle_detection: bool):
+    from camera_snapshot_system import CameraController
+
+    config = CameraConfig("camera_mock", {
+        "host": "127.0.0.1", "move_settle_seconds": 1.0, "settle_poll_interval": 0.05,
+        "settle_detection": settle_detection,
+    })
+    config.base_url = f"http://127.0.0.1:{server.server_address[1]}/ISAPI"
+    controller = CameraController(config)
+    waits = []
+    for target in TOUR:
+        controller.move_ptz(*target)
+        waits.append(wait_for_ptz_settle(controller, *target))
+        yield target, waits[-1]
+
+
+def test_settle_detection_tour_is_faster_than_fixed_sleep(mock_camera):
+    server, ptz = mock_camera
+
+    fixed = [waited for _, waited in _run_tour(server, settle_detection=False)]
+    feedback = []
+    for target, waited in _run_tour(server, settle_detection=True):
+        # Bekleme mock kamera hedefe varıp görüntü oturduktan sonra biter
+        az, el, zoom = ptz.position()
+        assert (az, el, zoom) == pytest.approx(target, abs=0.1)
+        assert ptz.focus_noise() == 0.0
+        feedback.append(waited)
+
+    assert fixed == pytest.approx([1.0] * len(TOUR))
+    assert all(waited < 1.0 for waited in feedback)
+    assert sum(feedback) < 0.8 * sum(fixed)
@@ -0,0 +1,26 @@
+"""multi_camera_system.roi - snapshot adından hedef adı (ROI araması)"""
+
+import pytest
+
+from multi_camera_system.roi import RegionOfInterest, snapshot_target_name, target_rois
+
+
+@pytest.mark.parametrize("stem, expected", [
+    ("konum1_091502", "konum1"),
+    ("konum1_retry2_091502", "konum1"),           # capture_snapshot_with_retry / _capture_once
+    ("konum1_retry_091502", "konum1"),            # tur sonu tekrarı, ilk deneme
+    ("konum1_retry_retry3_091502", "konum1"),     # tur sonu tekrarı, sonraki denemeler
+    ("reyon_genel_091502", "reyon_genel"),
+    ("meyve_retry_reyonu_091502", "meyve_retry_reyonu"),  # sonek değilse dokunulmaz
+])
+def test_snapshot_target_name_strips_retry_suffix(stem, expected):
+    assert snapshot_target_name(stem) == expected
+
+
+def test_retry_snapshot_finds_target_roi():
+    rois = target_rois({
+        "konum1": {"azimuth": 1, "roi": [[[0.1, 0.1], [0.9, 0.1], [0.9, 0.9], [0.1, 0.9]]]},
+        "konum2": {"azimuth": 2},
+    })
+    assert isinstance(rois.get(snapshot_target_name("konum1_retry2_091502")), RegionOfInterest)
+    assert rois.get(snapshot_target_name("konum2_retry2_091502")) is None